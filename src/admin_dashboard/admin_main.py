@@ -1,11 +1,40 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                            QLabel, QPushButton, QMenu, QGridLayout)
-from PyQt6.QtCore import Qt, QPoint
+from PyQt6.QtCore import Qt, QPoint, QThread
 from PyQt6.QtGui import QPixmap, QIcon, QColor
 from utils.session import current_session
 from admin_dashboard.manage_bookings import ManageBookingsWindow
+from admin_dashboard.analytics import AnalyticsWindow
+from admin_dashboard.reports import ReportsWindow
+from utils.scheduler import default_scheduler
 import os
 
+class SchedulerThread(QThread):
+    # Fires every booking's release, reminder and no-show job from one wheel. Loading it and
+    # the dispatch rounds run for released bookings both wait on the database, so it ticks
+    # here rather than on the UI thread.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.scheduler = default_scheduler()
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                self.scheduler.tick()
+            except Exception as e:
+                # A failed job is put back for retry; keep ticking
+                print(f"Scheduler tick failed: {str(e)}")
+            # Sleep in short steps so closing the dashboard doesn't wait out a whole tick
+            for _ in range(10):
+                if self.isInterruptionRequested():
+                    break
+                self.msleep(100)
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
 class AdminDashboard(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -117,8 +146,28 @@ class AdminDashboard(QMainWindow):
             QPoint(user_button.rect().right() - menu.sizeHint().width(), 
                   user_button.rect().bottom()))))
 
+        # Live fleet map button
+        fleet_map_button = QPushButton("🗺  Fleet Map")
+        fleet_map_button.setFixedSize(140, 45)
+        fleet_map_button.setStyleSheet("""
+            QPushButton {
+                font-size: 16px;
+                border: 2px solid #0984e3;
+                border-radius: 22px;
+                padding: 5px 15px;
+                color: white;
+                text-align: center;
+                background-color: #2d3436;
+            }
+            QPushButton:hover {
+                background-color: #0984e3;
+            }
+        """)
+        fleet_map_button.clicked.connect(self.show_fleet_map)
+
         header_layout.addLayout(title_container)
         header_layout.addStretch()
+        header_layout.addWidget(fleet_map_button)
         header_layout.addWidget(user_button)
         
         layout.addWidget(header_widget)
@@ -164,6 +213,13 @@ class AdminDashboard(QMainWindow):
             font-size: 12px;
         """)
         layout.addWidget(status_bar)
+        
+        self.scheduler_thread = SchedulerThread(self)
+        self.scheduler_thread.start()
+
+    def closeEvent(self, event):
+        self.scheduler_thread.stop()
+        event.accept()
 
     def create_action_button(self, text, icon_name, color):
         button = QPushButton()
@@ -224,11 +280,18 @@ class AdminDashboard(QMainWindow):
         self.manage_bookings_window = ManageBookingsWindow(self)
         self.manage_bookings_window.show()
 
+    def show_fleet_map(self):
+        from admin_dashboard.fleet_map import FleetMapWindow
+        self.fleet_map_window = FleetMapWindow(self)
+        self.fleet_map_window.show()
+
     def show_analytics(self):
-        pass
+        self.analytics_window = AnalyticsWindow(self)
+        self.analytics_window.show()
 
     def show_reports(self):
-        pass
+        self.reports_window = ReportsWindow(self)
+        self.reports_window.show()
 
     def show_settings(self):
         pass
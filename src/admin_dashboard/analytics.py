@@ -0,0 +1,526 @@
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
+                           QTableWidgetItem, QLabel, QPushButton, QComboBox, QHeaderView,
+                           QFrame, QMessageBox, QTabWidget)
+from PyQt6.QtCore import Qt, QRectF, QThread, QUrl, pyqtSignal
+from PyQt6.QtGui import QColor, QPainter, QFont, QPen
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+import numpy as np
+from utils.map_scheme import install_map_scheme_handler
+from utils.map_bridge import MapBridge
+from utils import rollups
+from utils import driver_performance
+from utils import heatmap
+from utils.heatmap import demand_heatmap
+from utils.zones import zone_index
+import sqlite3
+import time
+import os
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+HEATMAP_URL = "taximap://assets/map/heatmap.html"
+
+
+class TrendChart(QWidget):
+    # Bookings per hour, day or month as bars, with the completed share drawn over them in green
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.points = []
+        self.setMinimumHeight(220)
+
+    def set_points(self, points):
+        self.points = points
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor('#2d3436'))
+        if not self.points:
+            return
+
+        left, top, bottom = 40, 15, 30
+        width = self.width() - left - 15
+        height = self.height() - top - bottom
+        peak = max(max(point[1] for point in self.points), 1)
+        slot = width / len(self.points)
+        bar = max(2.0, slot * 0.7)
+        label_every = max(1, int(len(self.points) / (width / 40)))
+
+        painter.setFont(QFont('Arial', 8))
+        painter.setPen(QColor('#95a5a6'))
+        painter.drawText(QRectF(0, top - 6, left - 6, 12), Qt.AlignmentFlag.AlignRight, str(peak))
+        painter.drawText(QRectF(0, top + height - 6, left - 6, 12), Qt.AlignmentFlag.AlignRight, '0')
+
+        for i, (label, bookings, completions, _) in enumerate(self.points):
+            x = left + i * slot + (slot - bar) / 2
+            booked_height = height * bookings / peak
+            completed_height = height * completions / peak
+            painter.fillRect(QRectF(x, top + height - booked_height, bar, booked_height), QColor('#6c5ce7'))
+            painter.fillRect(QRectF(x, top + height - completed_height, bar, completed_height), QColor('#00b894'))
+            if i % label_every == 0:
+                painter.setPen(QColor('#95a5a6'))
+                painter.drawText(QRectF(x - 20, top + height + 4, bar + 40, 14),
+                                 Qt.AlignmentFlag.AlignHCenter, label)
+
+
+class HeatmapLoader(QThread):
+    # Brings the demand heatmap up to date off the UI thread; a cold build reads every booking
+    done = pyqtSignal(float)  # Seconds taken
+    failed = pyqtSignal(str)
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            demand_heatmap.refresh()
+        except (sqlite3.Error, OSError) as e:
+            self.failed.emit(str(e))
+            return
+        self.done.emit(time.perf_counter() - start)
+
+
+class HeatmapView(QWebEngineView):
+    # Pickup counts per grid cell as a Leaflet layer over the zone boundaries, hottest cells
+    # brightest. Switching hours only resends the cells whose colour or count changed.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(500, 450)
+        install_map_scheme_handler()
+        self.bridge = MapBridge(self.page(), self)
+        for index, zone in enumerate(zone_index.zones):
+            ring = zone.ring + zone.ring[:1]
+            self.bridge.set_polyline(f"zone:{index}", [(lat, lng) for lng, lat in ring])
+        self.setUrl(QUrl(HEATMAP_URL))
+
+    def set_grid(self, grid):
+        cells = {}
+        if grid is not None and grid.any():
+            # Square-root scale, so quiet cells still show next to the busiest
+            intensity = np.sqrt(grid / grid.max())
+            for row, col in zip(*np.nonzero(grid)):
+                south = float(heatmap.BOUNDS[0] + row * heatmap.CELL_DEGREES)
+                west = float(heatmap.BOUNDS[1] + col * heatmap.CELL_DEGREES)
+                level = float(intensity[row, col])
+                cells[f"cell:{row}:{col}"] = {
+                    'bounds': [[south, west], [south + heatmap.CELL_DEGREES, west + heatmap.CELL_DEGREES]],
+                    'color': QColor(255, int(220 * (1 - level)), 0).name(),
+                    'opacity': round(0.25 + 0.7 * level, 2),
+                    'popup': f"{int(grid[row, col]):,} pickups",
+                }
+        self.bridge.sync_rectangles(cells)
+
+
+class HourOfWeekGrid(QWidget):
+    # 7 days x 24 hours of pickup totals; clicking a cell selects that hour
+    hourSelected = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.counts = np.zeros(168, dtype=np.int64)
+        self.selected = None
+        self.setFixedHeight(190)
+
+    def set_counts(self, counts):
+        self.counts = counts
+        self.update()
+
+    def cell_size(self):
+        return (self.width() - 40) / 24, (self.height() - 20) / 7
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setFont(QFont('Arial', 8))
+        width, height = self.cell_size()
+        peak = max(int(self.counts.max()), 1)
+        for hour in range(168):
+            day, hour_of_day = divmod(hour, 24)
+            level = self.counts[hour] / peak
+            rect = QRectF(40 + hour_of_day * width, day * height, width - 1, height - 1)
+            painter.fillRect(rect, QColor(int(45 + 210 * level), int(52 + 100 * level), int(54 + 20 * level)))
+            if hour == self.selected:
+                painter.setPen(QPen(QColor('white'), 2))
+                painter.drawRect(rect)
+        painter.setPen(QColor('#95a5a6'))
+        for day, name in enumerate(DAY_NAMES):
+            painter.drawText(QRectF(0, day * height, 36, height), Qt.AlignmentFlag.AlignVCenter, name)
+        for hour_of_day in range(0, 24, 6):
+            painter.drawText(QRectF(40 + hour_of_day * width, 7 * height + 2, 30, 16),
+                             Qt.AlignmentFlag.AlignLeft, f"{hour_of_day:02d}")
+
+    def mouseReleaseEvent(self, event):
+        width, height = self.cell_size()
+        column = int((event.position().x() - 40) // width)
+        day = int(event.position().y() // height)
+        if 0 <= column < 24 and 0 <= day < 7:
+            hour = day * 24 + column
+            self.selected = None if hour == self.selected else hour
+            self.update()
+            self.hourSelected.emit(self.selected)
+
+
+class AnalyticsWindow(QMainWindow):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("System Analytics")
+        self.setFixedSize(1200, 800)
+
+        self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.heatmap_loader = None
+
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #1e272e;
+            }
+            QTableWidget {
+                background-color: #2d3436;
+                color: white;
+                gridline-color: #1e272e;
+                border-radius: 5px;
+                font-size: 11px;
+            }
+            QHeaderView::section {
+                background-color: #2d3436;
+                color: white;
+                padding: 8px;
+                border: none;
+                font-weight: bold;
+                font-size: 11px;
+            }
+            QComboBox {
+                background-color: #34495e;
+                color: white;
+                padding: 6px;
+                border: 1px solid #3d566e;
+                border-radius: 5px;
+                min-width: 160px;
+                font-size: 12px;
+            }
+            QComboBox QAbstractItemView {
+                background-color: #2d3436;
+                color: white;
+                selection-background-color: #6c5ce7;
+            }
+            QLabel {
+                color: white;
+                font-size: 12px;
+            }
+            QFrame#card {
+                background-color: #2d3436;
+                border-radius: 10px;
+            }
+            QTabWidget::pane {
+                background-color: #1e272e;
+                border: none;
+            }
+            QTabWidget > QWidget > QWidget {
+                background-color: #1e272e;
+            }
+            QTabBar::tab {
+                background-color: #2d3436;
+                color: #b2bec3;
+                padding: 8px 20px;
+                border-top-left-radius: 5px;
+                border-top-right-radius: 5px;
+                font-size: 12px;
+            }
+            QTabBar::tab:selected {
+                background-color: #6c5ce7;
+                color: white;
+                font-weight: bold;
+            }
+        """)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        # Header
+        header_layout = QHBoxLayout()
+        back_btn = QPushButton("← Back to Dashboard")
+        back_btn.setStyleSheet("""
+            QPushButton {
+                background-color: transparent;
+                color: #6c5ce7;
+                border: none;
+                padding: 8px 15px;
+                font-size: 13px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                color: #a29bfe;
+            }
+        """)
+        back_btn.clicked.connect(self.close)
+
+        header = QLabel("System Analytics")
+        header.setStyleSheet("font-size: 24px; font-weight: bold; padding-bottom: 10px;")
+        header.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.period_combo = QComboBox()
+        self.period_combo.addItems(["Today", "Last 7 Days", "Last 30 Days", "Last 12 Months"])
+        self.period_combo.currentIndexChanged.connect(self.load_analytics)
+
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #6c5ce7;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                padding: 8px 20px;
+                font-size: 12px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #a29bfe;
+            }
+        """)
+        refresh_btn.clicked.connect(self.load_analytics)
+
+        header_layout.addWidget(back_btn)
+        header_layout.addStretch()
+        header_layout.addWidget(header)
+        header_layout.addStretch()
+        header_layout.addWidget(self.period_combo)
+        header_layout.addWidget(refresh_btn)
+        layout.addLayout(header_layout)
+
+        self.tabs = QTabWidget()
+        overview = QWidget()
+        overview_layout = QVBoxLayout(overview)
+        self.tabs.addTab(overview, "Overview")
+        self.tabs.addTab(self.create_heatmap_tab(), "Demand Heatmap")
+        self.tabs.addTab(self.create_performance_tab(), "Driver Performance")
+        self.tabs.currentChanged.connect(self.handle_tab_change)
+        layout.addWidget(self.tabs)
+
+        # Summary cards
+        cards_layout = QHBoxLayout()
+        self.card_values = {}
+        for key, title, color in (('bookings', 'Bookings', '#6c5ce7'),
+                                  ('completions', 'Completed', '#00b894'),
+                                  ('cancellations', 'Cancelled / No-show', '#e17055'),
+                                  ('revenue', 'Revenue', '#fdcb6e')):
+            card = QFrame()
+            card.setObjectName("card")
+            card_layout = QVBoxLayout(card)
+            title_label = QLabel(title)
+            title_label.setStyleSheet(f"color: {color}; font-size: 13px; font-weight: bold;")
+            value_label = QLabel("--")
+            value_label.setStyleSheet("font-size: 26px; font-weight: bold;")
+            card_layout.addWidget(title_label)
+            card_layout.addWidget(value_label)
+            self.card_values[key] = value_label
+            cards_layout.addWidget(card)
+        overview_layout.addLayout(cards_layout)
+
+        # Trend
+        self.trend_title = QLabel()
+        self.trend_title.setStyleSheet("font-size: 14px; font-weight: bold; padding-top: 8px;")
+        overview_layout.addWidget(self.trend_title)
+        self.trend_chart = TrendChart()
+        overview_layout.addWidget(self.trend_chart)
+
+        # Breakdowns
+        tables_layout = QHBoxLayout()
+        self.zone_table = self.create_table(["Zone", "Bookings", "Completed", "Cancelled", "Revenue"])
+        # Bookings are counted when made, before any driver has them, so drivers have no column
+        self.driver_table = self.create_table(["Driver", "Completed", "Cancelled", "Revenue"])
+        for title, table in (("By Pickup Zone", self.zone_table), ("By Driver", self.driver_table)):
+            column = QVBoxLayout()
+            label = QLabel(title)
+            label.setStyleSheet("font-size: 14px; font-weight: bold;")
+            column.addWidget(label)
+            column.addWidget(table)
+            tables_layout.addLayout(column)
+        overview_layout.addLayout(tables_layout)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: #95a5a6; font-size: 11px;")
+        layout.addWidget(self.status_label)
+
+        self.load_analytics()
+
+    def create_heatmap_tab(self):
+        tab = QWidget()
+        tab_layout = QHBoxLayout(tab)
+
+        self.heatmap_view = HeatmapView()
+        tab_layout.addWidget(self.heatmap_view, 3)
+
+        side = QVBoxLayout()
+        title = QLabel("Pickups by hour of the week")
+        title.setStyleSheet("font-size: 14px; font-weight: bold;")
+        hint = QLabel("Click an hour to map it; click it again for the whole week.")
+        hint.setStyleSheet("color: #95a5a6; font-size: 11px;")
+        hint.setWordWrap(True)
+        self.hour_grid = HourOfWeekGrid()
+        self.hour_grid.hourSelected.connect(self.show_heatmap_hour)
+        self.heatmap_label = QLabel()
+        self.heatmap_label.setStyleSheet("font-size: 13px; font-weight: bold; padding-top: 10px;")
+        self.heatmap_label.setWordWrap(True)
+        side.addWidget(title)
+        side.addWidget(hint)
+        side.addWidget(self.hour_grid)
+        side.addWidget(self.heatmap_label)
+        side.addStretch()
+        tab_layout.addLayout(side, 2)
+        return tab
+
+    def handle_tab_change(self, index):
+        self.load_analytics()
+
+    def load_heatmap(self):
+        # Only bookings made since the cached counts were built are read, but a cold build
+        # reads them all, so it runs on a thread and the map fills in when it's done
+        if self.heatmap_loader is not None:
+            return
+        if demand_heatmap.db_path != self.db_path:
+            demand_heatmap.use_database(self.db_path)
+        self.status_label.setText("Demand heatmap: updating...")
+        self.heatmap_loader = HeatmapLoader(self)
+        self.heatmap_loader.done.connect(self.heatmap_loaded)
+        self.heatmap_loader.failed.connect(self.heatmap_failed)
+        self.heatmap_loader.start()
+
+    def heatmap_loaded(self, elapsed):
+        self.finish_heatmap_loader()
+        self.hour_grid.set_counts(demand_heatmap.by_hour())
+        self.show_heatmap_hour(self.hour_grid.selected)
+        if self.tabs.currentIndex() == 1:
+            self.status_label.setText(f"Demand heatmap: {int(demand_heatmap.counts.sum()):,} pickups | "
+                                      f"Updated in {elapsed * 1000:.0f} ms")
+
+    def heatmap_failed(self, message):
+        self.finish_heatmap_loader()
+        QMessageBox.warning(self, "Error", f"Failed to load demand heatmap: {message}")
+
+    def finish_heatmap_loader(self):
+        self.heatmap_loader.wait()
+        self.heatmap_loader.deleteLater()
+        self.heatmap_loader = None
+
+    def closeEvent(self, event):
+        if self.heatmap_loader is not None:
+            self.heatmap_loader.done.disconnect()
+            self.heatmap_loader.failed.disconnect()
+            self.finish_heatmap_loader()
+        event.accept()
+
+    def show_heatmap_hour(self, hour):
+        if demand_heatmap.counts is None:
+            return
+        if hour is None:
+            self.heatmap_view.set_grid(demand_heatmap.grid())
+            self.heatmap_label.setText("Showing: the whole week")
+        else:
+            self.heatmap_view.set_grid(demand_heatmap.grid([hour]))
+            self.heatmap_label.setText(f"Showing: {DAY_NAMES[hour // 24]} {hour % 24:02d}:00-{hour % 24:02d}:59")
+
+    def create_performance_tab(self):
+        tab = QWidget()
+        tab_layout = QVBoxLayout(tab)
+        hint = QLabel("Acceptance and decline rates are per offer; completion is of trips started. "
+                      "A driver is only recomputed when their bookings have changed.")
+        hint.setStyleSheet("color: #95a5a6; font-size: 11px;")
+        hint.setWordWrap(True)
+        tab_layout.addWidget(hint)
+
+        self.performance_table = QTableWidget()
+        self.performance_table.setColumnCount(8)
+        self.performance_table.setHorizontalHeaderLabels(["Driver", "Offers", "Acceptance", "Decline",
+                                                          "Completion", "Trips", "Avg Response", "Avg Trip"])
+        self.performance_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.performance_table.verticalHeader().setVisible(False)
+        self.performance_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        tab_layout.addWidget(self.performance_table)
+        return tab
+
+    def load_driver_performance(self):
+        period = self.period_combo.currentText()
+        start = time.perf_counter()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            recomputed = driver_performance.refresh(conn, period)
+            rows = driver_performance.report(conn.cursor(), period)
+            conn.close()
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"Failed to load driver performance: {str(e)}")
+            return
+        elapsed = time.perf_counter() - start
+
+        def percent(count, total):
+            value = driver_performance.rate(count, total)
+            return f"{value:.1f}%" if value is not None else "--"
+
+        def minutes(seconds):
+            return f"{seconds / 60:.1f} min" if seconds is not None else "--"
+
+        self.performance_table.setRowCount(len(rows))
+        for row, (username, offers, accepted, declined, completed, incomplete, response, trip) in enumerate(rows):
+            values = [username, str(offers), percent(accepted, offers), percent(declined, offers),
+                      percent(completed, completed + incomplete), str(completed + incomplete),
+                      minutes(response), minutes(trip)]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.performance_table.setItem(row, col, item)
+
+        self.status_label.setText(f"{period}: {len(rows):,} drivers, {recomputed:,} recomputed | "
+                                  f"Loaded in {elapsed * 1000:.0f} ms")
+
+    def create_table(self, headers):
+        table = QTableWidget()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        return table
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        # (name, counts..., revenue)
+        for row, (name, *counts, revenue) in enumerate(rows):
+            values = [name or "Unknown"] + [str(count) for count in counts] + [f"TTD ${revenue:,.2f}"]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                table.setItem(row, col, item)
+
+    def load_analytics(self):
+        if self.tabs.currentIndex() == 1:
+            self.load_heatmap()
+            return
+        if self.tabs.currentIndex() == 2:
+            self.load_driver_performance()
+            return
+        # Everything here reads the rollup tables only, so it costs the same whatever the
+        # size of the booking history
+        period = self.period_combo.currentText()
+        first_day, last_day = rollups.period_days(period)
+        start = time.perf_counter()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            bookings, completions, cancellations, revenue = rollups.summary(cursor, first_day, last_day)
+            zones = rollups.by_zone(cursor, first_day, last_day)
+            drivers = rollups.by_driver(cursor, first_day, last_day)
+            unit, points = rollups.trend(cursor, first_day, last_day)
+            conn.close()
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"Failed to load analytics: {str(e)}")
+            return
+        elapsed = time.perf_counter() - start
+
+        self.card_values['bookings'].setText(f"{bookings:,}")
+        self.card_values['completions'].setText(f"{completions:,}")
+        self.card_values['cancellations'].setText(f"{cancellations:,}")
+        self.card_values['revenue'].setText(f"TTD ${revenue:,.2f}")
+
+        self.trend_title.setText(f"Bookings and completions per {unit}")
+        self.trend_chart.set_points(points)
+        self.fill_table(self.zone_table, zones)
+        self.fill_table(self.driver_table, drivers)
+
+        self.status_label.setText(f"{period}: {first_day} to {last_day} | Loaded in {elapsed * 1000:.0f} ms")
@@ -0,0 +1,118 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
+                           QTableWidgetItem, QLabel, QPushButton, QHeaderView, QMessageBox)
+from PyQt6.QtCore import Qt
+from utils import dispatch
+import sqlite3
+
+
+class DispatchPreviewDialog(QDialog):
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Dispatch Preview")
+        self.setFixedSize(900, 550)
+        self.db_path = db_path
+        self.proposals = []
+
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #1e272e;
+            }
+            QTableWidget {
+                background-color: #2d3436;
+                color: white;
+                gridline-color: #1e272e;
+                border-radius: 5px;
+                font-size: 11px;
+            }
+            QHeaderView::section {
+                background-color: #2d3436;
+                color: white;
+                padding: 8px;
+                border: none;
+                font-weight: bold;
+            }
+            QLabel {
+                color: white;
+                font-size: 12px;
+            }
+            QPushButton {
+                background-color: #00b894;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                padding: 8px 20px;
+                font-size: 12px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #00d8b4;
+            }
+        """)
+
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels([
+            "Booking ID", "Pickup Location", "Driver", "Pickup Distance", "ETA to Pickup"
+        ])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton("Recompute")
+        refresh_btn.clicked.connect(self.refresh)
+        self.apply_btn = QPushButton("Apply All")
+        self.apply_btn.clicked.connect(self.apply_proposals)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.reject)
+        buttons.addWidget(refresh_btn)
+        buttons.addStretch()
+        buttons.addWidget(self.apply_btn)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        try:
+            self.proposals = dispatch.plan(self.db_path)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"Failed to plan dispatch: {str(e)}")
+            self.proposals = []
+
+        self.table.setRowCount(len(self.proposals))
+        for row, proposal in enumerate(self.proposals):
+            values = [
+                str(proposal.booking_id),
+                proposal.pickup_location,
+                proposal.driver_name,
+                f"{proposal.pickup_km:.1f} km",
+                f"{max(1, round(proposal.eta_seconds / 60))} min",
+            ]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.table.setItem(row, col, item)
+
+        self.summary_label.setText(f"{len(self.proposals)} assignment(s) proposed for bookings due "
+                                   f"within {dispatch.HORIZON_SECONDS // 60} minutes")
+        self.apply_btn.setEnabled(bool(self.proposals))
+
+    def apply_proposals(self):
+        try:
+            applied = dispatch.apply(self.proposals, self.db_path)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"Failed to apply assignments: {str(e)}")
+            return
+
+        skipped = len(self.proposals) - len(applied)
+        message = f"{len(applied)} driver(s) assigned."
+        if skipped:
+            message += f"\n{skipped} skipped because the booking or driver was taken in the meantime."
+        QMessageBox.information(self, "Dispatch", message)
+        self.accept()
@@ -0,0 +1,201 @@
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                           QLabel, QPushButton, QMessageBox)
+from PyQt6.QtCore import Qt, QTimer, QUrl, QThread, pyqtSignal, pyqtSlot
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+from utils.map_scheme import install_map_scheme_handler
+from utils.map_bridge import MapBridge
+from utils.fleet_clusters import PointSet, cluster
+import sqlite3
+import os
+import time
+
+FLEET_MAP_URL = "taximap://assets/map/fleet_map.html"
+
+
+class FleetMapBridge(MapBridge):
+    viewportChanged = pyqtSignal(int, tuple)
+
+    @pyqtSlot(int, float, float, float, float)
+    def viewChanged(self, zoom, south, west, north, east):
+        self.viewportChanged.emit(zoom, (south, west, north, east))
+
+
+class FleetLoader(QThread):
+    # Reads positions and open bookings, projects and clusters them off the UI thread;
+    # with tens of thousands of each that is too slow to do every tick in the window
+    done = pyqtSignal(object, object, object)  # drivers, bookings, markers
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path, stale_seconds, zoom, bounds, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.stale_seconds = stale_seconds
+        self.zoom = zoom
+        self.bounds = bounds
+
+    def run(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT l.driver_id, l.latitude, l.longitude, d.username
+                    FROM driver_locations l
+                    JOIN drivers d ON l.driver_id = d.id
+                    WHERE l.recorded_at >= ?
+                ''', (time.time() - self.stale_seconds,))
+                drivers = PointSet('drivers', cursor.fetchall())
+
+                cursor.execute('''
+                    SELECT id, pickup_lat, pickup_lng,
+                           'Booking #' || id || ' (' || booking_status || ')'
+                    FROM bookings
+                    WHERE booking_status IN ('pending', 'assigned', 'confirmed', 'on_the_way')
+                    AND pickup_lat IS NOT NULL
+                ''')
+                bookings = PointSet('bookings', cursor.fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.failed.emit(str(e))
+            return
+
+        markers = cluster(drivers, self.zoom, self.bounds)
+        markers.update(cluster(bookings, self.zoom, self.bounds))
+        self.done.emit(drivers, bookings, markers)
+
+
+class FleetMapWindow(QMainWindow):
+    REFRESH_MS = 5000
+    DRIVER_STALE_SECONDS = 600
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Live Fleet Map")
+        self.setFixedSize(1200, 800)
+
+        self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+
+        self.drivers = PointSet('drivers', [])
+        self.bookings = PointSet('bookings', [])
+        self.zoom = 9
+        self.bounds = None
+        self.loader = None
+
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #1e272e;
+            }
+            QLabel {
+                color: white;
+                font-size: 12px;
+            }
+        """)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        # Header
+        header_container = QWidget()
+        header_layout = QHBoxLayout(header_container)
+
+        back_btn = QPushButton("← Back to Dashboard")
+        back_btn.setStyleSheet("""
+            QPushButton {
+                background-color: transparent;
+                color: #00b894;
+                border: none;
+                padding: 8px 15px;
+                font-size: 13px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                color: #00d8b4;
+            }
+        """)
+        back_btn.clicked.connect(self.close)
+
+        header = QLabel("Live Fleet Map")
+        header.setStyleSheet("""
+            font-size: 24px;
+            color: white;
+            font-weight: bold;
+            padding-bottom: 10px;
+        """)
+        header.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.summary_label = QLabel("Loading fleet...")
+        self.summary_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        self.summary_label.setStyleSheet("color: #95a5a6;")
+
+        header_layout.addWidget(back_btn, 1)
+        header_layout.addWidget(header, 4)
+        header_layout.addWidget(self.summary_label, 1)
+
+        # Map
+        install_map_scheme_handler()
+        self.web_view = QWebEngineView()
+        self.bridge = FleetMapBridge(self.web_view.page(), self)
+        self.bridge.viewportChanged.connect(self.handle_viewport_change)
+        self.web_view.setUrl(QUrl(FLEET_MAP_URL))
+
+        layout.addWidget(header_container)
+        layout.addWidget(self.web_view)
+
+        # Positions and bookings are reloaded periodically; panning only re-clusters
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.refresh_fleet)
+        self.refresh_timer.start(self.REFRESH_MS)
+
+        self.refresh_fleet()
+
+    def refresh_fleet(self):
+        # A tick that comes round while the last load is still running is skipped
+        if self.loader is not None:
+            return
+        self.loader = FleetLoader(self.db_path, self.DRIVER_STALE_SECONDS, self.zoom, self.bounds, self)
+        self.loader.done.connect(self.fleet_loaded)
+        self.loader.failed.connect(self.fleet_failed)
+        self.loader.start()
+
+    def fleet_loaded(self, drivers, bookings, markers):
+        view = (self.loader.zoom, self.loader.bounds)
+        self.finish_loader()
+        self.drivers = drivers
+        self.bookings = bookings
+        self.summary_label.setText(f"{len(self.drivers)} drivers · {len(self.bookings)} active bookings")
+        if view == (self.zoom, self.bounds):
+            self.bridge.sync_markers(markers)
+        else:
+            # Panned or zoomed while loading
+            self.update_markers()
+
+    def fleet_failed(self, message):
+        self.finish_loader()
+        self.refresh_timer.stop()
+        QMessageBox.warning(self, "Error", f"Failed to load fleet: {message}")
+
+    def finish_loader(self):
+        self.loader.wait()
+        self.loader.deleteLater()
+        self.loader = None
+
+    def handle_viewport_change(self, zoom, bounds):
+        self.zoom = zoom
+        self.bounds = bounds
+        self.update_markers()
+
+    def update_markers(self):
+        markers = cluster(self.drivers, self.zoom, self.bounds)
+        markers.update(cluster(self.bookings, self.zoom, self.bounds))
+        self.bridge.sync_markers(markers)
+
+    def closeEvent(self, event):
+        self.refresh_timer.stop()
+        if self.loader is not None:
+            self.loader.done.disconnect()
+            self.loader.failed.disconnect()
+            self.finish_loader()
+        event.accept()
@@ -1,13 +1,20 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QTableWidget, 
                            QTableWidgetItem, QLabel, QPushButton, QHeaderView,
                            QHBoxLayout, QMessageBox, QComboBox)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QColor
 from utils.session import current_session
+from utils.surge import surge_engine
+from utils import dispatch
+from utils import assignment
+from utils.availability import driver_availability, booking_window
+from utils.pending_queue import pending_queue
 import sqlite3
 import os
 
 class ManageBookingsWindow(QMainWindow):
+    URGENT_ROWS = 100  # Pending bookings placed by the queue when sorting by urgency
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Manage Bookings")
@@ -17,6 +24,9 @@ class ManageBookingsWindow(QMainWindow):
         self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
                                    'database', 'taxi_booking.db')
         
+        # Version of each booking as last loaded; assignments only apply if it hasn't moved
+        self.booking_versions = {}
+        
         self.setStyleSheet("""
             QMainWindow {
                 background-color: #1e272e;
@@ -120,6 +130,7 @@ class ManageBookingsWindow(QMainWindow):
         
         self.sort_combo = QComboBox()
         self.sort_combo.addItems([
+            "Sort by Urgency (Pending First)",
             "Sort by Date (Newest First)", 
             "Sort by Date (Oldest First)",
             "Sort by ID (Highest First)", 
@@ -141,6 +152,37 @@ class ManageBookingsWindow(QMainWindow):
         filter_layout.addWidget(self.sort_combo)
         filter_layout.addStretch()
         
+        # Dispatcher controls: preview a round, or let it assign on a timer
+        dispatch_style = """
+            QPushButton {
+                background-color: #34495e;
+                color: white;
+                padding: 6px 12px;
+                border: 1px solid #3d566e;
+                border-radius: 5px;
+                font-size: 12px;
+            }
+            QPushButton:hover, QPushButton:checked {
+                border: 1px solid #00b894;
+                background-color: #00b894;
+            }
+        """
+        preview_btn = QPushButton("Dispatch Preview")
+        preview_btn.setStyleSheet(dispatch_style)
+        preview_btn.clicked.connect(self.show_dispatch_preview)
+        
+        self.auto_dispatch_btn = QPushButton("Auto-dispatch: Off")
+        self.auto_dispatch_btn.setCheckable(True)
+        self.auto_dispatch_btn.setStyleSheet(dispatch_style)
+        self.auto_dispatch_btn.toggled.connect(self.toggle_auto_dispatch)
+        
+        self.dispatch_timer = QTimer(self)
+        self.dispatch_timer.setInterval(5000)
+        self.dispatch_timer.timeout.connect(self.run_dispatch)
+        
+        filter_layout.addWidget(preview_btn)
+        filter_layout.addWidget(self.auto_dispatch_btn)
+        
         # Add all header elements with proper spacing
         header_layout.addWidget(back_btn, 1)
         header_layout.addWidget(header, 4)
@@ -179,6 +221,34 @@ class ManageBookingsWindow(QMainWindow):
         # Load initial data
         self.load_bookings()
 
+    def show_dispatch_preview(self):
+        from admin_dashboard.dispatch_preview import DispatchPreviewDialog
+        dialog = DispatchPreviewDialog(self.db_path, self)
+        if dialog.exec():
+            self.load_bookings()
+
+    def toggle_auto_dispatch(self, enabled):
+        self.auto_dispatch_btn.setText(f"Auto-dispatch: {'On' if enabled else 'Off'}")
+        if enabled:
+            self.dispatch_timer.start()
+            self.run_dispatch()
+        else:
+            self.dispatch_timer.stop()
+
+    def run_dispatch(self):
+        try:
+            applied = dispatch.apply(dispatch.plan(self.db_path), self.db_path)
+        except sqlite3.Error as e:
+            self.auto_dispatch_btn.setChecked(False)
+            QMessageBox.warning(self, "Error", f"Auto-dispatch stopped: {str(e)}")
+            return
+        if applied:
+            self.load_bookings()
+
+    def closeEvent(self, event):
+        self.dispatch_timer.stop()
+        event.accept()
+
     def get_status_color(self, status):
         status_colors = {
             'pending': '#f1c40f',    # Yellow
@@ -218,7 +288,7 @@ class ManageBookingsWindow(QMainWindow):
         """)
 
         if current_status == 'pending':
-            self.load_available_drivers(driver_combo)
+            self.load_available_drivers(driver_combo, booking_id)
             driver_combo.currentIndexChanged.connect(
                 lambda index, b_id=booking_id, combo=driver_combo: 
                 self.handle_driver_selection(b_id, combo) if index > 0 else None
@@ -236,33 +306,57 @@ class ManageBookingsWindow(QMainWindow):
 
     def apply_filter(self):
         sort_option = self.sort_combo.currentText()
-        if "Date" in sort_option:
+        if "Urgency" in sort_option:
+            self.load_bookings()
+        elif "Date" in sort_option:
             order = "DESC" if "Newest" in sort_option else "ASC"
             self.load_bookings(f"ORDER BY b.pickup_time {order}")
         else:
             order = "DESC" if "Highest" in sort_option else "ASC"
             self.load_bookings(f"ORDER BY b.id {order}")
 
-    def load_bookings(self, order_clause="ORDER BY b.created_at DESC"):
+    def load_bookings(self, order_clause=None):
+        if order_clause is None and "Urgency" not in self.sort_combo.currentText():
+            order_clause = "ORDER BY b.created_at DESC"
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
 
-            query = f'''
+            columns = '''
                 SELECT b.id, u.username, b.pickup_location, b.dropoff_location,
-                       b.pickup_time, b.booking_status, b.fare, d.username
+                       b.pickup_time, b.booking_status, b.fare, d.username, b.version
                 FROM bookings b
                 LEFT JOIN users u ON b.user_id = u.id
                 LEFT JOIN drivers d ON b.driver_id = d.id
-                {order_clause}
             '''
-            
-            cursor.execute(query)
-            bookings = cursor.fetchall()
+
+            if order_clause is None:
+                # The most urgent pending bookings in the order the queue would hand them out,
+                # then everything else with the rest of the backlog first
+                pending_queue.sync()
+                urgent = [booking.booking_id for booking in pending_queue.peek(self.URGENT_ROWS)]
+                bookings = []
+                if urgent:
+                    cursor.execute(f"{columns} WHERE b.id IN ({', '.join('?' * len(urgent))})", urgent)
+                    rank = {booking_id: i for i, booking_id in enumerate(urgent)}
+                    bookings = sorted(cursor.fetchall(), key=lambda booking: rank[booking[0]])
+                    shown = f"WHERE b.id NOT IN ({', '.join('?' * len(urgent))})"
+                else:
+                    shown = ""
+                cursor.execute(f'''
+                    {columns} {shown}
+                    ORDER BY b.booking_status = 'pending' AND b.driver_id IS NULL DESC, b.created_at DESC
+                ''', urgent)
+                bookings.extend(cursor.fetchall())
+            else:
+                cursor.execute(f"{columns} {order_clause}")
+                bookings = cursor.fetchall()
+
             self.bookings_table.setRowCount(len(bookings))
+            self.booking_versions = {booking[0]: booking[8] for booking in bookings}
 
             for row, booking in enumerate(bookings):
-                for col, value in enumerate(booking):
+                for col, value in enumerate(booking[:8]):
                     if col != 7:  # Skip driver assignment column
                         item = QTableWidgetItem(str(value if value is not None else '-'))
                         item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -278,27 +372,29 @@ class ManageBookingsWindow(QMainWindow):
         finally:
             conn.close()
 
-    def load_available_drivers(self, combo_box):
+    def load_available_drivers(self, combo_box, booking_id):
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
 
+            # Drivers who have declined this booking aren't offered it again
             cursor.execute('''
-                SELECT d.username 
-                FROM drivers d
-                WHERE d.id NOT IN (
-                    SELECT driver_id 
-                    FROM bookings 
-                    WHERE booking_status = 'assigned'
-                    AND driver_id IS NOT NULL
-                )
-            ''')
+                SELECT d.id, d.username FROM drivers d
+                WHERE d.id NOT IN (SELECT driver_id FROM booking_declines WHERE booking_id = ?)
+                ORDER BY d.username
+            ''', (booking_id,))
             drivers = cursor.fetchall()
             
+            # Only drivers with no committed trip overlapping this booking's window
+            window = booking_window(cursor, booking_id)
+            if window is not None:
+                free = set(driver_availability.free_drivers([driver[0] for driver in drivers], *window))
+                drivers = [driver for driver in drivers if driver[0] in free]
+            
             combo_box.clear()
             combo_box.addItem("Select Driver")
             for driver in drivers:
-                combo_box.addItem(driver[0])
+                combo_box.addItem(driver[1])
                 
         except sqlite3.Error as e:
             QMessageBox.warning(self, "Error", f"Failed to load drivers: {str(e)}")
@@ -325,13 +421,16 @@ class ManageBookingsWindow(QMainWindow):
             cursor.execute('SELECT id FROM drivers WHERE username = ?', (selected_driver,))
             driver_id = cursor.fetchone()[0]
             
-            cursor.execute('''
-                UPDATE bookings 
-                SET driver_id = ?, booking_status = "assigned", admin_id = ?
-                WHERE id = ?
-            ''', (driver_id, current_session.user_id, booking_id))
-            
+            result = assignment.assign(conn, booking_id, driver_id, current_session.user_id,
+                                       self.booking_versions.get(booking_id))
             conn.commit()
+            
+            if result != assignment.ASSIGNED:
+                QMessageBox.warning(self, "Assignment Failed", self.lost_race_message(result, selected_driver))
+                self.load_bookings()
+                return
+            
+            surge_engine.invalidate()
             QMessageBox.information(self, "Success", f"Driver {selected_driver} has been assigned successfully!")
             self.load_bookings()
             
@@ -340,6 +439,15 @@ class ManageBookingsWindow(QMainWindow):
         finally:
             conn.close()
 
+    def lost_race_message(self, result, selected_driver=None):
+        if result == assignment.DRIVER_BUSY:
+            return f"Driver {selected_driver} has just been given another booking."
+        if result == assignment.DRIVER_DECLINED:
+            return f"Driver {selected_driver} has already declined this booking."
+        if result == assignment.NOT_FOUND:
+            return "This booking no longer exists."
+        return "This booking was changed by someone else. The list has been refreshed."
+
     def unassign_driver(self, booking_id):
         reply = QMessageBox.question(self, 'Confirm Unassign',
                                    'Are you sure you want to unassign the driver from this booking?',
@@ -351,13 +459,15 @@ class ManageBookingsWindow(QMainWindow):
                 conn = sqlite3.connect(self.db_path)
                 cursor = conn.cursor()
 
-                cursor.execute('''
-                    UPDATE bookings 
-                    SET driver_id = NULL, booking_status = "pending", admin_id = NULL
-                    WHERE id = ?
-                ''', (booking_id,))
-                
+                result = assignment.unassign(conn, booking_id, self.booking_versions.get(booking_id))
                 conn.commit()
+                
+                if result != assignment.UNASSIGNED:
+                    QMessageBox.warning(self, "Unassign Failed", self.lost_race_message(result))
+                    self.load_bookings()
+                    return
+                
+                surge_engine.invalidate()
                 QMessageBox.information(self, "Success", "Driver has been unassigned successfully!")
                 self.load_bookings()
                 
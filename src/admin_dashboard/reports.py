@@ -0,0 +1,210 @@
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                           QComboBox, QCheckBox, QProgressBar, QFileDialog, QMessageBox)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from utils import reports
+import time
+import os
+
+
+class ReportWorker(QThread):
+    # Runs one export off the UI thread; progress arrives once per batch
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)  # Rows written, or None if cancelled
+    failed = pyqtSignal(str)
+
+    def __init__(self, report_name, path, fmt, compress, db_path, parent=None):
+        super().__init__(parent)
+        self.report_name = report_name
+        self.path = path
+        self.fmt = fmt
+        self.compress = compress
+        self.db_path = db_path
+        self.cancel_requested = False
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def run(self):
+        try:
+            rows = reports.export(self.report_name, self.path, self.fmt, self.compress, self.db_path,
+                                  progress=self.progress.emit, cancelled=lambda: self.cancel_requested)
+        except Exception as e:
+            # Anything uncaught would leave the window waiting for a result that never comes
+            self.failed.emit(str(e))
+            return
+        self.done.emit(rows)
+
+
+class ReportsWindow(QMainWindow):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Reports")
+        self.setFixedSize(700, 420)
+
+        self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.worker = None
+        self.started_at = 0.0
+
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #1e272e;
+            }
+            QLabel, QCheckBox {
+                color: white;
+                font-size: 12px;
+            }
+            QComboBox {
+                background-color: #34495e;
+                color: white;
+                padding: 6px;
+                border: 1px solid #3d566e;
+                border-radius: 5px;
+                min-width: 220px;
+                font-size: 12px;
+            }
+            QComboBox QAbstractItemView {
+                background-color: #2d3436;
+                color: white;
+                selection-background-color: #fdcb6e;
+                selection-color: #2d3436;
+            }
+            QPushButton {
+                background-color: #fdcb6e;
+                color: #2d3436;
+                border: none;
+                border-radius: 5px;
+                padding: 8px 20px;
+                font-size: 12px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #ffeaa7;
+            }
+            QPushButton:disabled {
+                background-color: #636e72;
+                color: #b2bec3;
+            }
+            QProgressBar {
+                background-color: #2d3436;
+                color: white;
+                border: 1px solid #3d566e;
+                border-radius: 5px;
+                text-align: center;
+                height: 22px;
+            }
+            QProgressBar::chunk {
+                background-color: #fdcb6e;
+                border-radius: 4px;
+            }
+        """)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+        layout.setContentsMargins(30, 20, 30, 20)
+        layout.setSpacing(15)
+
+        header = QLabel("Reports")
+        header.setStyleSheet("font-size: 24px; font-weight: bold; padding-bottom: 10px;")
+        header.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(header)
+
+        self.report_combo = QComboBox()
+        for name, report in reports.REPORTS.items():
+            self.report_combo.addItem(report.title, name)
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("CSV", 'csv')
+        self.format_combo.addItem("NDJSON (one JSON object per line)", 'ndjson')
+        self.gzip_check = QCheckBox("Compress with gzip")
+
+        for label, widget in (("Report", self.report_combo), ("Format", self.format_combo)):
+            row = QHBoxLayout()
+            row.addWidget(QLabel(label))
+            row.addStretch()
+            row.addWidget(widget)
+            layout.addLayout(row)
+        layout.addWidget(self.gzip_check)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        self.status_label = QLabel("Choose a report and export it to a file.")
+        self.status_label.setStyleSheet("color: #95a5a6; font-size: 11px;")
+        layout.addWidget(self.status_label)
+
+        buttons = QHBoxLayout()
+        back_btn = QPushButton("Close")
+        back_btn.clicked.connect(self.close)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_export)
+        self.export_btn = QPushButton("Export...")
+        self.export_btn.clicked.connect(self.start_export)
+        buttons.addWidget(back_btn)
+        buttons.addStretch()
+        buttons.addWidget(self.cancel_btn)
+        buttons.addWidget(self.export_btn)
+        layout.addStretch()
+        layout.addLayout(buttons)
+
+    def start_export(self):
+        report_name = self.report_combo.currentData()
+        fmt = self.format_combo.currentData()
+        extension = '.csv' if fmt == 'csv' else '.ndjson'
+        if self.gzip_check.isChecked():
+            extension += '.gz'
+        path, _ = QFileDialog.getSaveFileName(self, "Export Report", report_name + extension)
+        if not path:
+            return
+
+        self.worker = ReportWorker(report_name, path, fmt, self.gzip_check.isChecked(), self.db_path, self)
+        self.worker.progress.connect(self.show_progress)
+        self.worker.done.connect(self.export_done)
+        self.worker.failed.connect(self.export_failed)
+        self.started_at = time.perf_counter()
+        self.progress_bar.setValue(0)
+        self.status_label.setText(f"Exporting to {path}...")
+        self.export_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.worker.start()
+
+    def show_progress(self, done, total):
+        self.progress_bar.setValue(int(100 * done / total) if total else 100)
+        elapsed = time.perf_counter() - self.started_at
+        self.status_label.setText(f"{done:,} of {total:,} rows ({done / max(elapsed, 0.001):,.0f} rows/s)")
+
+    def cancel_export(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+
+    def export_done(self, rows):
+        self.finish_worker()
+        if rows is None:
+            self.progress_bar.setValue(0)
+            self.status_label.setText("Export cancelled.")
+            return
+        self.progress_bar.setValue(100)
+        self.status_label.setText(f"Exported {rows:,} rows in {time.perf_counter() - self.started_at:.1f}s.")
+
+    def export_failed(self, message):
+        self.finish_worker()
+        self.status_label.setText("Export failed.")
+        QMessageBox.warning(self, "Error", f"Failed to export report: {message}")
+
+    def finish_worker(self):
+        self.worker.wait()
+        self.worker = None
+        self.export_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+
+    def closeEvent(self, event):
+        # Don't leave a half-written file or a thread writing after the window is gone
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+        super().closeEvent(event)
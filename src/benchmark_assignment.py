@@ -0,0 +1,131 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+from create_database import create_database
+from utils.assignment import assign, ASSIGNED, DRIVER_BUSY
+
+
+def seed(db_path, bookings, drivers):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO drivers (username, password, email, phone, car_model, license_plate, full_name, driver_license)
+            VALUES (?, 'x', ?, '(868) 555-0000', 'Benchmark', ?, 'Benchmark Driver', ?)
+        ''', [(f'bench{i}', f'bench{i}@test.com', f'B{i:05d}', f'DL{i:05d}') for i in range(drivers)])
+        conn.executemany('''
+            INSERT INTO bookings (user_id, pickup_location, dropoff_location, pickup_time, fare)
+            VALUES (1, 'Benchmark pickup', 'Benchmark dropoff', '01/01/2025 08:00 AM', '50.00')
+        ''', [()] * bookings)
+    conn.close()
+
+
+def unguarded_assign(conn, booking_id, driver_id):
+    # What assign_driver used to do: the admin saw the booking as pending when the table
+    # loaded, then the write goes through without re-checking
+    status = conn.execute('SELECT booking_status FROM bookings WHERE id = ?', (booking_id,)).fetchone()[0]
+    if status != 'pending':
+        return 'booking_taken'
+    conn.execute('''
+        UPDATE bookings SET driver_id = ?, booking_status = 'assigned' WHERE id = ?
+    ''', (driver_id, booking_id))
+    return ASSIGNED
+
+
+def worker(db_path, booking_ids, driver_ids, seed_value, unguarded, results):
+    rng = random.Random(seed_value)
+    booking_ids = list(booking_ids)
+    rng.shuffle(booking_ids)
+    conn = sqlite3.connect(db_path, timeout=60)
+    wins = []
+    attempts = Counter()
+    try:
+        for booking_id in booking_ids:
+            # A few drivers per booking, as an admin would try another after a busy one
+            for driver_id in rng.sample(driver_ids, 3):
+                if unguarded:
+                    result = unguarded_assign(conn, booking_id, driver_id)
+                    conn.commit()
+                else:
+                    with conn:
+                        result = assign(conn, booking_id, driver_id)
+                attempts[result] += 1
+                if result == ASSIGNED:
+                    wins.append((booking_id, driver_id))
+                if result != DRIVER_BUSY:
+                    break
+    finally:
+        conn.close()
+    results.put((wins, attempts))
+
+
+def run_benchmark(processes, bookings, drivers, unguarded=False, db_path=None):
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'assignment_benchmark.db')
+    create_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+    seed(db_path, bookings, drivers)
+
+    conn = sqlite3.connect(db_path)
+    booking_ids = [row[0] for row in conn.execute('SELECT id FROM bookings ORDER BY id')]
+    driver_ids = [row[0] for row in conn.execute('SELECT id FROM drivers ORDER BY id')]
+    conn.close()
+
+    # Every process goes after every booking, so each one is contested `processes` times
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker,
+                                       args=(db_path, booking_ids, driver_ids, n, unguarded, results))
+               for n in range(processes)]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    outcomes = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    wins = [win for process_wins, _ in outcomes for win in process_wins]
+    attempts = Counter()
+    for _, process_attempts in outcomes:
+        attempts.update(process_attempts)
+
+    # Double assignment: a booking won more than once, or a driver holding two bookings
+    booking_wins = Counter(booking_id for booking_id, _ in wins)
+    double_bookings = sum(1 for count in booking_wins.values() if count > 1)
+    conn = sqlite3.connect(db_path)
+    double_drivers = conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT driver_id FROM bookings
+            WHERE booking_status = 'assigned'
+            GROUP BY driver_id HAVING COUNT(*) > 1
+        )
+    ''').fetchone()[0]
+    conn.close()
+
+    total = sum(attempts.values())
+    print(f"{'Unguarded' if unguarded else 'Compare-and-set'}: {processes} processes, "
+          f"{bookings} bookings, {drivers} drivers")
+    print(f"  {total} attempts in {elapsed:.2f}s ({total / elapsed:,.0f}/s)")
+    print(f"  outcomes: {dict(attempts)}")
+    print(f"  bookings won more than once: {double_bookings}")
+    print(f"  drivers given more than one booking: {double_drivers}")
+    return double_bookings + double_drivers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent driver assignment benchmark")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--drivers", type=int, default=2500)
+    parser.add_argument("--unguarded", action="store_true", help="use the old read-then-write assignment")
+    parser.add_argument("--db", help="database file to create (defaults to a temporary one)")
+    args = parser.parse_args()
+
+    doubles = run_benchmark(args.processes, args.bookings, args.drivers, args.unguarded, args.db)
+    raise SystemExit(1 if doubles and not args.unguarded else 0)
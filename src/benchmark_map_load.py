@@ -0,0 +1,99 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import Qt, QTimer, QUrl, QEventLoop
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+from utils.map_scheme import register_map_scheme, install_map_scheme_handler, BOOKING_MAP_URL
+
+# The page MapView used to build inline, pulling Leaflet from unpkg and tiles from OSM
+CDN_MAP_HTML = '''
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <link rel="stylesheet" href="https://unpkg.com/leaflet@1.7.1/dist/leaflet.css"/>
+        <script src="https://unpkg.com/leaflet@1.7.1/dist/leaflet.js"></script>
+        <style>
+            body { margin: 0; }
+            #map { height: 100vh; }
+        </style>
+    </head>
+    <body>
+        <div id="map"></div>
+        <script>
+            window.mapReady = false;
+            var map = L.map('map').setView([10.6918, -61.2225], 9);
+            L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+                attribution: '© OpenStreetMap contributors'
+            }).once('load', function() { window.mapReady = true; }).addTo(map);
+        </script>
+    </body>
+    </html>
+'''
+
+
+def time_first_render(load_page, timeout=30.0):
+    view = QWebEngineView()
+    view.resize(800, 800)
+    view.show()
+
+    loop = QEventLoop()
+    result = {'elapsed': None}
+    start = time.perf_counter()
+
+    def check_ready(ready):
+        if ready:
+            result['elapsed'] = time.perf_counter() - start
+            loop.quit()
+
+    def poll():
+        if time.perf_counter() - start > timeout:
+            loop.quit()
+            return
+        view.page().runJavaScript("window.mapReady === true", check_ready)
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(5)
+
+    load_page(view)
+    loop.exec()
+    timer.stop()
+    view.close()
+    view.deleteLater()
+    return result['elapsed']
+
+
+def report(label, samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        print(f"{label}: map never rendered (offline?)")
+        return
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label}: median {statistics.median(samples) * 1000:.0f} ms, "
+          f"p95 {p95 * 1000:.0f} ms over {len(samples)} runs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time from page load to first rendered map tiles")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--skip-cdn", action="store_true", help="only measure the bundled page")
+    args = parser.parse_args()
+
+    QApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
+    register_map_scheme()
+    app = QApplication(sys.argv)
+    install_map_scheme_handler()
+
+    if not args.skip_cdn:
+        cdn = [time_first_render(lambda view: view.setHtml(CDN_MAP_HTML)) for _ in range(args.runs)]
+        report("CDN Leaflet (before)", cdn)
+
+    bundled = [time_first_render(lambda view: view.setUrl(QUrl(BOOKING_MAP_URL))) for _ in range(args.runs)]
+    report("Bundled Leaflet (after)", bundled)
@@ -1,9 +1,11 @@
 import sqlite3
 import os
+from utils import rollups
 
-def create_database():
+def create_database(db_path=None):
     # Get absolute path to database
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'taxi_booking.db')
+    if db_path is None:
+        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'taxi_booking.db')
     
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -70,9 +72,370 @@ def create_database():
     )
     ''')
 
-    
+    # Create driver positions table (GPS pings, written in batches)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS driver_positions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        driver_id INTEGER NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        speed REAL,
+        heading REAL,
+        recorded_at REAL NOT NULL,
+        FOREIGN KEY (driver_id) REFERENCES drivers(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_driver_positions_driver_time
+    ON driver_positions (driver_id, recorded_at)
+    ''')
+
+    # Create driver locations table (latest known position per driver)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS driver_locations (
+        driver_id INTEGER PRIMARY KEY,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        recorded_at REAL NOT NULL,
+        FOREIGN KEY (driver_id) REFERENCES drivers(id)
+    )
+    ''')
+
+    # Create route geometries table (encoded polylines, one row per stored zoom level)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS route_geometries (
+        origin_cell TEXT NOT NULL,
+        destination_cell TEXT NOT NULL,
+        zoom INTEGER NOT NULL,
+        polyline TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (origin_cell, destination_cell, zoom)
+    )
+    ''')
+
+    # Create reverse geocode cache (one place name per ~20 m grid cell)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reverse_geocodes (
+        cell_lat INTEGER NOT NULL,
+        cell_lng INTEGER NOT NULL,
+        display_name TEXT NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (cell_lat, cell_lng)
+    )
+    ''')
+
+    # Create booking status history (one row per status change, written by the triggers below)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS booking_status_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        booking_id INTEGER NOT NULL,
+        old_status TEXT,
+        new_status TEXT NOT NULL,
+        driver_id INTEGER,
+        changed_at REAL NOT NULL,
+        FOREIGN KEY (booking_id) REFERENCES bookings(id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_booking_status_history_booking
+    ON booking_status_history (booking_id, changed_at)
+    ''')
+
+    # Create ETA model (trip pace per pickup zone, dropoff zone and hour of week; -1 = any hour)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS eta_estimates (
+        pickup_zone TEXT NOT NULL,
+        dropoff_zone TEXT NOT NULL,
+        hour_of_week INTEGER NOT NULL,
+        trips INTEGER NOT NULL DEFAULT 0,
+        total_seconds REAL NOT NULL DEFAULT 0,
+        total_km REAL NOT NULL DEFAULT 0,
+        seconds_per_km REAL,
+        PRIMARY KEY (pickup_zone, dropoff_zone, hour_of_week)
+    )
+    ''')
+
+    # Create watermarks (last history row each incremental job has consumed)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS watermarks (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # Create scheduled jobs (release to dispatch, reminders and no-show timeouts per booking)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        booking_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        due_at REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'scheduled',
+        fired_at REAL,
+        FOREIGN KEY (booking_id) REFERENCES bookings(id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_status
+    ON scheduled_jobs (status, id)
+    ''')
+
+    # Create notifications table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        booking_id INTEGER,
+        message TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        read_at DATETIME,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_notifications_user
+    ON notifications (user_id, read_at)
+    ''')
+
+    # Drivers who turned a booking down; dispatch won't offer it to them again
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS booking_declines (
+        booking_id INTEGER NOT NULL,
+        driver_id INTEGER NOT NULL,
+        declined_at REAL NOT NULL,
+        PRIMARY KEY (booking_id, driver_id),
+        FOREIGN KEY (booking_id) REFERENCES bookings(id),
+        FOREIGN KEY (driver_id) REFERENCES drivers(id)
+    )
+    ''')
+
+    # Booking counts and revenue per hour and per local day, by pickup zone and driver.
+    # Kept current by trg_rollup_status so analytics never has to scan bookings; a
+    # missing zone is '' and a missing driver 0 so they can sit in the primary key.
+    for table, bucket in (('rollup_hourly', 'hour_start INTEGER NOT NULL'),
+                          ('rollup_daily', 'day TEXT NOT NULL')):
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {bucket},
+            zone TEXT NOT NULL DEFAULT '',
+            driver_id INTEGER NOT NULL DEFAULT 0,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            completions INTEGER NOT NULL DEFAULT 0,
+            cancellations INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ({bucket.split()[0]}, zone, driver_id)
+        )
+        ''')
+
+    # Driver performance per (driver, period), computed from the status history on demand
+    # and kept until the driver's activity_version moves on or the period's days roll over
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS driver_performance (
+        driver_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        first_day TEXT NOT NULL,
+        last_day TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        offers INTEGER NOT NULL DEFAULT 0,
+        accepted INTEGER NOT NULL DEFAULT 0,
+        declined INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        incomplete INTEGER NOT NULL DEFAULT 0,
+        avg_response_seconds REAL,
+        avg_trip_seconds REAL,
+        PRIMARY KEY (driver_id, period),
+        FOREIGN KEY (driver_id) REFERENCES drivers(id)
+    )
+    ''')
+
+    # Columns added after the first release; existing databases get them via ALTER TABLE
+    added_columns = [
+        ('bookings', 'pickup_lat REAL'),
+        ('bookings', 'pickup_lng REAL'),
+        ('bookings', 'dropoff_lat REAL'),
+        ('bookings', 'dropoff_lng REAL'),
+        ('bookings', 'distance_km REAL'),
+        ('bookings', 'pickup_zone TEXT'),
+        ('bookings', 'dropoff_zone TEXT'),
+        ('bookings', 'cancellation_reason TEXT'),
+        ('bookings', 'version INTEGER NOT NULL DEFAULT 0'),
+        ('bookings', 'window_start REAL'),
+        ('bookings', 'window_end REAL'),
+        ('users', "tier TEXT DEFAULT 'standard'"),
+        ('drivers', 'activity_version INTEGER NOT NULL DEFAULT 0'),
+    ]
+    for table, column in added_columns:
+        try:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_status
+    ON bookings (booking_status)
+    ''')
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_pickup_zone
+    ON bookings (pickup_zone)
+    ''')
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_driver_status
+    ON bookings (driver_id, booking_status)
+    ''')
+
+    # Any change of status or driver moves the version on, so compare-and-set writers
+    # notice edits made through paths that don't know about versions
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_version
+    AFTER UPDATE OF booking_status, driver_id ON bookings
+    BEGIN
+        UPDATE bookings SET version = version + 1 WHERE id = NEW.id;
+    END
+    ''')
+
+    # Edits to the rest of a booking (fare re-pricing, zone tagging, backfills) move it on
+    # too, so exports fingerprinted by version notice them. Only real changes count: a
+    # backfill that writes back the same value leaves the version alone.
+    content_columns = ['user_id', 'pickup_location', 'dropoff_location', 'pickup_time', 'fare', 'created_at',
+                       'pickup_lat', 'pickup_lng', 'dropoff_lat', 'dropoff_lng', 'distance_km',
+                       'pickup_zone', 'dropoff_zone']
+    # Databases made before the WHEN clause have the trigger without it
+    cursor.execute('DROP TRIGGER IF EXISTS trg_bookings_version_content')
+    cursor.execute(f'''
+    CREATE TRIGGER trg_bookings_version_content
+    AFTER UPDATE OF {', '.join(content_columns)} ON bookings
+    WHEN {' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in content_columns)}
+    BEGIN
+        UPDATE bookings SET version = version + 1 WHERE id = NEW.id;
+    END
+    ''')
+
+    # Record every status change, whichever window or process made it
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_status_insert
+    AFTER INSERT ON bookings
+    BEGIN
+        INSERT INTO booking_status_history (booking_id, old_status, new_status, driver_id, changed_at)
+        VALUES (NEW.id, NULL, NEW.booking_status, NEW.driver_id, (julianday('now') - 2440587.5) * 86400.0);
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_status_update
+    AFTER UPDATE OF booking_status ON bookings
+    WHEN OLD.booking_status IS NOT NEW.booking_status
+    BEGIN
+        INSERT INTO booking_status_history (booking_id, old_status, new_status, driver_id, changed_at)
+        VALUES (NEW.id, OLD.booking_status, NEW.booking_status, NEW.driver_id,
+                (julianday('now') - 2440587.5) * 86400.0);
+    END
+    ''')
+
+    # Fold each new booking, completion and cancellation into the hourly and daily rollups
+    for table, bucket in (('rollup_hourly', "CAST(NEW.changed_at / 3600 AS INTEGER) * 3600"),
+                          ('rollup_daily', "date(NEW.changed_at, 'unixepoch', 'localtime')")):
+        key = 'hour_start' if table == 'rollup_hourly' else 'day'
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}
+        AFTER INSERT ON booking_status_history
+        WHEN NEW.old_status IS NULL OR NEW.new_status IN ('completed', 'incomplete', 'cancelled')
+        BEGIN
+            INSERT INTO {table} ({key}, zone, driver_id, bookings, completions, cancellations, revenue)
+            SELECT {bucket}, COALESCE(b.pickup_zone, ''), COALESCE(NEW.driver_id, 0),
+                   NEW.old_status IS NULL,
+                   NEW.new_status = 'completed',
+                   NEW.new_status IN ('incomplete', 'cancelled'),
+                   CASE WHEN NEW.new_status = 'completed' THEN COALESCE(CAST(b.fare AS REAL), 0) ELSE 0 END
+            FROM bookings b WHERE b.id = NEW.booking_id
+            ON CONFLICT ({key}, zone, driver_id) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                completions = completions + excluded.completions,
+                cancellations = cancellations + excluded.cancellations,
+                revenue = revenue + excluded.revenue;
+        END
+        ''')
+
+    # Re-pricing a completed trip moves its revenue in the bucket where the completion was
+    # counted; bookings older than the status history were counted when they were made
+    for table, bucket in (('rollup_hourly', "CAST(c.at / 3600 AS INTEGER) * 3600"),
+                          ('rollup_daily', "date(c.at, 'unixepoch', 'localtime')")):
+        key = 'hour_start' if table == 'rollup_hourly' else 'day'
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fare
+        AFTER UPDATE OF fare ON bookings
+        WHEN OLD.booking_status = 'completed' AND NEW.booking_status = 'completed'
+        AND COALESCE(CAST(OLD.fare AS REAL), 0) != COALESCE(CAST(NEW.fare AS REAL), 0)
+        BEGIN
+            INSERT INTO {table} ({key}, zone, driver_id, bookings, completions, cancellations, revenue)
+            SELECT {bucket}, COALESCE(NEW.pickup_zone, ''), c.driver_id, 0, 0, 0,
+                   COALESCE(CAST(NEW.fare AS REAL), 0) - COALESCE(CAST(OLD.fare AS REAL), 0)
+            FROM (
+                SELECT changed_at AS at, COALESCE(driver_id, 0) AS driver_id FROM booking_status_history
+                WHERE booking_id = NEW.id AND new_status = 'completed'
+                UNION ALL
+                SELECT CAST(strftime('%s', NEW.created_at) AS REAL), COALESCE(NEW.driver_id, 0)
+                WHERE NOT EXISTS (SELECT 1 FROM booking_status_history WHERE booking_id = NEW.id)
+                ORDER BY at DESC LIMIT 1
+            ) c
+            WHERE c.at IS NOT NULL
+            ON CONFLICT ({key}, zone, driver_id) DO UPDATE SET
+                revenue = revenue + excluded.revenue;
+        END
+        ''')
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_booking_status_history_driver
+    ON booking_status_history (driver_id, changed_at)
+    ''')
+
+    # A driver's status changes and declines move their activity_version on, which is all
+    # that invalidates their cached driver_performance rows
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_driver_activity_history
+    AFTER INSERT ON booking_status_history
+    WHEN NEW.driver_id IS NOT NULL
+    BEGIN
+        UPDATE drivers SET activity_version = activity_version + 1 WHERE id = NEW.driver_id;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_driver_activity_declines
+    AFTER INSERT ON booking_declines
+    BEGIN
+        UPDATE drivers SET activity_version = activity_version + 1 WHERE id = NEW.driver_id;
+    END
+    ''')
+
+    # Bookings declined before declines went back to the queue were left stranded
+    cursor.execute('''
+    INSERT OR IGNORE INTO booking_declines (booking_id, driver_id, declined_at)
+    SELECT id, driver_id, (julianday('now') - 2440587.5) * 86400.0
+    FROM bookings WHERE booking_status = 'declined' AND driver_id IS NOT NULL
+    ''')
+    cursor.execute('''
+    UPDATE bookings SET booking_status = 'pending', driver_id = NULL, admin_id = NULL
+    WHERE booking_status = 'declined'
+    ''')
+
+    # A database that had bookings before the rollups existed starts them off from its history
+    cursor.execute('''
+    SELECT NOT EXISTS (SELECT 1 FROM rollup_daily) AND EXISTS (SELECT 1 FROM bookings)
+    ''')
+    backfill_rollups = cursor.fetchone()[0]
+
     conn.commit()
     conn.close()
+    if backfill_rollups:
+        hourly, daily = rollups.rebuild(db_path)
+        print(f"Built {hourly} hourly and {daily} daily rollup rows from existing bookings")
     print("Database created successfully with all tables!")
 
 if __name__ == "__main__":
@@ -1,13 +1,31 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                            QLabel, QPushButton, QScrollArea, QFrame,
                            QGridLayout, QComboBox, QMessageBox, QGraphicsDropShadowEffect,
-                           QDialog, QTextEdit)
-from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve
+                           QDialog, QTextEdit, QApplication)
+from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, QThread
 from PyQt6.QtGui import QColor
 from utils.session import current_session
+from utils import eta
+from utils.route_cache import route_store
 import sqlite3
 import os
 
+class TripFollowUp(QThread):
+    # What a completed trip feeds: the ETA model and the route store. Both write to the
+    # database and may wait on other drivers doing the same, so they run off the UI thread.
+    def __init__(self, db_path, booking_id, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.booking_id = booking_id
+
+    def run(self):
+        try:
+            eta.refresh(self.db_path)
+            route_store.record_trip(self.booking_id)
+        except sqlite3.Error as e:
+            print(f"Failed to record completed trip: {str(e)}")
+
+
 class StatusBadge(QLabel):
     def __init__(self, status, parent=None):
         super().__init__(parent)
@@ -277,6 +295,13 @@ class ActiveBookingCard(QFrame):
                 conn.commit()
                 conn.close()
                 
+                # Fold the finished trip into the ETA table while it's fresh, and keep the
+                # road it took for drawing the same pickup/dropoff pair later. Owned by the
+                # application, since this card is rebuilt by the refresh below.
+                follow_up = TripFollowUp(db_path, self.booking_data['booking_id'], QApplication.instance())
+                follow_up.finished.connect(follow_up.deleteLater)
+                follow_up.start()
+                
                 main_window = self.window()
                 if hasattr(main_window, 'refresh_bookings'):
                     main_window.refresh_bookings()
@@ -3,7 +3,9 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt6.QtCore import Qt, QPoint
 from PyQt6.QtGui import QPixmap, QIcon, QColor, QPainter
 import os
+import sqlite3
 from utils.session import current_session
+from utils.surge import surge_engine
 
 class DriverDashboard(QMainWindow):
     def __init__(self):
@@ -258,10 +260,21 @@ class DriverDashboard(QMainWindow):
         return button
     
     def toggle_status(self):
-        if self.status_button.isChecked():
-            self.status_button.setText("Unavailable")
-        else:
-            self.status_button.setText("Available")
+        available = self.status_button.isChecked()
+        self.status_button.setText("Available" if available else "Unavailable")
+        
+        try:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database', 'taxi_booking.db')
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('UPDATE drivers SET status = ? WHERE id = ?',
+                           ('available' if available else 'unavailable', current_session.user_id))
+            conn.commit()
+            conn.close()
+            surge_engine.invalidate()
+        except sqlite3.Error as e:
+            print(f"Failed to update driver status: {str(e)}")
     
     def show_requests(self):
         from driver_dashboard.view_requests import ViewRequestsWindow
@@ -4,6 +4,7 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, QPoint
 from PyQt6.QtGui import QColor, QPainter, QPainterPath, QFont, QIcon
 from utils.session import current_session
+from utils import assignment
 import sqlite3
 import os
 from datetime import datetime
@@ -241,17 +242,15 @@ class RequestCard(QFrame):
                 db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
                                      'database', 'taxi_booking.db')
                 conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    UPDATE bookings 
-                    SET booking_status = 'declined'
-                    WHERE id = ? AND driver_id = ?
-                ''', (booking_id, current_session.user_id))
                 
-                conn.commit()
+                # Back to the pending queue for another driver
+                with conn:
+                    result = assignment.decline(conn, booking_id, current_session.user_id)
                 conn.close()
                 
+                if result != assignment.DECLINED:
+                    QMessageBox.information(self, "Decline Trip", "This trip is no longer assigned to you.")
+                
                 # Find the main window and refresh
                 main_window = self.window()
                 if hasattr(main_window, 'refresh_requests'):
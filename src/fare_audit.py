@@ -0,0 +1,198 @@
+import argparse
+import csv
+import os
+import sqlite3
+import time
+import numpy as np
+from utils.fare import load_tariff, quote_many, hour_of_week, road_distance_km_many, parse_pickup_times
+from utils.zones import zone_index
+
+APPLY_STATUSES = ('pending', 'assigned')  # Bookings whose fare hasn't been agreed yet
+
+
+def booking_chunks(conn, statuses=None, chunk_size=50000):
+    where = ""
+    params = ()
+    if statuses:
+        where = f"WHERE booking_status IN ({', '.join('?' * len(statuses))})"
+        params = tuple(statuses)
+
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, pickup_time, created_at, fare, distance_km,
+               pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, pickup_zone
+        FROM bookings
+        {where}
+        ORDER BY id
+    ''', params)
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        yield {
+            'id': np.array(columns[0], dtype=np.int64),
+            'pickup_time': parse_pickup_times(columns[1]),
+            'created_at': np.array(columns[2], dtype=object),
+            'fare': np.array(columns[3], dtype=float),
+            'distance_km': np.array(columns[4], dtype=float),
+            'pickup_lat': np.array(columns[5], dtype=float),
+            'pickup_lng': np.array(columns[6], dtype=float),
+            'dropoff_lat': np.array(columns[7], dtype=float),
+            'dropoff_lng': np.array(columns[8], dtype=float),
+            'pickup_zone': np.array(columns[9], dtype=object),
+        }
+
+
+def trip_distances(chunk, current_tariff, pickup_times):
+    # Stored distance first, then the pickup/dropoff coordinates, and for old bookings
+    # with neither, work back from the fare they were charged under the current tariff
+    distance = chunk['distance_km'].copy()
+
+    from_coords = np.isnan(distance) & ~np.isnan(chunk['pickup_lat']) & ~np.isnan(chunk['dropoff_lat'])
+    distance[from_coords] = road_distance_km_many(
+        chunk['pickup_lat'][from_coords], chunk['pickup_lng'][from_coords],
+        chunk['dropoff_lat'][from_coords], chunk['dropoff_lng'][from_coords])
+
+    inferred = np.isnan(distance) & ~np.isnan(chunk['fare'])
+    multipliers = current_tariff.hour_multipliers[hour_of_week(pickup_times[inferred])]
+    distance[inferred] = np.maximum(
+        (chunk['fare'][inferred] / multipliers - current_tariff.base_fare) / current_tariff.per_km_rate, 0.0)
+    return distance, int(inferred.sum())
+
+
+def pickup_times_of(chunk):
+    # Bookings with an unreadable pickup time are dated by when they were created
+    pickup_times = chunk['pickup_time']
+    missing = np.isnat(pickup_times)
+    if missing.any():
+        created = np.array([v or 'NaT' for v in chunk['created_at'][missing]], dtype='datetime64[s]')
+        pickup_times = pickup_times.copy()
+        pickup_times[missing] = created.astype('datetime64[m]')
+    return pickup_times
+
+
+def zone_keys(chunk):
+    # Position of the pickup zone in zone_index.zones, -1 outside every zone. Bookings
+    # not yet run through tag_zones.py are looked up from their coordinates.
+    zones = chunk['pickup_zone']
+    untagged = np.array([zone is None for zone in zones], dtype=bool)
+    if untagged.any():
+        zones = zones.copy()
+        zones[untagged] = zone_index.names_at(chunk['pickup_lat'][untagged], chunk['pickup_lng'][untagged])
+    positions = {zone.name: i for i, zone in enumerate(zone_index.zones)}
+    return np.array([positions.get(zone, -1) for zone in zones], dtype=np.int64)
+
+
+def zone_label(key):
+    if key < 0:
+        return 'unknown'
+    return zone_index.zones[key].name
+
+
+def day_label(key):
+    return str(np.datetime64(key, 'D'))
+
+
+def accumulate(totals, keys, old_fares, new_fares):
+    # Integer keys keep np.unique cheap; they are turned into labels only for the report
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique))
+    old_sums = np.bincount(inverse, weights=old_fares, minlength=len(unique))
+    new_sums = np.bincount(inverse, weights=new_fares, minlength=len(unique))
+    for key, count, old_sum, new_sum in zip(unique.tolist(), counts, old_sums, new_sums):
+        entry = totals.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += int(count)
+        entry[1] += old_sum
+        entry[2] += new_sum
+
+
+def write_report(path, heading, totals, label):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([heading, 'bookings', 'current_revenue', 'candidate_revenue', 'delta', 'delta_pct'])
+        for key in sorted(totals):
+            count, old_sum, new_sum = totals[key]
+            delta = new_sum - old_sum
+            pct = (delta / old_sum * 100) if old_sum else 0.0
+            writer.writerow([label(key), count, f"{old_sum:.2f}", f"{new_sum:.2f}", f"{delta:.2f}", f"{pct:.2f}"])
+
+
+def run_audit(db_path, candidate, current='standard', statuses=None, report_prefix='fare_audit',
+              apply=False, chunk_size=50000):
+    if apply and not statuses:
+        # Trips already taken were charged what they were charged; only re-price what's still open
+        statuses = APPLY_STATUSES
+    candidate_tariff = load_tariff(candidate)
+    current_tariff = load_tariff(current)
+
+    conn = sqlite3.connect(db_path)
+    by_day = {}
+    by_zone = {}
+    updates = []
+    audited = skipped = inferred_total = 0
+    start = time.perf_counter()
+
+    try:
+        for chunk in booking_chunks(conn, statuses, chunk_size):
+            pickup_times = pickup_times_of(chunk)
+            usable = ~np.isnat(pickup_times) & ~np.isnan(chunk['fare'])
+            skipped += int((~usable).sum())
+            chunk = {name: values[usable] for name, values in chunk.items()}
+            pickup_times = pickup_times[usable]
+            if not len(pickup_times):
+                continue
+
+            distance, inferred = trip_distances(chunk, current_tariff, pickup_times)
+            inferred_total += inferred
+            new_fares = quote_many(distance, pickup_times, candidate_tariff)
+            old_fares = chunk['fare']
+
+            accumulate(by_day, pickup_times.astype('datetime64[D]').astype(np.int64), old_fares, new_fares)
+            accumulate(by_zone, zone_keys(chunk), old_fares, new_fares)
+            audited += len(new_fares)
+
+            if apply:
+                changed = np.abs(new_fares - old_fares) >= 0.005
+                updates.extend((f"{fare:.2f}", int(booking_id))
+                               for fare, booking_id in zip(new_fares[changed], chunk['id'][changed]))
+
+        if apply and updates:
+            # All or nothing: the new fares land in one transaction
+            with conn:
+                conn.executemany('UPDATE bookings SET fare = ? WHERE id = ?', updates)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    write_report(f"{report_prefix}_by_day.csv", 'day', by_day, day_label)
+    write_report(f"{report_prefix}_by_zone.csv", 'zone', by_zone, zone_label)
+
+    old_total = sum(entry[1] for entry in by_day.values())
+    new_total = sum(entry[2] for entry in by_day.values())
+    print(f"Audited {audited} bookings in {elapsed:.2f}s ({skipped} skipped without fare or time, "
+          f"{inferred_total} distances inferred from the charged fare)")
+    print(f"Revenue: TTD ${old_total:,.2f} -> TTD ${new_total:,.2f} ({new_total - old_total:+,.2f})")
+    print(f"Reports written to {report_prefix}_by_day.csv and {report_prefix}_by_zone.csv")
+    if apply:
+        print(f"Applied new fares to {len(updates)} bookings")
+    return by_day, by_zone
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute booking fares under a candidate tariff")
+    parser.add_argument("tariff", help="candidate tariff name (resources/tariffs) or path to a .json file")
+    parser.add_argument("--current", default="standard", help="tariff the stored fares were charged under")
+    parser.add_argument("--status", action="append", dest="statuses",
+                        help="only audit bookings in this status (repeatable)")
+    parser.add_argument("--report", default="fare_audit", help="report file prefix")
+    parser.add_argument("--apply", action="store_true",
+                        help="write the new fares back in one transaction (to pending and assigned "
+                             "bookings unless --status is given)")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                                     'database', 'taxi_booking.db'))
+    args = parser.parse_args()
+
+    run_audit(args.db, args.tariff, args.current, args.statuses, args.report, args.apply, args.chunk_size)
@@ -2,10 +2,12 @@ import sys
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QApplication
 from login_window import LoginWindow
+from utils.map_scheme import register_map_scheme
 
 def main():
     # Set WebEngine flags before creating QApplication
     QApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
+    register_map_scheme()
     
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
@@ -13,6 +13,17 @@ def reset_database():
     cursor.execute('DELETE FROM drivers')
     cursor.execute('DELETE FROM admins')
     cursor.execute('DELETE FROM bookings')
+    cursor.execute('DELETE FROM driver_positions')
+    cursor.execute('DELETE FROM driver_locations')
+    cursor.execute('DELETE FROM booking_status_history')
+    cursor.execute('DELETE FROM eta_estimates')
+    cursor.execute('DELETE FROM watermarks')
+    cursor.execute('DELETE FROM scheduled_jobs')
+    cursor.execute('DELETE FROM notifications')
+    cursor.execute('DELETE FROM booking_declines')
+    cursor.execute('DELETE FROM rollup_hourly')
+    cursor.execute('DELETE FROM rollup_daily')
+    cursor.execute('DELETE FROM driver_performance')
 
     # Reset auto-increment counters
     cursor.execute('DELETE FROM sqlite_sequence')
@@ -0,0 +1,334 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+import numpy as np
+from create_database import create_database
+from utils.driver_positions import PositionIngest
+from utils.fare import quote, road_distance_km
+from utils.zones import zone_of
+from utils.availability import trip_window
+from utils.eta import eta_model
+from utils import dispatch
+
+# Relative demand by hour of day (peak = 1.0)
+DEMAND_CURVES = {
+    'flat': [1.0] * 24,
+    'weekday': [0.1, 0.05, 0.05, 0.05, 0.1, 0.3, 0.7, 1.0, 0.9, 0.6, 0.5, 0.55,
+                0.6, 0.55, 0.5, 0.6, 0.85, 1.0, 0.8, 0.6, 0.5, 0.4, 0.3, 0.2],
+    # Fete nights and J'ouvert: the peak runs through the small hours
+    'carnival': [1.0, 1.0, 0.95, 0.9, 1.0, 0.8, 0.5, 0.4, 0.4, 0.45, 0.5, 0.55,
+                 0.6, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.0, 1.0],
+}
+
+# Where people get picked up and dropped off: (lat, lng, weight)
+HOTSPOTS = [
+    (10.655, -61.510, 5.0),  # Port of Spain
+    (10.280, -61.460, 2.0),  # San Fernando
+    (10.515, -61.410, 2.0),  # Chaguanas
+    (10.637, -61.282, 1.5),  # Arima
+    (10.595, -61.337, 1.0),  # Piarco
+    (10.690, -61.560, 1.0),  # Diego Martin
+]
+HOTSPOT_SPREAD = 0.02  # degrees, about 2 km
+
+LOCK_WAIT_SECONDS = 0.005  # A write slower than this spent most of it waiting for the lock
+CONFIRM_DELAY_SECONDS = 2.0  # How long a driver takes to accept a request
+DRIVER_PING_SECONDS = 30.0
+
+
+def demand_curve(name):
+    if name in DEMAND_CURVES:
+        return DEMAND_CURVES[name]
+    with open(name) as f:
+        curve = json.load(f)
+    if len(curve) != 24:
+        raise ValueError("A demand curve file must hold 24 hourly values")
+    return curve
+
+
+def random_point(rng):
+    lat, lng, _ = rng.choices(HOTSPOTS, weights=[h[2] for h in HOTSPOTS])[0]
+    return lat + rng.gauss(0, HOTSPOT_SPREAD), lng + rng.gauss(0, HOTSPOT_SPREAD)
+
+
+def timed_write(conn, stats, sql, params=()):
+    # Runs one write transaction, recording how long it took and whether it had to wait
+    start = time.perf_counter()
+    while True:
+        try:
+            with conn:
+                cursor = conn.execute(sql, params)
+            break
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            stats['lock_errors'] += 1
+    waited = time.perf_counter() - start
+    stats['writes'] += 1
+    stats['write_seconds'] += waited
+    if waited > LOCK_WAIT_SECONDS:
+        stats['lock_waits'] += 1
+        stats['lock_wait_seconds'] += waited
+    return cursor
+
+
+def setup(db_path, num_drivers, num_users, seed):
+    # The simulation fills the database with fake users, drivers and bookings, so never
+    # point it at one that already holds something
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists; give --db a new file")
+    create_database(db_path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    now = time.time()
+    with conn:
+        conn.executemany('''
+            INSERT INTO users (username, password, email, phone) VALUES (?, 'x', ?, '(868) 555-0000')
+        ''', [(f'sim_user{i}', f'sim_user{i}@test.com') for i in range(num_users)])
+        conn.executemany('''
+            INSERT INTO drivers (username, password, email, phone, car_model, license_plate, full_name, driver_license)
+            VALUES (?, 'x', ?, '(868) 555-0000', 'Simulated', ?, 'Simulated Driver', ?)
+        ''', [(f'sim_driver{i}', f'sim_driver{i}@test.com', f'S{i:05d}', f'SD{i:05d}') for i in range(num_drivers)])
+        conn.executemany('''
+            INSERT INTO driver_locations (driver_id, latitude, longitude, recorded_at) VALUES (?, ?, ?, ?)
+        ''', [(driver_id,) + random_point(rng) + (now,) for driver_id in range(1, num_drivers + 1)])
+    conn.close()
+
+
+def customer_worker(db_path, worker, workers, num_users, rate_per_minute, curve, speedup, duration, seed, results):
+    # Books at this worker's share of the demand curve, with pickups for right now
+    rng = random.Random(seed * 1000 + worker)
+    eta_model.db_path = db_path
+    conn = sqlite3.connect(db_path, timeout=30)
+    stats = Counter()
+    start = time.time()
+    booked = 0.0
+    last = start
+    while time.time() - start < duration:
+        now = time.time()
+        sim_hour = int((datetime.fromtimestamp(start).hour + (now - start) * speedup / 3600) % 24)
+        booked += (now - last) * rate_per_minute / 60 * curve[sim_hour] / workers
+        last = now
+        while booked >= 1:
+            booked -= 1
+            pickup = random_point(rng)
+            dropoff = random_point(rng)
+            distance = road_distance_km(pickup, dropoff)
+            pickup_text = datetime.fromtimestamp(now).strftime('%d/%m/%Y %I:%M %p')
+            pickup_zone, dropoff_zone = zone_of(*pickup), zone_of(*dropoff)
+            window = trip_window(pickup_text, now, pickup_zone, dropoff_zone, distance)
+            timed_write(conn, stats, '''
+                INSERT INTO bookings (
+                    user_id, pickup_location, dropoff_location, pickup_time, booking_status, fare, created_at,
+                    pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, distance_km,
+                    pickup_zone, dropoff_zone, window_start, window_end
+                ) VALUES (?, 'Simulated pickup', 'Simulated dropoff', ?, 'pending', ?, DATETIME('now'),
+                          ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (rng.randint(1, num_users), pickup_text, f"{quote(distance):.2f}") + pickup + dropoff +
+                (distance, pickup_zone, dropoff_zone) + window)
+            stats['bookings'] += 1
+        time.sleep(0.01)
+    conn.close()
+    results.put(('customers', stats))
+
+
+def driver_worker(db_path, driver_ids, speedup, duration, seed, results):
+    # Plays this worker's drivers: accept assigned requests, drive to the pickup, carry
+    # the passenger, complete; idle drivers keep reporting where they are
+    rng = random.Random(seed * 1000 + driver_ids[0])
+    conn = sqlite3.connect(db_path, timeout=30)
+    ingest = PositionIngest(db_path=db_path, flush_interval=1.0)
+    ingest.start()
+    stats = Counter()
+    trips = {}  # booking_id -> [stage, due time, booking row]
+    placeholders = ', '.join('?' * len(driver_ids))
+    locations = dict((row[0], row[1:]) for row in conn.execute(f'''
+        SELECT driver_id, latitude, longitude FROM driver_locations WHERE driver_id IN ({placeholders})
+    ''', driver_ids))
+    last_ping = 0.0
+    start = time.time()
+
+    while time.time() - start < duration:
+        now = time.time()
+        for booking_id, driver_id, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, distance in conn.execute(f'''
+            SELECT id, driver_id, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, distance_km
+            FROM bookings WHERE driver_id IN ({placeholders}) AND booking_status = 'assigned'
+        ''', driver_ids).fetchall():
+            if booking_id not in trips:
+                trips[booking_id] = ['assigned', now + rng.expovariate(1 / CONFIRM_DELAY_SECONDS),
+                                     (driver_id, (pickup_lat, pickup_lng), (dropoff_lat, dropoff_lng), distance)]
+
+        for booking_id, trip in list(trips.items()):
+            stage, due, (driver_id, pickup, dropoff, distance) = trip
+            if now < due:
+                continue
+            if stage == 'assigned':
+                timed_write(conn, stats, '''
+                    UPDATE bookings SET booking_status = 'confirmed'
+                    WHERE id = ? AND driver_id = ? AND booking_status = 'assigned'
+                ''', (booking_id, driver_id))
+                approach = road_distance_km(locations[driver_id], pickup) * 120 / speedup
+                trip[0], trip[1] = 'confirmed', now + approach
+            elif stage == 'confirmed':
+                timed_write(conn, stats, '''
+                    UPDATE bookings SET booking_status = 'on_the_way'
+                    WHERE id = ? AND driver_id = ? AND booking_status = 'confirmed'
+                ''', (booking_id, driver_id))
+                locations[driver_id] = pickup
+                ingest.ingest(driver_id, *pickup, recorded_at=now)
+                trip[0], trip[1] = 'on_the_way', now + distance * rng.uniform(90, 180) / speedup
+            else:
+                timed_write(conn, stats, '''
+                    UPDATE bookings SET booking_status = 'completed'
+                    WHERE id = ? AND driver_id = ? AND booking_status = 'on_the_way'
+                ''', (booking_id, driver_id))
+                locations[driver_id] = dropoff
+                ingest.ingest(driver_id, *dropoff, recorded_at=now)
+                stats['completed'] += 1
+                del trips[booking_id]
+
+        if now - last_ping >= DRIVER_PING_SECONDS:
+            last_ping = now
+            for driver_id, (lat, lng) in locations.items():
+                ingest.ingest(driver_id, lat, lng, recorded_at=now)
+        time.sleep(0.05)
+
+    ingest.stop()
+    conn.close()
+    stats['pings'] = ingest.pings_written
+    results.put(('drivers', stats))
+
+
+def dispatcher_worker(db_path, interval, duration, results):
+    eta_model.db_path = db_path
+    stats = Counter()
+    start = time.time()
+    while time.time() - start < duration:
+        round_start = time.perf_counter()
+        try:
+            applied = dispatch.apply(dispatch.plan(db_path), db_path)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            stats['lock_errors'] += 1
+            continue
+        elapsed = time.perf_counter() - round_start
+        stats['rounds'] += 1
+        stats['assigned'] += len(applied)
+        stats['round_seconds'] += elapsed
+        stats['slowest_round_ms'] = max(stats['slowest_round_ms'], int(elapsed * 1000))
+        time.sleep(max(0.0, interval - elapsed))
+    results.put(('dispatcher', stats))
+
+
+def report(db_path, duration, outcomes):
+    conn = sqlite3.connect(db_path)
+    statuses = dict(conn.execute('SELECT booking_status, COUNT(*) FROM bookings GROUP BY booking_status'))
+    # Created -> first assignment, from the status history
+    latencies = np.array([row[0] for row in conn.execute('''
+        SELECT MIN(a.changed_at) - p.changed_at
+        FROM booking_status_history p
+        JOIN booking_status_history a ON a.booking_id = p.booking_id AND a.new_status = 'assigned'
+        WHERE p.old_status IS NULL
+        GROUP BY p.booking_id
+    ''')], dtype=float)
+    conn.close()
+
+    totals = {}
+    for role, stats in outcomes:
+        totals.setdefault(role, Counter()).update(stats)
+
+    created = sum(statuses.values())
+    print(f"\nSimulated {duration:.0f}s against {db_path}")
+    print(f"Bookings: {created} created ({created / duration * 60:.0f}/min), "
+          f"{statuses.get('completed', 0)} completed ({statuses.get('completed', 0) / duration * 60:.0f}/min)")
+    print("  by status: " + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        print(f"Assignment latency: p50 {p50:.2f}s, p90 {p90:.2f}s, p99 {p99:.2f}s, max {latencies.max():.2f}s "
+              f"({len(latencies)} assigned)")
+    dispatcher = totals.get('dispatcher', Counter())
+    if dispatcher['rounds']:
+        print(f"Dispatcher: {dispatcher['rounds']} rounds, {dispatcher['round_seconds'] / dispatcher['rounds'] * 1000:.1f} ms "
+              f"mean, {dispatcher['slowest_round_ms']} ms slowest")
+    for role in ('customers', 'drivers'):
+        stats = totals.get(role, Counter())
+        if stats['writes']:
+            print(f"{role.capitalize()}: {stats['writes']} writes, {stats['write_seconds'] / stats['writes'] * 1000:.2f} ms mean; "
+                  f"{stats['lock_waits']} waited on the lock ({stats['lock_wait_seconds']:.2f}s total), "
+                  f"{stats['lock_errors']} timed out and retried")
+    return statuses, latencies, totals
+
+
+def collect(workers, results):
+    # One result per worker. A worker that dies never sends one, so rather than block on
+    # the queue, stop waiting once none are left alive and the queue has gone quiet.
+    outcomes = []
+    while len(outcomes) < len(workers):
+        alive = any(process.is_alive() for process in workers)
+        try:
+            outcomes.append(results.get(timeout=1.0))
+        except queue.Empty:
+            if not alive:
+                break
+    return outcomes
+
+
+def run_simulation(num_drivers=500, rate_per_minute=600, duration=60.0, curve='flat', speedup=60.0,
+                   processes=2, dispatch_interval=2.0, db_path=None, seed=0):
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'city_simulation.db')
+    num_users = max(100, num_drivers)
+    setup(db_path, num_drivers, num_users, seed)
+    curve = demand_curve(curve)
+
+    results = multiprocessing.Queue()
+    driver_ids = list(range(1, num_drivers + 1))
+    workers = [multiprocessing.Process(name='dispatcher', target=dispatcher_worker,
+                                       args=(db_path, dispatch_interval, duration, results))]
+    for n in range(processes):
+        workers.append(multiprocessing.Process(name=f'customers-{n}', target=customer_worker, args=(
+            db_path, n, processes, num_users, rate_per_minute, curve, speedup, duration, seed, results)))
+        workers.append(multiprocessing.Process(name=f'drivers-{n}', target=driver_worker, args=(
+            db_path, driver_ids[n::processes], speedup, duration, seed, results)))
+
+    for process in workers:
+        process.start()
+    outcomes = collect(workers, results)
+    for process in workers:
+        process.join()
+        if process.exitcode != 0:
+            print(f"Warning: {process.name} worker exited with code {process.exitcode}; "
+                  f"its numbers are missing from the report")
+    return report(db_path, duration, outcomes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run customers, drivers and the dispatcher against a scratch database")
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=600, help="booking requests per minute at peak demand")
+    parser.add_argument("--curve", default="flat",
+                        help=f"demand curve: {', '.join(DEMAND_CURVES)} or a JSON file of 24 hourly values")
+    parser.add_argument("--speedup", type=float, default=60.0,
+                        help="simulated seconds per real second for trips and the demand curve")
+    parser.add_argument("--duration", type=float, default=60.0, help="real seconds to run for")
+    parser.add_argument("--processes", type=int, default=2, help="customer and driver processes (one of each per)")
+    parser.add_argument("--dispatch-interval", type=float, default=2.0, help="seconds between dispatch rounds")
+    parser.add_argument("--db", help="database file to create (defaults to a temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        run_simulation(args.drivers, args.rate, args.duration, args.curve, args.speedup,
+                       args.processes, args.dispatch_interval, args.db, args.seed)
+    except FileExistsError as e:
+        parser.error(str(e))
@@ -0,0 +1,76 @@
+import argparse
+import math
+import random
+import time
+from utils.driver_positions import PositionIngest
+
+# Rough bounding box of Trinidad
+MIN_LAT, MAX_LAT = 10.04, 10.84
+MIN_LON, MAX_LON = -61.93, -60.90
+
+
+def synthetic_tracks(num_drivers, seed=None):
+    rng = random.Random(seed)
+    drivers = []
+    for driver_id in range(1, num_drivers + 1):
+        drivers.append({
+            'driver_id': driver_id,
+            'lat': rng.uniform(MIN_LAT, MAX_LAT),
+            'lon': rng.uniform(MIN_LON, MAX_LON),
+            'heading': rng.uniform(0, 360),
+            'speed': rng.uniform(5, 20),  # metres per second
+        })
+
+    while True:
+        for driver in drivers:
+            # Wander a little each step and bounce off the island edges
+            driver['heading'] = (driver['heading'] + rng.uniform(-20, 20)) % 360
+            step = driver['speed'] / 111000
+            driver['lat'] += step * math.cos(math.radians(driver['heading']))
+            driver['lon'] += step * math.sin(math.radians(driver['heading']))
+            if not (MIN_LAT <= driver['lat'] <= MAX_LAT and MIN_LON <= driver['lon'] <= MAX_LON):
+                driver['heading'] = (driver['heading'] + 180) % 360
+                driver['lat'] = min(max(driver['lat'], MIN_LAT), MAX_LAT)
+                driver['lon'] = min(max(driver['lon'], MIN_LON), MAX_LON)
+            yield (driver['driver_id'], driver['lat'], driver['lon'],
+                   driver['speed'], driver['heading'])
+
+
+def run_simulation(num_drivers, rate, duration, db_path=None, seed=None):
+    ingest = PositionIngest(db_path=db_path)
+    ingest.start()
+    tracks = synthetic_tracks(num_drivers, seed)
+
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+        # Catch up to the target rate, then sleep until the next tick
+        due = int(elapsed * rate) - sent
+        for _ in range(due):
+            ingest.ingest(*next(tracks))
+        sent += max(due, 0)
+        time.sleep(0.001)
+
+    ingest_time = time.perf_counter() - start
+    ingest.stop()
+    total_time = time.perf_counter() - start
+
+    print(f"Pings sent: {sent} in {ingest_time:.2f}s ({sent / ingest_time:.0f}/s)")
+    print(f"Pings written: {ingest.pings_written} in {ingest.batches_written} batches "
+          f"({ingest.pings_written / total_time:.0f}/s including final flush)")
+    return ingest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay synthetic driver GPS tracks into driver_positions")
+    parser.add_argument("--drivers", type=int, default=200)
+    parser.add_argument("--rate", type=int, default=5000, help="pings per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--db", default=None, help="database path (defaults to the app database)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    run_simulation(args.drivers, args.rate, args.duration, args.db, args.seed)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+from utils.zones import zone_index
+
+
+def tag_bookings(db_path, retag=False, chunk_size=50000):
+    # Untagged bookings with coordinates get their pickup/dropoff zone; --all redoes every row
+    # (e.g. after the zone polygons change)
+    where = "WHERE (pickup_lat IS NOT NULL OR dropoff_lat IS NOT NULL)"
+    if not retag:
+        where += " AND pickup_zone IS NULL AND dropoff_zone IS NULL"
+
+    conn = sqlite3.connect(db_path)
+    read = conn.cursor()
+    tagged = outside = 0
+    start = time.perf_counter()
+    try:
+        read.execute(f'''
+            SELECT id, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng
+            FROM bookings
+            {where}
+            ORDER BY id
+        ''')
+
+        updates = []
+        while True:
+            rows = read.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            coords = [np.array(column, dtype=float) for column in columns[1:]]
+            pickup_zones = zone_index.names_at(coords[0], coords[1])
+            dropoff_zones = zone_index.names_at(coords[2], coords[3])
+            updates.extend(zip(pickup_zones.tolist(), dropoff_zones.tolist(), columns[0]))
+            outside += int(sum(1 for zone in pickup_zones if zone is None))
+            tagged += len(rows)
+
+        # Written once the read cursor is done so the update doesn't disturb the scan
+        with conn:
+            conn.executemany('UPDATE bookings SET pickup_zone = ?, dropoff_zone = ? WHERE id = ?', updates)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Tagged {tagged} bookings in {elapsed:.2f}s ({outside} pickups outside every zone)")
+    return tagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill pickup_zone/dropoff_zone on existing bookings")
+    parser.add_argument("--all", action="store_true", dest="retag", help="retag bookings that already have zones")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                                     'database', 'taxi_booking.db'))
+    args = parser.parse_args()
+
+    tag_bookings(args.db, args.retag, args.chunk_size)
@@ -5,15 +5,26 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                            QLabel, QPushButton, QLineEdit, QTimeEdit, 
                            QCalendarWidget, QDialog, QFrame, QMessageBox, QCompleter,
                            QGraphicsView, QGraphicsScene)
-from PyQt6.QtCore import Qt, QDateTime, QUrl, QStringListModel
+from PyQt6.QtCore import Qt, QUrl, QUrlQuery, QStringListModel, QObject, pyqtSignal
 from PyQt6.QtGui import QPixmap, QPen, QColor, QPainter
 from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from utils.session import current_session
+from utils.map_scheme import install_map_scheme_handler, BOOKING_MAP_URL
+from utils.map_bridge import MapBridge
+from utils.route_cache import route_store, zoom_for_bounds
+from utils.geocode_cache import geocode_cache
+from utils.fare import quote, road_distance_km, parse_pickup_time
+from utils.surge import surge_engine
+from utils.zones import zone_of
+from utils.eta import eta_model
+from utils.availability import trip_window
+from utils.scheduler import schedule_booking
+import time
+from datetime import datetime, timedelta
 import sqlite3
 import os
 import json
-from math import radians, sin, cos, sqrt, atan2
 
 
 class DateTimePickerDialog(QDialog):
@@ -82,6 +93,8 @@ class DateTimePickerDialog(QDialog):
 
 
 class LocationSearchBar(QLineEdit):
+    focused = pyqtSignal()
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setPlaceholderText("Search location in Trinidad...")
@@ -118,6 +131,62 @@ class LocationSearchBar(QLineEdit):
             self.completer.setModel(QStringListModel(suggestions))
             self.completer.complete()
         reply.deleteLater()
+    
+    def focusInEvent(self, event):
+        super().focusInEvent(event)
+        self.focused.emit()
+    
+    def set_picked_location(self, lat, lng, display_name):
+        # Picked on the map: use the point as-is instead of searching for the text
+        self.location_data = [{'lat': str(lat), 'lon': str(lng), 'display_name': display_name}]
+        self.blockSignals(True)
+        self.setText(display_name)
+        self.blockSignals(False)
+    
+    def holds_point(self, lat, lng):
+        return bool(self.location_data) and self.location_data[0]['lat'] == str(lat) \
+            and self.location_data[0]['lon'] == str(lng)
+
+
+class ReverseGeocoder(QObject):
+    resolved = pyqtSignal(float, float, str)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.network_manager = QNetworkAccessManager(self)
+        self.network_manager.finished.connect(self.handle_response)
+    
+    def lookup_cached(self, lat, lng):
+        try:
+            return geocode_cache.lookup(lat, lng)
+        except sqlite3.Error:
+            return None
+    
+    def resolve(self, lat, lng):
+        url = QUrl("https://nominatim.openstreetmap.org/reverse")
+        query = QUrlQuery()
+        query.addQueryItem("lat", f"{lat:.6f}")
+        query.addQueryItem("lon", f"{lng:.6f}")
+        query.addQueryItem("format", "json")
+        query.addQueryItem("zoom", "18")
+        url.setQuery(query)
+        request = QNetworkRequest(url)
+        request.setHeader(QNetworkRequest.KnownHeaders.UserAgentHeader, "TaxiBookingApp/1.0")
+        request.setAttribute(QNetworkRequest.Attribute.User, (lat, lng))
+        self.network_manager.get(request)
+    
+    def handle_response(self, reply):
+        lat, lng = reply.request().attribute(QNetworkRequest.Attribute.User)
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            data = json.loads(str(reply.readAll(), 'utf-8'))
+            display_name = data.get('display_name')
+            if display_name:
+                try:
+                    geocode_cache.store(lat, lng, display_name)
+                except sqlite3.Error:
+                    pass  # Still usable, just not cached
+                self.resolved.emit(lat, lng, display_name)
+        reply.deleteLater()
 
 
 
@@ -126,73 +195,63 @@ class MapView(QGraphicsView):
         super().__init__(parent)
         self.setStyleSheet("background-color: #34495e; border-radius: 10px;")
         
+        # Map page, Leaflet and tiles are all served through the taximap:// scheme
+        install_map_scheme_handler()
+        
         # Create web view for map
         self.web_view = QWebEngineView(self)
         self.setViewport(self.web_view)
         
-        # HTML for OpenStreetMap with Leaflet
-        html = '''
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <link rel="stylesheet" href="https://unpkg.com/leaflet@1.7.1/dist/leaflet.css"/>
-                <script src="https://unpkg.com/leaflet@1.7.1/dist/leaflet.js"></script>
-                <style>
-                    body { margin: 0; }
-                    #map { height: 100vh; }
-                </style>
-            </head>
-            <body>
-                <div id="map"></div>
-                <script>
-                    var map = L.map('map').setView([10.6918, -61.2225], 9);
-                    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
-                        attribution: '© OpenStreetMap contributors'
-                    }).addTo(map);
-                    
-                    var markers = [];
-                    var route;
-                    
-                    function updateMarkers(pickup, dropoff) {
-                        // Clear existing markers
-                        markers.forEach(m => map.removeLayer(m));
-                        markers = [];
-                        
-                        if (pickup) {
-                            markers.push(L.marker([pickup.lat, pickup.lng])
-                                .bindPopup('Pickup Location')
-                                .addTo(map));
-                        }
-                        if (dropoff) {
-                            markers.push(L.marker([dropoff.lat, dropoff.lng])
-                                .bindPopup('Dropoff Location')
-                                .addTo(map));
-                        }
-                        
-                        if (pickup && dropoff) {
-                            if (route) map.removeLayer(route);
-                            route = L.polyline([
-                                [pickup.lat, pickup.lng],
-                                [dropoff.lat, dropoff.lng]
-                            ], {color: 'blue'}).addTo(map);
-                            map.fitBounds(route.getBounds());
-                        }
-                    }
-                </script>
-            </body>
-            </html>
-        '''
-        self.web_view.setHtml(html)
+        # Markers and routes are pushed to the page as batched diffs over a web channel
+        self.bridge = MapBridge(self.web_view.page(), self)
+        
+        # OpenStreetMap with Leaflet, bundled in resources/ and served locally
+        self.web_view.setUrl(QUrl(BOOKING_MAP_URL))
         
     def update_points(self, pickup_coords=None, dropoff_coords=None):
+        if pickup_coords:
+            self.bridge.set_marker('pickup', pickup_coords[0], pickup_coords[1], popup='Pickup Location')
+        if dropoff_coords:
+            self.bridge.set_marker('dropoff', dropoff_coords[0], dropoff_coords[1], popup='Dropoff Location')
         if pickup_coords and dropoff_coords:
-            js_code = f'''
-                updateMarkers(
-                    {{lat: {pickup_coords[0]}, lng: {pickup_coords[1]}}},
-                    {{lat: {dropoff_coords[0]}, lng: {dropoff_coords[1]}}}
-                );
-            '''
-            self.web_view.page().runJavaScript(js_code)
+            # Draw the cached road geometry at the detail the fitted view needs, if we have one
+            try:
+                zoom = zoom_for_bounds([pickup_coords, dropoff_coords])
+                route = route_store.get(pickup_coords, dropoff_coords, zoom)
+            except sqlite3.Error:
+                route = None
+            self.bridge.set_polyline('route', route or [pickup_coords, dropoff_coords], color='blue')
+            self.bridge.fit_to('route')
+    
+    def reset(self):
+        self.bridge.clear()
+
+
+class MapViewPool:
+    def __init__(self, max_size=2):
+        self.max_size = max_size
+        self.idle_views = []
+    
+    def warm_up(self, count=1):
+        # Creating a view starts Chromium and loads the map page, so do it ahead of time
+        while len(self.idle_views) < min(count, self.max_size):
+            self.idle_views.append(MapView())
+    
+    def acquire(self):
+        if self.idle_views:
+            return self.idle_views.pop()
+        return MapView()
+    
+    def release(self, map_view):
+        map_view.setParent(None)
+        if len(self.idle_views) < self.max_size:
+            map_view.reset()
+            self.idle_views.append(map_view)
+        else:
+            map_view.deleteLater()
+
+
+map_view_pool = MapViewPool()
 
 
 class CreateBookingWindow(QMainWindow):
@@ -202,8 +261,13 @@ class CreateBookingWindow(QMainWindow):
         self.setFixedSize(1200, 800)
         
         self.current_fare = 0.0
+        self.current_distance = None
         self.pickup_coords = None
         self.dropoff_coords = None
+        self.shown_coords = None
+        
+        self.reverse_geocoder = ReverseGeocoder(self)
+        self.reverse_geocoder.resolved.connect(self.handle_reverse_geocode)
         
         self.setup_ui()
         
@@ -215,8 +279,9 @@ class CreateBookingWindow(QMainWindow):
         # Left Column
         left_column = self.setup_left_column()
         
-        # Map
-        self.map_view = MapView()
+        # Map (reuses a warm view from the pool when one is available)
+        self.map_view = map_view_pool.acquire()
+        self.map_view.bridge.clicked.connect(self.handle_map_click)
         
         main_layout.addWidget(left_column)
         main_layout.addWidget(self.map_view)
@@ -240,6 +305,11 @@ class CreateBookingWindow(QMainWindow):
         self.pickup_input.textChanged.connect(self.update_map)
         self.dropoff_input.textChanged.connect(self.update_map)
         
+        # Map clicks fill whichever location field was focused last
+        self.map_target_input = self.pickup_input
+        self.pickup_input.focused.connect(lambda: setattr(self, 'map_target_input', self.pickup_input))
+        self.dropoff_input.focused.connect(lambda: setattr(self, 'map_target_input', self.dropoff_input))
+        
         input_style = """
             QLineEdit {
                 padding: 12px;
@@ -270,6 +340,10 @@ class CreateBookingWindow(QMainWindow):
         create_button.clicked.connect(self.handle_submit)
         
         left_layout.addWidget(title_label)
+        map_hint = QLabel("Tip: click the map to set the selected location")
+        map_hint.setStyleSheet("color: #95a5a6; font-size: 12px;")
+        
+        left_layout.addWidget(map_hint)
         left_layout.addWidget(QLabel("Pickup Location"))
         left_layout.addWidget(self.pickup_input)
         left_layout.addWidget(QLabel("Dropoff Location"))
@@ -324,35 +398,59 @@ class CreateBookingWindow(QMainWindow):
                 float(self.dropoff_input.location_data[0]['lon'])
             ]
             
+        # Typing fires textChanged per keystroke; only redraw and re-price when a point moved
+        coords = (tuple(self.pickup_coords or ()), tuple(self.dropoff_coords or ()))
+        if coords == self.shown_coords:
+            return
+        self.shown_coords = coords
+        
+        self.map_view.update_points(self.pickup_coords, self.dropoff_coords)
         if self.pickup_coords and self.dropoff_coords:
-            self.map_view.update_points(self.pickup_coords, self.dropoff_coords)
             self.calculate_fare()
     
+    def handle_map_click(self, lat, lng):
+        target = self.map_target_input
+        display_name = self.reverse_geocoder.lookup_cached(lat, lng)
+        target.set_picked_location(lat, lng, display_name or f"{lat:.5f}, {lng:.5f}")
+        self.update_map()
+        
+        if display_name is None:
+            self.reverse_geocoder.resolve(lat, lng)
+        
+        # Move focus to the other field so the next click sets it
+        if target is self.pickup_input and not self.dropoff_input.text():
+            self.map_target_input = self.dropoff_input
+    
+    def handle_reverse_geocode(self, lat, lng, display_name):
+        for location_input in (self.pickup_input, self.dropoff_input):
+            if location_input.holds_point(lat, lng):
+                location_input.set_picked_location(lat, lng, display_name)
+    
     def calculate_fare(self):
         if self.pickup_coords and self.dropoff_coords:
-            distance = self.calculate_distance(self.pickup_coords, self.dropoff_coords)
-            base_fare = 30.00
-            per_km_rate = 5.00
-            current_hour = QDateTime.currentDateTime().time().hour()
-            time_multiplier = 1.5 if (7 <= current_hour <= 9) or (16 <= current_hour <= 18) else 1.0
+            distance = road_distance_km(self.pickup_coords, self.dropoff_coords)
+            self.current_distance = distance
+            # Price on the booked pickup time; fall back to now until one is picked
+            pickup_time = parse_pickup_time(self.datetime_input.text())
             
-            self.current_fare = (base_fare + (distance * per_km_rate)) * time_multiplier
-            self.distance_label.setText(f"Distance: {distance:.2f} km")
-            self.fare_label.setText(f"Estimated Fare: TTD ${self.current_fare:.2f}")
+            # Surge reflects current demand, so it only applies to pickups within the hour
+            surge = 1.0
+            if pickup_time is None or pickup_time <= datetime.now() + timedelta(hours=1):
+                surge = surge_engine.multiplier(zone_of(*self.pickup_coords))
+            
+            self.current_fare = quote(distance, pickup_time, surge=surge)
+            trip_seconds = eta_model.predict(zone_of(*self.pickup_coords), zone_of(*self.dropoff_coords),
+                                             distance, pickup_time)
+            self.distance_label.setText(f"Distance: {distance:.2f} km (about {max(1, round(trip_seconds / 60))} min)")
+            surge_note = f" ({surge:.1f}× demand)" if surge > 1.0 else ""
+            self.fare_label.setText(f"Estimated Fare: TTD ${self.current_fare:.2f}{surge_note}")
     
-    def calculate_distance(self, coord1, coord2):
-        lat1, lon1 = radians(coord1[0]), radians(coord1[1])
-        lat2, lon2 = radians(coord2[0]), radians(coord2[1])
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        
-        R = 6371  # Earth's radius in kilometers
-        distance = R * c
-        return distance * 1.2  # Adding 20% for road routes
+    def closeEvent(self, event):
+        if self.map_view is not None:
+            self.map_view.bridge.clicked.disconnect(self.handle_map_click)
+            map_view_pool.release(self.map_view)
+            self.map_view = None
+        event.accept()
     
     def show_datetime_picker(self):
         dialog = DateTimePickerDialog(self)
@@ -361,6 +459,7 @@ class CreateBookingWindow(QMainWindow):
             selected_time = dialog.time_edit.time()
             datetime_str = f"{selected_date.toString('dd/MM/yyyy')} {selected_time.toString('hh:mm AP')}"
             self.datetime_input.setText(datetime_str)
+            self.calculate_fare()
     
     def handle_submit(self):
         if not all([self.pickup_input.text(), self.dropoff_input.text(), self.datetime_input.text()]):
@@ -384,11 +483,19 @@ class CreateBookingWindow(QMainWindow):
             cursor = conn.cursor()
             
             try:
+                pickup_lat, pickup_lng = self.pickup_coords or (None, None)
+                dropoff_lat, dropoff_lng = self.dropoff_coords or (None, None)
+                pickup_zone = zone_of(pickup_lat, pickup_lng)
+                dropoff_zone = zone_of(dropoff_lat, dropoff_lng)
+                window_start, window_end = trip_window(self.datetime_input.text(), time.time(), pickup_zone,
+                                                       dropoff_zone, self.current_distance)
                 cursor.execute('''
                     INSERT INTO bookings (
                         user_id, driver_id, admin_id, pickup_location, dropoff_location, 
-                        pickup_time, booking_status, fare, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, DATETIME('now'))
+                        pickup_time, booking_status, fare, created_at,
+                        pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, distance_km,
+                        pickup_zone, dropoff_zone, window_start, window_end
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, DATETIME('now'), ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     current_session.user_id,
                     None,  # driver_id
@@ -397,9 +504,16 @@ class CreateBookingWindow(QMainWindow):
                     self.dropoff_input.text(),
                     self.datetime_input.text(),
                     'pending',
-                    f"{self.current_fare:.2f}"
+                    f"{self.current_fare:.2f}",
+                    pickup_lat, pickup_lng,
+                    dropoff_lat, dropoff_lng,
+                    self.current_distance,
+                    pickup_zone, dropoff_zone,
+                    window_start, window_end
                 ))
+                schedule_booking(cursor, cursor.lastrowid, self.datetime_input.text())
                 conn.commit()
+                surge_engine.invalidate()
                 QMessageBox.information(self, "Success", "Booking created successfully!")
                 self.close()
                 
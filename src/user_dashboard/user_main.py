@@ -1,11 +1,12 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                           QLabel, QPushButton, QMenu)
-from PyQt6.QtCore import Qt, QPoint
+                           QLabel, QPushButton, QMenu, QMessageBox)
+from PyQt6.QtCore import Qt, QPoint, QTimer
 from PyQt6.QtGui import QPixmap, QIcon
 from utils.session import current_session
-from user_dashboard.create_booking import CreateBookingWindow
+from user_dashboard.create_booking import CreateBookingWindow, map_view_pool
 from user_dashboard.view_bookings import ViewBookingsWindow
 import os
+import sqlite3
 
 class UserDashboard(QMainWindow):
     def __init__(self):
@@ -153,6 +154,39 @@ class UserDashboard(QMainWindow):
         
         content_layout.addLayout(buttons_layout)
         layout.addWidget(content_widget)
+        
+        # Warm up a map view once the dashboard is idle so the booking form opens instantly
+        QTimer.singleShot(500, map_view_pool.warm_up)
+        
+        # Pickup reminders and other messages left by the scheduler
+        self.notification_timer = QTimer(self)
+        self.notification_timer.setInterval(30000)
+        self.notification_timer.timeout.connect(self.check_notifications)
+        self.notification_timer.start()
+    
+    def check_notifications(self):
+        try:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database', 'taxi_booking.db')
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, message FROM notifications
+                WHERE user_id = ? AND read_at IS NULL
+                ORDER BY id
+            ''', (current_session.user_id,))
+            notifications = cursor.fetchall()
+            if notifications:
+                cursor.executemany("UPDATE notifications SET read_at = DATETIME('now') WHERE id = ?",
+                                   [(notification_id,) for notification_id, _ in notifications])
+                conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Failed to check notifications: {str(e)}")
+            return
+        
+        for _, message in notifications:
+            QMessageBox.information(self, "Reminder", message)
     
     def show_booking_form(self):
         self.booking_window = CreateBookingWindow(self)
@@ -217,6 +251,7 @@ class UserDashboard(QMainWindow):
         
     def handle_logout(self):
         from login_window import LoginWindow
+        self.notification_timer.stop()
         current_session.clear_session()
         self.login_window = LoginWindow()
         self.login_window.show()
@@ -0,0 +1,100 @@
+import time
+
+ASSIGNED = 'assigned'
+UNASSIGNED = 'unassigned'
+BOOKING_TAKEN = 'booking_taken'  # No longer in the status the caller expected
+BOOKING_CHANGED = 'booking_changed'  # Edited since the caller read it (version moved on)
+DRIVER_BUSY = 'driver_busy'
+DRIVER_DECLINED = 'driver_declined'  # The driver has already turned this booking down
+DECLINED = 'declined'
+NOT_FOUND = 'not_found'
+
+ACTIVE_STATUSES = ('assigned', 'confirmed', 'on_the_way')
+
+# The driver's other committed trips whose window overlaps the target booking's. A booking
+# without a stored window (made before windows existed) clashes with everything.
+CLASHING_TRIPS = f'''
+    SELECT 1 FROM bookings other, bookings target
+    WHERE target.id = ? AND other.driver_id = ? AND other.id != target.id
+    AND other.booking_status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+    AND (other.window_start IS NULL OR target.window_start IS NULL
+         OR (other.window_start < target.window_end AND other.window_end > target.window_start))
+'''
+
+DECLINED_BY = '''
+    SELECT 1 FROM booking_declines WHERE booking_id = ? AND driver_id = ?
+'''
+
+
+def assign(conn, booking_id, driver_id, admin_id=None, expected_version=None):
+    # One conditional UPDATE: SQLite runs it under the write lock, so the status, version
+    # and driver-clash checks and the write can't interleave with another process's assignment.
+    # The caller owns the transaction; returns ASSIGNED or the reason it lost.
+    version_guard = "AND version = ?" if expected_version is not None else ""
+    params = (driver_id, admin_id, booking_id)
+    if expected_version is not None:
+        params += (expected_version,)
+    params += (booking_id, driver_id) + ACTIVE_STATUSES
+
+    cursor = conn.execute(f'''
+        UPDATE bookings
+        SET driver_id = ?, booking_status = 'assigned', admin_id = ?
+        WHERE id = ? AND booking_status = 'pending' AND driver_id IS NULL
+        {version_guard}
+        AND NOT EXISTS ({CLASHING_TRIPS})
+        AND NOT EXISTS ({DECLINED_BY})
+    ''', params + (booking_id, driver_id))
+    if cursor.rowcount:
+        return ASSIGNED
+    return lost_reason(conn, booking_id, driver_id, expected_version)
+
+
+def unassign(conn, booking_id, expected_version=None):
+    # Only a trip that hasn't started can be taken back (a declined one goes back to the queue)
+    version_guard = "AND version = ?" if expected_version is not None else ""
+    params = (booking_id,) + ((expected_version,) if expected_version is not None else ())
+    cursor = conn.execute(f'''
+        UPDATE bookings
+        SET driver_id = NULL, booking_status = 'pending', admin_id = NULL
+        WHERE id = ? AND booking_status IN ('assigned', 'confirmed', 'declined')
+        {version_guard}
+    ''', params)
+    if cursor.rowcount:
+        return UNASSIGNED
+    return lost_reason(conn, booking_id, None, expected_version)
+
+
+def decline(conn, booking_id, driver_id, now=None):
+    # The driver hands the booking back: in one transaction it returns to pending, the
+    # driver is remembered so it isn't offered to them again, and a release job due now
+    # has the scheduler run a dispatch round for it straight away
+    now = now if now is not None else time.time()
+    cursor = conn.execute('''
+        UPDATE bookings
+        SET driver_id = NULL, booking_status = 'pending', admin_id = NULL
+        WHERE id = ? AND driver_id = ? AND booking_status IN ('assigned', 'confirmed')
+    ''', (booking_id, driver_id))
+    if not cursor.rowcount:
+        return lost_reason(conn, booking_id, None, None)
+    conn.execute('''
+        INSERT OR REPLACE INTO booking_declines (booking_id, driver_id, declined_at) VALUES (?, ?, ?)
+    ''', (booking_id, driver_id, now))
+    conn.execute('''
+        INSERT INTO scheduled_jobs (booking_id, kind, due_at) VALUES (?, 'release', ?)
+    ''', (booking_id, now))
+    return DECLINED
+
+
+def lost_reason(conn, booking_id, driver_id, expected_version):
+    row = conn.execute('SELECT version FROM bookings WHERE id = ?', (booking_id,)).fetchone()
+    if row is None:
+        return NOT_FOUND
+    if expected_version is not None and row[0] != expected_version:
+        return BOOKING_CHANGED
+    if driver_id is not None:
+        busy = conn.execute(CLASHING_TRIPS, (booking_id, driver_id) + ACTIVE_STATUSES).fetchone()
+        if busy:
+            return DRIVER_BUSY
+        if conn.execute(DECLINED_BY, (booking_id, driver_id)).fetchone():
+            return DRIVER_DECLINED
+    return BOOKING_TAKEN
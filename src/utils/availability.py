@@ -0,0 +1,266 @@
+import argparse
+import os
+import random
+import sqlite3
+from utils.fare import parse_pickup_time
+from utils.eta import eta_model
+from utils.change_feed import BookingChangeFeed
+
+COMMITTED_STATUSES = ('assigned', 'confirmed', 'on_the_way')
+APPROACH_SECONDS = 15 * 60  # Time blocked before pickup for the driver to get there
+DEFAULT_TRIP_SECONDS = 45 * 60  # When the trip has no distance to estimate from
+WINDOW_COLUMNS = '''
+    id, driver_id, booking_status, window_start, window_end, pickup_time,
+    CAST(strftime('%s', created_at) AS REAL), pickup_zone, dropoff_zone, distance_km
+'''
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def trip_window(pickup_time_text, created_at, pickup_zone, dropoff_zone, distance_km):
+    # (start, end) unix seconds a driver is committed for; bookings without a readable
+    # pickup time are treated as "as soon as possible" from when they were made
+    pickup_time = parse_pickup_time(pickup_time_text)
+    start = pickup_time.timestamp() if pickup_time else created_at
+    if start is None:
+        return None
+    if distance_km:
+        duration = eta_model.predict(pickup_zone, dropoff_zone, distance_km, pickup_time)
+    else:
+        duration = DEFAULT_TRIP_SECONDS
+    return start - APPROACH_SECONDS, start + duration
+
+
+def booking_window(cursor, booking_id):
+    cursor.execute('''
+        SELECT window_start, window_end, pickup_time, CAST(strftime('%s', created_at) AS REAL),
+               pickup_zone, dropoff_zone, distance_km
+        FROM bookings WHERE id = ?
+    ''', (booking_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if row[0] is not None:
+        return row[0], row[1]
+    return trip_window(*row[2:])
+
+
+class IntervalNode:
+    __slots__ = ('start', 'end', 'key', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, key):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+    def update(self):
+        self.max_end = self.end
+        if self.left is not None and self.left.max_end > self.max_end:
+            self.max_end = self.left.max_end
+        if self.right is not None and self.right.max_end > self.max_end:
+            self.max_end = self.right.max_end
+
+
+def rotate_right(node):
+    top = node.left
+    node.left = top.right
+    top.right = node
+    node.update()
+    top.update()
+    return top
+
+
+def rotate_left(node):
+    top = node.right
+    node.right = top.left
+    top.left = node
+    node.update()
+    top.update()
+    return top
+
+
+class IntervalTree:
+    # Treap ordered by (start, key), each node carrying the largest end in its subtree,
+    # so insert, remove and "does anything overlap [start, end)" are O(log n) expected
+    def __init__(self):
+        self.root = None
+        self.starts = {}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def insert(self, start, end, key):
+        if key in self.starts:
+            self.remove(key)
+        self.starts[key] = start
+        self.root = self._insert(self.root, IntervalNode(start, end, key))
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if (new.start, new.key) < (node.start, node.key):
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                return rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                return rotate_left(node)
+        node.update()
+        return node
+
+    def remove(self, key):
+        start = self.starts.pop(key, None)
+        if start is not None:
+            self.root = self._remove(self.root, start, key)
+
+    def _remove(self, node, start, key):
+        if node is None:
+            return None
+        if (start, key) < (node.start, node.key):
+            node.left = self._remove(node.left, start, key)
+        elif (start, key) > (node.start, node.key):
+            node.right = self._remove(node.right, start, key)
+        else:
+            if node.left is None:
+                return node.right
+            if node.right is None:
+                return node.left
+            # Rotate the higher-priority child up and keep sinking the node until it's a leaf
+            if node.left.priority > node.right.priority:
+                node = rotate_right(node)
+                node.right = self._remove(node.right, start, key)
+            else:
+                node = rotate_left(node)
+                node.left = self._remove(node.left, start, key)
+        node.update()
+        return node
+
+    def overlaps(self, start, end, ignore=None):
+        # Any interval with node.start < end and node.end > start, other than key `ignore`
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            if node.start < end and node.end > start and node.key != ignore:
+                return True
+            # Nothing in the right subtree starts before node.start, so only look there
+            # while it could still begin before `end`
+            if node.start < end:
+                stack.append(node.right)
+            stack.append(node.left)
+        return False
+
+
+class DriverAvailability:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_db_path()
+        self.trees = {}
+        self.windows = {}  # booking_id -> driver_id whose tree holds it
+        self.feed = BookingChangeFeed()
+
+    def load(self):
+        self.trees = {}
+        self.windows = {}
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            self.feed.start(cursor)
+            cursor.execute(f'''
+                SELECT {WINDOW_COLUMNS}
+                FROM bookings
+                WHERE driver_id IS NOT NULL
+                AND booking_status IN ({', '.join('?' * len(COMMITTED_STATUSES))})
+            ''', COMMITTED_STATUSES)
+            for row in cursor.fetchall():
+                self.apply_row(row)
+        finally:
+            conn.close()
+
+    def apply_row(self, row):
+        booking_id, driver_id, status, window_start, window_end = row[:5]
+        previous = self.windows.pop(booking_id, None)
+        if previous is not None:
+            self.trees[previous].remove(booking_id)
+            if not self.trees[previous]:
+                del self.trees[previous]
+        if driver_id is None or status not in COMMITTED_STATUSES:
+            return
+        if window_start is None:
+            window = trip_window(*row[5:])
+            if window is None:
+                return
+            window_start, window_end = window
+        self.trees.setdefault(driver_id, IntervalTree()).insert(window_start, window_end, booking_id)
+        self.windows[booking_id] = driver_id
+
+    def sync(self):
+        # Catch up with changes made by other windows and processes since the last call
+        if not self.feed.started:
+            self.load()
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            booking_ids, rows = self.feed.changes(conn.cursor(), WINDOW_COLUMNS)
+        finally:
+            conn.close()
+        found = {row[0] for row in rows}
+        for row in rows:
+            self.apply_row(row)
+        for booking_id in booking_ids:
+            if booking_id not in found:
+                # Deleted booking: same as leaving the committed statuses
+                self.apply_row((booking_id, None, None, None, None))
+
+    def is_free(self, driver_id, start, end, ignore=None):
+        tree = self.trees.get(driver_id)
+        return tree is None or not tree.overlaps(start, end, ignore)
+
+    def free_drivers(self, driver_ids, start, end, ignore=None):
+        self.sync()
+        return [driver_id for driver_id in driver_ids if self.is_free(driver_id, start, end, ignore)]
+
+
+driver_availability = DriverAvailability()
+
+
+def backfill_windows(db_path=None, chunk_size=5000):
+    # Bookings made before windows were stored; the assignment guard treats these as
+    # clashing with everything, so fill them in
+    conn = sqlite3.connect(db_path or default_db_path())
+    filled = 0
+    try:
+        rows = conn.execute('''
+            SELECT id, pickup_time, CAST(strftime('%s', created_at) AS REAL),
+                   pickup_zone, dropoff_zone, distance_km
+            FROM bookings WHERE window_start IS NULL
+        ''').fetchall()
+        updates = []
+        for booking_id, *details in rows:
+            window = trip_window(*details)
+            if window is not None:
+                updates.append(window + (booking_id,))
+        with conn:
+            for offset in range(0, len(updates), chunk_size):
+                conn.executemany('UPDATE bookings SET window_start = ?, window_end = ? WHERE id = ?',
+                                 updates[offset:offset + chunk_size])
+        filled = len(updates)
+    finally:
+        conn.close()
+    return filled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill in trip windows for bookings made before they were stored")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    print(f"Filled trip windows for {backfill_windows(args.db)} bookings")
@@ -0,0 +1,43 @@
+BATCH_SIZE = 500
+
+
+class BookingChangeFeed:
+    # Follows booking_status_history (filled by triggers on bookings) from a remembered id,
+    # so in-memory indexes can catch up with changes made by any window or process by
+    # re-reading just the bookings that moved
+    def __init__(self):
+        self.last_id = None
+
+    @property
+    def started(self):
+        return self.last_id is not None
+
+    def start(self, cursor):
+        # Call before reading the initial snapshot; anything after it will be replayed
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM booking_status_history')
+        self.last_id = cursor.fetchone()[0]
+
+    def changes(self, cursor, columns, source='bookings', key='id'):
+        # (changed booking ids, current rows of those that still exist). `columns` is the
+        # select list and should start with the booking id; `source` may join other tables
+        # as long as `key` names the booking id column.
+        cursor.execute('''
+            SELECT MAX(id), booking_id FROM booking_status_history
+            WHERE id > ? GROUP BY booking_id
+        ''', (self.last_id,))
+        changed = cursor.fetchall()
+        if not changed:
+            return [], []
+        self.last_id = max(history_id for history_id, _ in changed)
+
+        booking_ids = [booking_id for _, booking_id in changed]
+        rows = []
+        for offset in range(0, len(booking_ids), BATCH_SIZE):
+            batch = booking_ids[offset:offset + BATCH_SIZE]
+            cursor.execute(f'''
+                SELECT {columns}
+                FROM {source}
+                WHERE {key} IN ({', '.join('?' * len(batch))})
+            ''', batch)
+            rows.extend(cursor.fetchall())
+        return booking_ids, rows
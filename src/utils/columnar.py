@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+import numpy as np
+from utils.fare import parse_pickup_times
+
+# Bookings as one .npy file per column in a directory per local creation day:
+#
+#   out/manifest.json          row count and change fingerprint of each day written
+#   out/dictionaries.json      the string table of each dictionary-encoded column
+#   out/2026-10-18/fare.npy    ...one file per column
+#
+# Every file loads with np.load(mmap_mode='r'). Dictionaries only ever grow, so a code
+# means the same string in every partition.
+
+CHUNK_SIZE = 50000
+MISSING = -1  # Code and id for NULL in the integer columns
+
+# name -> (select expression, dtype, dictionary-encoded)
+COLUMNS = {
+    'id': ('id', np.int64, False),
+    'user_id': ('user_id', np.int32, False),
+    'driver_id': ('driver_id', np.int32, False),
+    'status': ('booking_status', np.int16, True),
+    'pickup_time': ('pickup_time', 'datetime64[m]', False),
+    'created_at': ("CAST(strftime('%s', created_at) AS INTEGER)", 'datetime64[s]', False),
+    'fare': ('fare', np.float64, False),
+    'distance_km': ('distance_km', np.float64, False),
+    'pickup_lat': ('pickup_lat', np.float64, False),
+    'pickup_lng': ('pickup_lng', np.float64, False),
+    'dropoff_lat': ('dropoff_lat', np.float64, False),
+    'dropoff_lng': ('dropoff_lng', np.float64, False),
+    'pickup_zone': ('pickup_zone', np.int16, True),
+    'dropoff_zone': ('dropoff_zone', np.int16, True),
+    'pickup_location': ('pickup_location', np.int32, True),
+    'dropoff_location': ('dropoff_location', np.int32, True),
+}
+
+DAY = "date(created_at, 'localtime')"
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path, value):
+    # Write-then-rename so a crash never leaves a half-written manifest
+    with open(path + '.tmp', 'w') as f:
+        json.dump(value, f)
+    os.replace(path + '.tmp', path)
+
+
+def day_fingerprints(conn, before_day):
+    # Any insert, delete or update of an exported column moves a day's fingerprint (the
+    # version triggers bump on every such update), so unchanged days can be skipped unread
+    cursor = conn.execute(f'''
+        SELECT {DAY}, COUNT(*), MAX(id), SUM(version)
+        FROM bookings
+        WHERE created_at IS NOT NULL AND {DAY} < ?
+        GROUP BY 1
+    ''', (before_day,))
+    return {day: [count, max_id, versions] for day, count, max_id, versions in cursor.fetchall()}
+
+
+def encode(values, dictionary, index):
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = MISSING
+            continue
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(dictionary)
+            dictionary.append(value)
+        codes[i] = code
+    return codes
+
+
+def to_column(name, values, dictionaries, indexes):
+    _, dtype, encoded = COLUMNS[name]
+    if encoded:
+        return encode(values, dictionaries.setdefault(name, []), indexes[name]).astype(dtype)
+    if name == 'pickup_time':
+        return parse_pickup_times(values)
+    if name == 'created_at':
+        return np.array([MISSING if v is None else v for v in values], dtype=np.int64).astype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        return np.array([MISSING if v is None else v for v in values], dtype=dtype)
+    # Fares are stored as text; anything unreadable becomes NaN
+    column = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        try:
+            column[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return column
+
+
+def write_partition(out_dir, day, chunks):
+    staging = os.path.join(out_dir, f'.{day}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in COLUMNS:
+        np.save(os.path.join(staging, name + '.npy'), np.concatenate([chunk[name] for chunk in chunks]))
+    final = os.path.join(out_dir, day)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(staging, final)
+
+
+def day_groups(cursor):
+    # fetchmany batches split where the day changes: yields (day, rows)
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            return
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i][0] != rows[start][0]:
+                yield rows[start][0], rows[start:i]
+                start = i
+
+
+def export(out_dir, db_path=None, include_today=False):
+    # Writes the days that are new or have changed since the last export and returns them.
+    # Today is left out by default, since it is still filling up.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = read_json(os.path.join(out_dir, 'manifest.json'), {'partitions': {}})
+    dictionaries = read_json(os.path.join(out_dir, 'dictionaries.json'), {})
+    indexes = {name: {value: code for code, value in enumerate(dictionaries.get(name, []))}
+               for name, (_, _, encoded) in COLUMNS.items() if encoded}
+
+    conn = sqlite3.connect(db_path or default_db_path())
+    try:
+        before_day = '9999-12-31' if include_today else datetime.now().strftime('%Y-%m-%d')
+        fingerprints = day_fingerprints(conn, before_day)
+        partitions = manifest['partitions']
+        stale = sorted(day for day, fingerprint in fingerprints.items()
+                       if partitions.get(day, {}).get('fingerprint') != fingerprint)
+        # Days whose bookings have all been deleted
+        gone = [day for day in partitions if day not in fingerprints and day < before_day]
+
+        if stale:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {DAY}, {', '.join(expression for expression, _, _ in COLUMNS.values())}
+                FROM bookings
+                WHERE {DAY} IN ({', '.join('?' * len(stale))})
+                ORDER BY {DAY}, id
+            ''', stale)
+
+            # Only one day's rows are held at a time
+            day, chunks = None, []
+            for group_day, rows in day_groups(cursor):
+                if group_day != day and chunks:
+                    write_partition(out_dir, day, chunks)
+                    chunks = []
+                day = group_day
+                values = list(zip(*rows))
+                chunks.append({name: to_column(name, values[i + 1], dictionaries, indexes)
+                               for i, name in enumerate(COLUMNS)})
+            if chunks:
+                write_partition(out_dir, day, chunks)
+    finally:
+        conn.close()
+
+    for day in stale:
+        partitions[day] = {'rows': fingerprints[day][0], 'fingerprint': fingerprints[day]}
+    for day in gone:
+        shutil.rmtree(os.path.join(out_dir, day), ignore_errors=True)
+        del partitions[day]
+    manifest['columns'] = {name: np.dtype(dtype).str for name, (_, dtype, _) in COLUMNS.items()}
+    # Dictionaries first: the manifest must never list a partition using codes they lack
+    write_json(os.path.join(out_dir, 'dictionaries.json'), dictionaries)
+    write_json(os.path.join(out_dir, 'manifest.json'), manifest)
+    return stale
+
+
+def partition_days(out_dir, first_day=None, last_day=None):
+    days = sorted(read_json(os.path.join(out_dir, 'manifest.json'), {'partitions': {}})['partitions'])
+    return [day for day in days if (first_day is None or day >= first_day) and (last_day is None or day <= last_day)]
+
+
+def open_partition(out_dir, day, columns=None):
+    # Memory-mapped, so nothing is read from disk until the arrays are used
+    return {name: np.load(os.path.join(out_dir, day, name + '.npy'), mmap_mode='r')
+            for name in (columns or COLUMNS)}
+
+
+def load(out_dir, columns=None, first_day=None, last_day=None):
+    # The chosen columns over a range of days as single arrays
+    parts = [open_partition(out_dir, day, columns) for day in partition_days(out_dir, first_day, last_day)]
+    return {name: np.concatenate([part[name] for part in parts]) if parts
+            else np.empty(0, dtype=COLUMNS[name][1])
+            for name in (columns or COLUMNS)}
+
+
+def decode(out_dir, name, codes):
+    # Codes of a dictionary-encoded column back to strings (None where missing)
+    dictionary = np.array(read_json(os.path.join(out_dir, 'dictionaries.json'), {}).get(name, []) + [None],
+                          dtype=object)
+    return dictionary[np.asarray(codes)]  # MISSING (-1) picks the trailing None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export bookings as memory-mappable NumPy columns, one directory per day")
+    parser.add_argument("output", help="directory to write (or bring up to date)")
+    parser.add_argument("--today", action="store_true", help="also write today's partial day")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    days = export(args.output, args.db, args.today)
+    print(f"Wrote {len(days)} day partitions in {time.perf_counter() - start:.1f}s"
+          + (f" ({days[0]} to {days[-1]})" if days else ""))
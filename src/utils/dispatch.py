@@ -0,0 +1,262 @@
+import argparse
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from utils.fare import parse_pickup_time, road_distance_km_many
+from utils.eta import eta_model
+from utils.surge import surge_engine
+from utils.assignment import assign, ASSIGNED
+from utils.availability import DriverAvailability, driver_availability, trip_window
+from utils.pending_queue import PendingQueue, pending_queue
+
+HORIZON_SECONDS = 30 * 60  # Bookings further out than this are left for a later round
+MAX_BATCH = 200  # Most urgent bookings considered per round
+MAX_PICKUP_KM = 25.0
+DRIVER_STALE_SECONDS = 600
+LATE_WEIGHT = 3.0  # Each second a driver would arrive after the booked time counts triple
+WAIT_WEIGHT = 0.5  # Bookings that have waited longer win contested drivers
+IDLE_WEIGHT = 0.2  # ...and so do drivers who have been idle longer
+MAX_IDLE_SECONDS = 2 * 3600
+UNREACHABLE = 1e9
+
+Proposal = namedtuple('Proposal', 'booking_id driver_id driver_name pickup_location pickup_zone '
+                                  'pickup_km eta_seconds cost')
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+_indexes = {}
+
+
+def indexes_for(db_path):
+    # The app-wide queue and availability trees, or a private pair for another database
+    if db_path is None or os.path.abspath(db_path) == os.path.abspath(pending_queue.db_path):
+        return pending_queue, driver_availability
+    db_path = os.path.abspath(db_path)
+    if db_path not in _indexes:
+        _indexes[db_path] = (PendingQueue(db_path), DriverAvailability(db_path))
+    return _indexes[db_path]
+
+
+def solve_assignment(cost):
+    # Min-cost assignment (Hungarian method with potentials, O(n^2 m)); returns (row, col)
+    # pairs. Rectangular matrices leave the surplus rows or columns unassigned.
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return []
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # owner[j] = 1-based row holding column j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            j1 = int(np.argmin(np.where(free, min_reduced[1:], np.inf))) + 1
+            delta = min_reduced[j1]
+            used_columns = np.flatnonzero(used)
+            u[owner[used_columns]] += delta
+            v[used_columns] -= delta
+            min_reduced[1:][free] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    pairs = [(int(owner[j]) - 1, j - 1) for j in range(1, m + 1) if owner[j]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+def pending_bookings(cursor, now, queue):
+    # The most urgent bookings due within the horizon, popped off the pending queue in
+    # order. They go back on straight away so a preview or a lost race leaves them queued;
+    # apply() and the change feed drop the ones that do get a driver.
+    queue.sync()
+    popped = queue.pop_many(4 * MAX_BATCH)
+    for booking in popped:
+        queue.push(booking)
+    due_soon = [booking.booking_id for booking in popped if booking.due - now <= HORIZON_SECONDS][:MAX_BATCH]
+    if not due_soon:
+        return []
+    rank = {booking_id: i for i, booking_id in enumerate(due_soon)}
+
+    cursor.execute(f'''
+        SELECT id, pickup_location, pickup_time, pickup_lat, pickup_lng, pickup_zone,
+               CAST(strftime('%s', created_at) AS REAL), window_start, window_end,
+               dropoff_zone, distance_km
+        FROM bookings
+        WHERE id IN ({', '.join('?' * len(due_soon))})
+        AND booking_status = 'pending' AND driver_id IS NULL AND pickup_lat IS NOT NULL
+    ''', due_soon)
+    bookings = []
+    for (booking_id, location, pickup_text, lat, lng, zone, created, window_start, window_end,
+         dropoff_zone, distance_km) in sorted(cursor.fetchall(), key=lambda row: rank[row[0]]):
+        pickup_time = parse_pickup_time(pickup_text)
+        due = pickup_time.timestamp() if pickup_time else now
+        window = (window_start, window_end) if window_start is not None else \
+            trip_window(pickup_text, created or now, zone, dropoff_zone, distance_km)
+        bookings.append((booking_id, location, lat, lng, zone, due, created or now, window))
+    return bookings
+
+
+def idle_drivers(cursor, now):
+    # Available and recently seen; trips they already hold are checked per booking window
+    cursor.execute('''
+        SELECT d.id, d.username, l.latitude, l.longitude,
+               (SELECT MAX(h.changed_at) FROM booking_status_history h
+                WHERE h.driver_id = d.id AND h.new_status IN ('completed', 'incomplete'))
+        FROM drivers d
+        JOIN driver_locations l ON l.driver_id = d.id
+        WHERE d.status = 'available'
+        AND l.recorded_at >= ?
+        ORDER BY d.id
+    ''', (now - DRIVER_STALE_SECONDS,))
+    return cursor.fetchall()
+
+
+def declined_pairs(cursor, bookings):
+    # (booking_id, driver_id) pairs where the driver has turned the booking down
+    booking_ids = [booking[0] for booking in bookings]
+    cursor.execute(f'''
+        SELECT booking_id, driver_id FROM booking_declines
+        WHERE booking_id IN ({', '.join('?' * len(booking_ids))})
+    ''', booking_ids)
+    return set(cursor.fetchall())
+
+
+def cost_matrix(bookings, drivers, now, availability, declined=()):
+    booking_lat = np.array([b[2] for b in bookings], dtype=float)
+    booking_lng = np.array([b[3] for b in bookings], dtype=float)
+    due = np.array([b[5] for b in bookings], dtype=float)
+    waited = now - np.array([b[6] for b in bookings], dtype=float)
+    driver_lat = np.array([d[2] for d in drivers], dtype=float)
+    driver_lng = np.array([d[3] for d in drivers], dtype=float)
+    idle = np.array([now - d[4] if d[4] else MAX_IDLE_SECONDS for d in drivers], dtype=float)
+
+    distance = road_distance_km_many(booking_lat[:, None], booking_lng[:, None],
+                                     driver_lat[None, :], driver_lng[None, :])
+    # Pace within the pickup zone stands in for the driver's approach
+    pace = np.array([eta_model.seconds_per_km(b[4], b[4]) for b in bookings])
+    travel = distance * pace[:, None]
+
+    cost = travel + LATE_WEIGHT * np.maximum(0.0, now + travel - due[:, None])
+    cost -= WAIT_WEIGHT * np.maximum(0.0, waited)[:, None]
+    cost -= IDLE_WEIGHT * np.minimum(idle, MAX_IDLE_SECONDS)[None, :]
+    cost[distance > MAX_PICKUP_KM] = UNREACHABLE
+
+    # A driver can't take a booking that overlaps one of their committed trips
+    availability.sync()
+    for col, driver in enumerate(drivers):
+        if driver[0] in availability.trees:
+            for row, booking in enumerate(bookings):
+                if booking[7] is not None and not availability.is_free(driver[0], *booking[7]):
+                    cost[row, col] = UNREACHABLE
+
+    # ...nor be offered one they have already declined
+    if declined:
+        rows = {booking[0]: row for row, booking in enumerate(bookings)}
+        cols = {driver[0]: col for col, driver in enumerate(drivers)}
+        for booking_id, driver_id in declined:
+            if booking_id in rows and driver_id in cols:
+                cost[rows[booking_id], cols[driver_id]] = UNREACHABLE
+    return cost, distance, travel
+
+
+def plan(db_path=None, now=None, indexes=None):
+    # `indexes` is a (queue, availability) pair to use instead of the shared one, for
+    # callers on another thread
+    now = now if now is not None else time.time()
+    queue, availability = indexes or indexes_for(db_path)
+    conn = sqlite3.connect(db_path or default_db_path())
+    try:
+        cursor = conn.cursor()
+        bookings = pending_bookings(cursor, now, queue)
+        drivers = idle_drivers(cursor, now)
+        declined = declined_pairs(cursor, bookings) if bookings else set()
+    finally:
+        conn.close()
+    if not bookings or not drivers:
+        return []
+
+    cost, distance, travel = cost_matrix(bookings, drivers, now, availability, declined)
+    proposals = []
+    for row, col in solve_assignment(cost):
+        if cost[row, col] >= UNREACHABLE:
+            continue
+        booking, driver = bookings[row], drivers[col]
+        proposals.append(Proposal(booking[0], driver[0], driver[1], booking[1], booking[4],
+                                  float(distance[row, col]), float(travel[row, col]), float(cost[row, col])))
+    return proposals
+
+
+def apply(proposals, db_path=None, indexes=None):
+    # One transaction for the whole round. A booking or driver claimed elsewhere since
+    # the plan was made loses its compare-and-set and is skipped rather than overwritten.
+    if not proposals:
+        return []
+    conn = sqlite3.connect(db_path or default_db_path())
+    applied = []
+    try:
+        with conn:
+            for proposal in proposals:
+                if assign(conn, proposal.booking_id, proposal.driver_id) == ASSIGNED:
+                    applied.append(proposal)
+    finally:
+        conn.close()
+
+    queue, _ = indexes or indexes_for(db_path)
+    for proposal in applied:
+        queue.remove(proposal.booking_id)
+    if applied:
+        surge_engine.invalidate()
+    return applied
+
+
+def run(db_path=None, interval=5.0, preview=False):
+    while True:
+        start = time.perf_counter()
+        proposals = plan(db_path)
+        applied = proposals if preview else apply(proposals, db_path)
+        stamp = datetime.now().strftime('%H:%M:%S')
+        for proposal in applied:
+            print(f"{stamp} booking {proposal.booking_id} -> {proposal.driver_name} "
+                  f"({proposal.pickup_km:.1f} km, ~{proposal.eta_seconds / 60:.0f} min away)")
+        print(f"{stamp} {'proposed' if preview else 'assigned'} {len(applied)} of {len(proposals)} "
+              f"in {time.perf_counter() - start:.3f}s")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match pending bookings to idle drivers every few seconds")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between rounds")
+    parser.add_argument("--preview", action="store_true", help="print the assignments without applying them")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    run(args.db, args.interval, args.preview)
@@ -0,0 +1,169 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from utils.rollups import period_days
+
+PERIODS = ['Today', 'Last 7 Days', 'Last 30 Days', 'Last 12 Months']
+BATCH_SIZE = 500  # Drivers per query, well under SQLite's bound-parameter limit
+
+# Each status change beside the one before and after it on the same booking. Only bookings
+# the drivers touched in the period are read, but the whole of each booking's history is,
+# so a trip started before the period and finished in it still has its start.
+STEPS = '''
+    SELECT driver_id, new_status, changed_at,
+           LEAD(new_status) OVER booking_steps AS next_status,
+           LEAD(changed_at) OVER booking_steps AS next_at,
+           LAG(new_status) OVER booking_steps AS previous_status,
+           LAG(changed_at) OVER booking_steps AS previous_at
+    FROM booking_status_history
+    WHERE booking_id IN (
+        SELECT booking_id FROM booking_status_history
+        WHERE driver_id IN ({drivers}) AND changed_at >= ? AND changed_at < ?
+    )
+    WINDOW booking_steps AS (PARTITION BY booking_id ORDER BY changed_at, id)
+'''
+
+# An offer is a change to 'assigned'; it was accepted if the next change is the same
+# driver confirming. A trip runs from 'on_the_way' (Start Trip) to 'completed'.
+METRICS = f'''
+    SELECT driver_id,
+           SUM(new_status = 'assigned'),
+           SUM(new_status = 'assigned' AND next_status = 'confirmed'),
+           SUM(new_status = 'completed'),
+           SUM(new_status = 'incomplete'),
+           AVG(CASE WHEN new_status = 'assigned' AND next_status = 'confirmed' THEN next_at - changed_at END),
+           AVG(CASE WHEN new_status = 'completed' AND previous_status = 'on_the_way'
+                    THEN changed_at - previous_at END)
+    FROM ({STEPS})
+    WHERE driver_id IN ({{drivers}}) AND changed_at >= ? AND changed_at < ?
+    GROUP BY driver_id
+'''
+
+# Declines reset the booking with no driver on it, so they're counted from booking_declines.
+# That includes trips handed back after being confirmed.
+DECLINES = '''
+    SELECT driver_id, COUNT(*) FROM booking_declines
+    WHERE driver_id IN ({drivers}) AND declined_at >= ? AND declined_at < ?
+    GROUP BY driver_id
+'''
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def period_bounds(first_day, last_day):
+    # Local days to [start, end) in epoch seconds, the unit of changed_at and declined_at
+    start = datetime.strptime(first_day, '%Y-%m-%d')
+    end = datetime.strptime(last_day, '%Y-%m-%d') + timedelta(days=1)
+    return time.mktime(start.timetuple()), time.mktime(end.timetuple())
+
+
+def compute(cursor, driver_ids, start, end):
+    # {driver_id: (offers, accepted, declined, completed, incomplete, avg response, avg trip)}
+    drivers = ', '.join('?' * len(driver_ids))
+    cursor.execute(METRICS.format(drivers=drivers), driver_ids + [start, end] + driver_ids + [start, end])
+    metrics = {row[0]: row[1:] for row in cursor.fetchall()}
+    cursor.execute(DECLINES.format(drivers=drivers), driver_ids + [start, end])
+    declines = dict(cursor.fetchall())
+
+    empty = (0, 0, 0, 0, None, None)
+    results = {}
+    for driver_id in driver_ids:
+        offers, accepted, completed, incomplete, response, trip = metrics.get(driver_id, empty)
+        results[driver_id] = (offers, accepted, declines.get(driver_id, 0), completed, incomplete, response, trip)
+    return results
+
+
+def refresh(conn, period, today=None):
+    # Recomputes the cached rows of drivers with activity since they were cached (or whose
+    # period has rolled on to new days) and returns how many that was
+    first_day, last_day = period_days(period, today)
+    start, end = period_bounds(first_day, last_day)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT d.id, d.activity_version FROM drivers d
+        LEFT JOIN driver_performance p ON p.driver_id = d.id AND p.period = ?
+        WHERE p.driver_id IS NULL OR p.version != d.activity_version
+        OR p.first_day != ? OR p.last_day != ?
+    ''', (period, first_day, last_day))
+    # The version is read before the history, so a change made meanwhile leaves the row
+    # stale and it's picked up next time
+    stale = dict(cursor.fetchall())
+    if not stale:
+        return 0
+
+    driver_ids = list(stale)
+    with conn:
+        for i in range(0, len(driver_ids), BATCH_SIZE):
+            batch = driver_ids[i:i + BATCH_SIZE]
+            results = compute(cursor, batch, start, end)
+            cursor.executemany('''
+                INSERT OR REPLACE INTO driver_performance
+                (driver_id, period, first_day, last_day, version, offers, accepted, declined,
+                 completed, incomplete, avg_response_seconds, avg_trip_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(driver_id, period, first_day, last_day, stale[driver_id]) + results[driver_id]
+                  for driver_id in batch])
+    return len(driver_ids)
+
+
+def report(cursor, period):
+    # One row per driver, busiest first:
+    # (username, offers, accepted, declined, completed, incomplete, avg response, avg trip)
+    cursor.execute('''
+        SELECT d.username, p.offers, p.accepted, p.declined, p.completed, p.incomplete,
+               p.avg_response_seconds, p.avg_trip_seconds
+        FROM driver_performance p
+        JOIN drivers d ON d.id = p.driver_id
+        WHERE p.period = ?
+        ORDER BY p.offers DESC, p.completed DESC, d.username
+    ''', (period,))
+    return cursor.fetchall()
+
+
+def rate(count, total):
+    # Percentage, or None when there was nothing to measure
+    return 100.0 * count / total if total else None
+
+
+def clear(db_path=None):
+    # Drops every cached row, e.g. after editing the status history by hand
+    conn = sqlite3.connect(db_path or default_db_path())
+    try:
+        with conn:
+            count = conn.execute('DELETE FROM driver_performance').rowcount
+    finally:
+        conn.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print driver performance for a period, updating the cache as needed")
+    parser.add_argument("--period", choices=PERIODS, default='Last 30 Days')
+    parser.add_argument("--clear", action="store_true", help="drop the cache first and recompute every driver")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f"Cleared {clear(args.db)} cached rows")
+    conn = sqlite3.connect(args.db)
+    try:
+        start = time.perf_counter()
+        recomputed = refresh(conn, args.period)
+        rows = report(conn.cursor(), args.period)
+    finally:
+        conn.close()
+    print(f"{args.period}: {len(rows)} drivers, {recomputed} recomputed in {time.perf_counter() - start:.2f}s")
+
+    def percent(value):
+        return f"{value:5.1f}%" if value is not None else "    --"
+
+    for username, offers, accepted, declined, completed, incomplete, response, trip in rows:
+        trip_text = f"{trip / 60:5.1f} min" if trip is not None else "       --"
+        print(f"{username:20} offers {offers:5}  accept {percent(rate(accepted, offers))}  "
+              f"decline {percent(rate(declined, offers))}  "
+              f"complete {percent(rate(completed, completed + incomplete))}  trip {trip_text}")
@@ -0,0 +1,189 @@
+import sqlite3
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+
+Position = namedtuple('Position', ['driver_id', 'latitude', 'longitude', 'speed', 'heading', 'recorded_at'])
+
+
+class PositionIngest:
+    def __init__(self, db_path=None, ring_size=20, batch_size=1000, flush_interval=0.5, max_pending=200000):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # While the database is failing, pings beyond this many are dropped oldest first
+        self.max_pending = max_pending
+
+        # Pings waiting to be written, and the latest N positions per driver
+        self._pending = []
+        self._tracks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._writer = None
+
+        self.pings_received = 0
+        self.pings_written = 0
+        self.batches_written = 0
+        self.pings_dropped = 0
+
+    def start(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        self._stopping = False
+        self._writer = threading.Thread(target=self._run_writer, name="position-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        if self._writer is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._writer.join()
+        self._writer = None
+
+    def ingest(self, driver_id, latitude, longitude, speed=None, heading=None, recorded_at=None):
+        position = Position(driver_id, latitude, longitude, speed, heading,
+                            recorded_at if recorded_at is not None else time.time())
+        with self._lock:
+            self._pending.append(position)
+            self._trim_pending()
+            track = self._tracks.get(driver_id)
+            if track is None:
+                track = self._tracks[driver_id] = deque(maxlen=self.ring_size)
+            track.append(position)
+            self.pings_received += 1
+            pending_count = len(self._pending)
+
+        if self._writer is None:
+            self.start()
+        if pending_count >= self.batch_size:
+            self._wake.set()
+
+    def ingest_many(self, pings):
+        now = time.time()
+        positions = [Position(p[0], p[1], p[2],
+                              p[3] if len(p) > 3 else None,
+                              p[4] if len(p) > 4 else None,
+                              p[5] if len(p) > 5 and p[5] is not None else now)
+                     for p in pings]
+        with self._lock:
+            self._pending.extend(positions)
+            self._trim_pending()
+            for position in positions:
+                track = self._tracks.get(position.driver_id)
+                if track is None:
+                    track = self._tracks[position.driver_id] = deque(maxlen=self.ring_size)
+                track.append(position)
+            self.pings_received += len(positions)
+            pending_count = len(self._pending)
+
+        if self._writer is None:
+            self.start()
+        if pending_count >= self.batch_size:
+            self._wake.set()
+
+    def _trim_pending(self):
+        # Call with _lock held
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.pings_dropped += overflow
+
+    def _requeue(self, batch):
+        # A failed batch goes back in front of anything queued since, so order is kept
+        with self._lock:
+            self._pending[:0] = batch
+            self._trim_pending()
+
+    def latest(self, driver_id):
+        with self._lock:
+            track = self._tracks.get(driver_id)
+            return track[-1] if track else None
+
+    def track(self, driver_id):
+        with self._lock:
+            return list(self._tracks.get(driver_id, ()))
+
+    def latest_positions(self):
+        with self._lock:
+            return {driver_id: track[-1] for driver_id, track in self._tracks.items() if track}
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                self._write_batch(conn, batch)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            self._requeue(batch)
+            raise
+        return len(batch)
+
+    def _write_batch(self, conn, batch):
+        # Only the newest ping per driver goes to driver_locations
+        latest = {}
+        for position in batch:
+            current = latest.get(position.driver_id)
+            if current is None or position.recorded_at >= current.recorded_at:
+                latest[position.driver_id] = position
+
+        with conn:
+            conn.executemany('''
+                INSERT INTO driver_positions (driver_id, latitude, longitude, speed, heading, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', batch)
+            conn.executemany('''
+                INSERT INTO driver_locations (driver_id, latitude, longitude, recorded_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(driver_id) DO UPDATE SET
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    recorded_at = excluded.recorded_at
+                WHERE excluded.recorded_at >= driver_locations.recorded_at
+            ''', [(p.driver_id, p.latitude, p.longitude, p.recorded_at) for p in latest.values()])
+        with self._lock:
+            self.pings_written += len(batch)
+            self.batches_written += 1
+
+    def _run_writer(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        try:
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                if batch:
+                    try:
+                        self._write_batch(conn, batch)
+                    except sqlite3.Error as e:
+                        # Put the batch back so the next cycle retries it
+                        print(f"Failed to write driver positions: {str(e)}")
+                        self._requeue(batch)
+                        if self._stopping:
+                            break
+
+                if self._stopping:
+                    with self._lock:
+                        remaining = bool(self._pending)
+                    if not remaining:
+                        break
+        finally:
+            conn.close()
+
@@ -0,0 +1,169 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+DEFAULT_SECONDS_PER_KM = 120.0  # 30 km/h until there is history to learn from
+PRIOR_KM = 20.0  # How many km of evidence a cell needs before it outweighs its parent
+MAX_TRIP_SECONDS = 6 * 3600  # Longer gaps are forgotten "complete" taps, not trips
+ANY_HOUR = -1
+ANY_ZONE = '*'
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def hour_of_week(moment):
+    # Monday 00:00 = 0, as in the tariff tables
+    return moment.weekday() * 24 + moment.hour
+
+
+def trip_rows(cursor, after_id, up_to_id):
+    # Completed trips whose completion landed in (after_id, up_to_id], timed from the
+    # latest 'on_the_way' before it
+    cursor.execute('''
+        SELECT b.pickup_zone, b.dropoff_zone, b.distance_km,
+               (SELECT MAX(s.changed_at) FROM booking_status_history s
+                WHERE s.booking_id = h.booking_id AND s.new_status = 'on_the_way'
+                AND s.changed_at <= h.changed_at),
+               h.changed_at
+        FROM booking_status_history h
+        JOIN bookings b ON b.id = h.booking_id
+        WHERE h.id > ? AND h.id <= ? AND h.new_status = 'completed'
+    ''', (after_id, up_to_id))
+    return cursor.fetchall()
+
+
+def smooth(total_seconds, total_km, prior):
+    return (total_seconds + PRIOR_KM * prior) / (total_km + PRIOR_KM)
+
+
+def refresh(db_path=None, full=False):
+    # Folds trips completed since the last run into the running totals, then re-derives
+    # every cell's pace. The totals are the expensive part; there are at most a few
+    # thousand cells, so recomputing all the paces keeps them consistent with each other.
+    conn = sqlite3.connect(db_path or default_db_path())
+    try:
+        with conn:
+            cursor = conn.cursor()
+            # Take the write lock before reading the watermark, so two refreshes can't both
+            # fold the same trips; the second waits and then finds nothing new
+            cursor.execute('BEGIN IMMEDIATE')
+            if full:
+                cursor.execute('DELETE FROM eta_estimates')
+                cursor.execute("DELETE FROM watermarks WHERE name = 'eta_model'")
+
+            cursor.execute("SELECT last_id FROM watermarks WHERE name = 'eta_model'")
+            row = cursor.fetchone()
+            after_id = row[0] if row else 0
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM booking_status_history')
+            up_to_id = cursor.fetchone()[0]
+
+            totals = {}
+            for pickup_zone, dropoff_zone, distance_km, started_at, completed_at in trip_rows(cursor, after_id, up_to_id):
+                if started_at is None or not distance_km or pickup_zone is None or dropoff_zone is None:
+                    continue
+                seconds = completed_at - started_at
+                if seconds <= 0 or seconds > MAX_TRIP_SECONDS:
+                    continue
+                hour = hour_of_week(datetime.fromtimestamp(started_at))
+                for key in ((pickup_zone, dropoff_zone, hour),
+                            (pickup_zone, dropoff_zone, ANY_HOUR),
+                            (ANY_ZONE, ANY_ZONE, ANY_HOUR)):
+                    entry = totals.setdefault(key, [0, 0.0, 0.0])
+                    entry[0] += 1
+                    entry[1] += seconds
+                    entry[2] += distance_km
+
+            cursor.executemany('''
+                INSERT INTO eta_estimates (pickup_zone, dropoff_zone, hour_of_week, trips, total_seconds, total_km)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (pickup_zone, dropoff_zone, hour_of_week) DO UPDATE SET
+                    trips = trips + excluded.trips,
+                    total_seconds = total_seconds + excluded.total_seconds,
+                    total_km = total_km + excluded.total_km
+            ''', [key + tuple(entry) for key, entry in totals.items()])
+
+            # Each cell shrinks towards its parent: hour -> zone pair -> whole island -> default
+            cursor.execute('SELECT pickup_zone, dropoff_zone, hour_of_week, total_seconds, total_km FROM eta_estimates')
+            cells = {(p, d, h): (s, km) for p, d, h, s, km in cursor.fetchall()}
+            paces = {}
+            island = cells.get((ANY_ZONE, ANY_ZONE, ANY_HOUR))
+            island_pace = smooth(*island, DEFAULT_SECONDS_PER_KM) if island else DEFAULT_SECONDS_PER_KM
+            paces[(ANY_ZONE, ANY_ZONE, ANY_HOUR)] = island_pace
+            for key, (s, km) in cells.items():
+                if key[2] == ANY_HOUR and key[0] != ANY_ZONE:
+                    paces[key] = smooth(s, km, island_pace)
+            for key, (s, km) in cells.items():
+                if key[2] != ANY_HOUR:
+                    paces[key] = smooth(s, km, paces.get((key[0], key[1], ANY_HOUR), island_pace))
+
+            cursor.executemany('''
+                UPDATE eta_estimates SET seconds_per_km = ?
+                WHERE pickup_zone = ? AND dropoff_zone = ? AND hour_of_week = ?
+            ''', [(pace,) + key for key, pace in paces.items()])
+
+            cursor.execute('''
+                INSERT INTO watermarks (name, last_id) VALUES ('eta_model', ?)
+                ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+            ''', (up_to_id,))
+        return sum(entry[0] for key, entry in totals.items() if key[0] == ANY_ZONE)
+    finally:
+        conn.close()
+
+
+class EtaModel:
+    RELOAD_SECONDS = 600
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_db_path()
+        self.paces = {}
+        self.loaded_at = None
+
+    def load(self):
+        self.loaded_at = time.monotonic()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = conn.execute('''
+                    SELECT pickup_zone, dropoff_zone, hour_of_week, seconds_per_km
+                    FROM eta_estimates
+                    WHERE seconds_per_km IS NOT NULL
+                ''').fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Failed to load ETA estimates: {str(e)}")
+            return
+        self.paces = {(p, d, h): pace for p, d, h, pace in rows}
+
+    def seconds_per_km(self, pickup_zone, dropoff_zone, pickup_time=None):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.RELOAD_SECONDS:
+            self.load()
+        hour = hour_of_week(pickup_time or datetime.now())
+        pace = self.paces.get((pickup_zone, dropoff_zone, hour))
+        if pace is None:
+            pace = self.paces.get((pickup_zone, dropoff_zone, ANY_HOUR))
+        if pace is None:
+            pace = self.paces.get((ANY_ZONE, ANY_ZONE, ANY_HOUR), DEFAULT_SECONDS_PER_KM)
+        return pace
+
+    def predict(self, pickup_zone, dropoff_zone, distance_km, pickup_time=None):
+        return self.seconds_per_km(pickup_zone, dropoff_zone, pickup_time) * distance_km
+
+
+eta_model = EtaModel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the ETA lookup table from completed trips")
+    parser.add_argument("--full", action="store_true", help="rebuild from the whole status history")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    trips = refresh(args.db, args.full)
+    print(f"Folded {trips} new trips into the ETA table in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,129 @@
+import json
+import os
+from datetime import datetime
+from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+
+TARIFFS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'resources', 'tariffs')
+EARTH_RADIUS_KM = 6371
+ROAD_FACTOR = 1.2  # Adding 20% for road routes
+PICKUP_TIME_FORMAT = '%d/%m/%Y %I:%M %p'  # What DateTimePickerDialog writes
+
+_tariffs = {}
+
+
+class Tariff:
+    def __init__(self, name, base_fare, per_km_rate, minimum_fare=0.0, peak_multiplier=1.0,
+                 peak_hours=(), peak_days=range(7), currency='TTD'):
+        self.name = name
+        self.base_fare = float(base_fare)
+        self.per_km_rate = float(per_km_rate)
+        self.minimum_fare = float(minimum_fare)
+        self.currency = currency
+
+        # Multiplier for each hour of the week (Monday 00:00 = 0), so lookups are one index
+        self.hour_multipliers = np.ones(168)
+        for day in peak_days:
+            for hour in peak_hours:
+                self.hour_multipliers[day * 24 + hour] = peak_multiplier
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def multiplier_at(self, pickup_time):
+        return float(self.hour_multipliers[pickup_time.weekday() * 24 + pickup_time.hour])
+
+
+def load_tariff(name='standard'):
+    # A bundled tariff name, or a path to a candidate tariff file
+    tariff = _tariffs.get(name)
+    if tariff is None:
+        path = name if name.endswith('.json') else os.path.join(TARIFFS_DIR, f'{name}.json')
+        with open(path) as f:
+            tariff = _tariffs[name] = Tariff.from_dict(json.load(f))
+    return tariff
+
+
+def parse_pickup_time(text):
+    try:
+        return datetime.strptime(text, PICKUP_TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_pickup_times(values):
+    # Vectorised parse_pickup_time: 'dd/MM/yyyy hh:mm AP' is fixed width, so read the digits
+    # straight out of the bytes. Malformed or missing values become NaT.
+    raw = np.array([v.encode() if isinstance(v, str) else b'' for v in values], dtype='S20')
+    b = raw.view(np.uint8).reshape(-1, 20).astype(np.int64)
+    digits = b - ord('0')
+
+    def number(*positions):
+        result = np.zeros(len(b), dtype=np.int64)
+        for position in positions:
+            result = result * 10 + digits[:, position]
+        return result
+
+    day, month, year = number(0, 1), number(3, 4), number(6, 7, 8, 9)
+    hour, minute = number(11, 12), number(14, 15)
+    pm = b[:, 17] == ord('P')
+
+    digit_columns = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15]
+    valid = ((digits[:, digit_columns] >= 0) & (digits[:, digit_columns] <= 9)).all(axis=1)
+    valid &= (b[:, 2] == ord('/')) & (b[:, 5] == ord('/')) & (b[:, 13] == ord(':'))
+    valid &= ((b[:, 17] == ord('A')) | pm) & (b[:, 18] == ord('M')) & (b[:, 19] == 0)
+    valid &= (day >= 1) & (day <= 31) & (month >= 1) & (month <= 12)
+    valid &= (hour >= 1) & (hour <= 12) & (minute <= 59)
+
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    # 31/02 or 29/02 of a common year would otherwise roll over into March
+    month_days = (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+    valid &= day - 1 < month_days.astype(np.int64)
+    days = months.astype('datetime64[D]') + np.where(valid, day - 1, 0)
+    minutes = (hour % 12 + pm * 12) * 60 + minute
+    result = days.astype('datetime64[m]') + np.where(valid, minutes, 0)
+    result[~valid] = np.datetime64('NaT')
+    return result
+
+
+def road_distance_km(coord1, coord2):
+    lat1, lon1 = radians(coord1[0]), radians(coord1[1])
+    lat2, lon2 = radians(coord2[0]), radians(coord2[1])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS_KM * c * ROAD_FACTOR
+
+
+def road_distance_km_many(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c * ROAD_FACTOR
+
+
+def hour_of_week(pickup_times):
+    # datetime64 values -> 0..167 with Monday 00:00 = 0 (1970-01-01 was a Thursday)
+    hours = np.asarray(pickup_times, dtype='datetime64[h]').astype(np.int64)
+    return ((hours // 24 + 3) % 7) * 24 + hours % 24
+
+
+def quote(distance_km, pickup_time=None, tariff=None, surge=1.0):
+    tariff = tariff or load_tariff()
+    pickup_time = pickup_time or datetime.now()
+    fare = (tariff.base_fare + distance_km * tariff.per_km_rate) * tariff.multiplier_at(pickup_time) * surge
+    return round(max(fare, tariff.minimum_fare), 2)
+
+
+def quote_many(distances_km, pickup_times, tariff=None, surges=None):
+    tariff = tariff or load_tariff()
+    distances_km = np.asarray(distances_km, dtype=float)
+    multipliers = tariff.hour_multipliers[hour_of_week(pickup_times)]
+    if surges is not None:
+        multipliers = multipliers * np.asarray(surges, dtype=float)
+    fares = (tariff.base_fare + distances_km * tariff.per_km_rate) * multipliers
+    return np.round(np.maximum(fares, tariff.minimum_fare), 2)
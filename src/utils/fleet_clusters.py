@@ -0,0 +1,67 @@
+import math
+
+TILE_SIZE = 256
+
+
+def project(lat, lng):
+    # Web Mercator position in world pixels at zoom 0 (0..256 on both axes)
+    lat = min(max(lat, -85.0511), 85.0511)
+    x = (lng + 180.0) / 360.0 * TILE_SIZE
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * TILE_SIZE
+    return x, y
+
+
+class PointSet:
+    def __init__(self, kind, rows):
+        # rows are (id, lat, lng, label); projection is done once per load, not per zoom
+        self.kind = kind
+        self.points = []
+        for point_id, lat, lng, label in rows:
+            if lat is None or lng is None:
+                continue
+            x, y = project(lat, lng)
+            self.points.append((point_id, lat, lng, label, x, y))
+
+    def __len__(self):
+        return len(self.points)
+
+
+def cluster(point_set, zoom, bounds=None, cell_px=64):
+    # Grid clustering: points sharing a cell_px square on screen at this zoom become one marker
+    scale = (2 ** zoom) / cell_px
+    if bounds is not None:
+        south, west, north, east = bounds
+        min_x, min_y = project(north, west)
+        max_x, max_y = project(south, east)
+        # Keep a one-cell margin so markers don't pop in at the edges while panning
+        margin = cell_px / (2 ** zoom)
+        min_x, min_y, max_x, max_y = min_x - margin, min_y - margin, max_x + margin, max_y + margin
+
+    cells = {}
+    for point in point_set.points:
+        x, y = point[4], point[5]
+        if bounds is not None and not (min_x <= x <= max_x and min_y <= y <= max_y):
+            continue
+        cell = (int(x * scale), int(y * scale))
+        members = cells.get(cell)
+        if members is None:
+            cells[cell] = [point]
+        else:
+            members.append(point)
+
+    kind = point_set.kind
+    markers = {}
+    for (cx, cy), members in cells.items():
+        if len(members) == 1:
+            point_id, lat, lng, label = members[0][:4]
+            markers[f"{kind}:{point_id}"] = {
+                'lat': lat, 'lng': lng, 'kind': kind, 'count': 1, 'popup': label,
+            }
+        else:
+            lat = sum(m[1] for m in members) / len(members)
+            lng = sum(m[2] for m in members) / len(members)
+            markers[f"{kind}:cell:{zoom}:{cx}:{cy}"] = {
+                'lat': round(lat, 5), 'lng': round(lng, 5), 'kind': kind, 'count': len(members),
+            }
+    return markers
@@ -0,0 +1,55 @@
+import math
+import os
+import sqlite3
+
+# ~20 m at Trinidad's latitude; clicks inside the same cell share one lookup
+CELL_DEGREES = 0.00018
+
+
+def cell_of(lat, lng):
+    return math.floor(lat / CELL_DEGREES), math.floor(lng / CELL_DEGREES)
+
+
+class GeocodeCache:
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.db_path = db_path
+        self.memory = {}
+
+    def lookup(self, lat, lng):
+        cell = cell_of(lat, lng)
+        if cell in self.memory:
+            return self.memory[cell]
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('''
+                SELECT display_name FROM reverse_geocodes
+                WHERE cell_lat = ? AND cell_lng = ?
+            ''', cell).fetchone()
+        finally:
+            conn.close()
+
+        if row is not None:
+            self.memory[cell] = row[0]
+            return row[0]
+        return None
+
+    def store(self, lat, lng, display_name):
+        cell = cell_of(lat, lng)
+        self.memory[cell] = display_name
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO reverse_geocodes (cell_lat, cell_lng, display_name, latitude, longitude)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', cell + (display_name, lat, lng))
+        finally:
+            conn.close()
+
+
+geocode_cache = GeocodeCache()
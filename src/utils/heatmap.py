@@ -0,0 +1,151 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+from utils.fare import parse_pickup_times, hour_of_week
+
+# Trinidad and Tobago (south, west, north, east) in cells of CELL_DEGREES (about 2 km)
+BOUNDS = (10.0, -61.95, 11.40, -60.45)
+CELL_DEGREES = 0.02
+ROWS = int(round((BOUNDS[2] - BOUNDS[0]) / CELL_DEGREES))
+COLS = int(round((BOUNDS[3] - BOUNDS[1]) / CELL_DEGREES))
+HOURS = 168
+CHUNK_SIZE = 200000
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def bin_pickups(lats, lngs, pickup_texts):
+    # Pickup counts as a (HOURS, ROWS, COLS) array: one bincount over a combined
+    # hour-of-week/cell index. Pickups off the grid or without a readable time are dropped.
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    times = parse_pickup_times(pickup_texts)
+    row = np.floor((lats - BOUNDS[0]) / CELL_DEGREES)
+    col = np.floor((lngs - BOUNDS[1]) / CELL_DEGREES)
+    keep = (row >= 0) & (row < ROWS) & (col >= 0) & (col < COLS) & ~np.isnat(times)
+    index = (hour_of_week(times[keep]) * ROWS + row[keep].astype(np.int64)) * COLS + col[keep].astype(np.int64)
+    return np.bincount(index, minlength=HOURS * ROWS * COLS).reshape(HOURS, ROWS, COLS)
+
+
+def cell_center(row, col):
+    return BOUNDS[0] + (row + 0.5) * CELL_DEGREES, BOUNDS[1] + (col + 0.5) * CELL_DEGREES
+
+
+class DemandHeatmap:
+    # Pickups per hour of the week and grid cell. The counts are kept with the data version
+    # they were built at, (max booking id, booking count, sum of booking versions), in memory
+    # and in a file next to the database, so a refresh reads only bookings made since;
+    # anything else (a deletion, or an older booking edited and so moved to a new version)
+    # makes it start over. A refresh may run on another thread: the counts are swapped in
+    # whole once built, never updated in place.
+    def __init__(self, db_path=None, cache_path=None):
+        self.use_database(db_path or default_db_path(), cache_path)
+
+    def use_database(self, db_path, cache_path=None):
+        self.db_path = db_path
+        self.cache_path = cache_path or os.path.splitext(db_path)[0] + '_heatmap.npz'
+        self.counts = None
+        self.version = None
+
+    def data_version(self, cursor):
+        cursor.execute('SELECT COALESCE(MAX(id), 0), COUNT(*), COALESCE(SUM(version), 0) FROM bookings')
+        return tuple(cursor.fetchone())
+
+    def load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path) as cached:
+                if cached['counts'].shape == (HOURS, ROWS, COLS) and len(cached['version']) == 3:
+                    self.counts = cached['counts']
+                    self.version = tuple(int(v) for v in cached['version'])
+        except (OSError, ValueError, KeyError):
+            pass  # Unreadable cache; rebuilt below
+
+    def save_cache(self):
+        # np.savez adds .npz to names without it, so write to a name that has it
+        partial = self.cache_path[:-len('.npz')] + '.part.npz'
+        np.savez(partial, counts=self.counts, version=np.array(self.version))
+        os.replace(partial, self.cache_path)
+
+    def fold(self, cursor, after_id, counts):
+        cursor.execute('''
+            SELECT pickup_lat, pickup_lng, pickup_time FROM bookings
+            WHERE id > ? AND pickup_lat IS NOT NULL
+        ''', (after_id,))
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            columns = np.array(rows, dtype=object)
+            counts += bin_pickups(columns[:, 0].astype(float), columns[:, 1].astype(float), columns[:, 2])
+
+    def refresh(self):
+        # Brings the counts up to date; True if they changed
+        if self.counts is None:
+            self.load_cache()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            # One read transaction, so the version matches the rows folded
+            cursor.execute('BEGIN')
+            version = self.data_version(cursor)
+            if version == self.version:
+                return False
+            appended = False
+            if self.version is not None and version[0] >= self.version[0]:
+                # Only new bookings if the old ones are all still there, at the same versions
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(version), 0) FROM bookings WHERE id <= ?
+                ''', (self.version[0],))
+                appended = tuple(cursor.fetchone()) == self.version[1:]
+            if appended:
+                counts = self.counts.copy()
+                self.fold(cursor, self.version[0], counts)
+            else:
+                counts = np.zeros((HOURS, ROWS, COLS), dtype=np.int64)
+                self.fold(cursor, 0, counts)
+            self.counts, self.version = counts, version
+        finally:
+            conn.close()
+        self.save_cache()
+        return True
+
+    def grid(self, hours=None):
+        # (ROWS, COLS) pickups over the given hours of the week (all of them by default)
+        if hours is None:
+            return self.counts.sum(axis=0)
+        return self.counts[np.asarray(hours)].sum(axis=0)
+
+    def by_hour(self):
+        return self.counts.sum(axis=(1, 2))
+
+
+demand_heatmap = DemandHeatmap()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the demand heatmap cache and print the busiest cells")
+    parser.add_argument("--db", default=default_db_path())
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    heatmap = DemandHeatmap(args.db)
+    start = time.perf_counter()
+    heatmap.refresh()
+    print(f"{int(heatmap.counts.sum())} pickups binned in {time.perf_counter() - start:.2f}s "
+          f"(data version {heatmap.version})")
+
+    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    flat = heatmap.counts.reshape(-1)
+    for index in np.argsort(flat)[::-1][:args.top]:
+        if not flat[index]:
+            break
+        hour, row, col = np.unravel_index(index, heatmap.counts.shape)
+        lat, lng = cell_center(row, col)
+        print(f"{days[hour // 24]} {hour % 24:02d}:00  ({lat:.3f}, {lng:.3f})  {flat[index]} pickups")
@@ -0,0 +1,123 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
+from PyQt6.QtWebChannel import QWebChannel
+
+
+class MapBridge(QObject):
+    # Batched diff: {'markers': {key: marker or None}, 'polylines': {key: points or None}, ...}
+    mapUpdate = pyqtSignal('QVariantMap')
+    ready = pyqtSignal()
+    clicked = pyqtSignal(float, float)
+
+    FRAME_MS = 16
+    LAYERS = ('markers', 'polylines', 'rectangles')
+
+    def __init__(self, page, parent=None):
+        super().__init__(parent)
+        self.page_ready = False
+
+        # What the page currently shows, and what changed since the last frame
+        self.sent = {layer: {} for layer in self.LAYERS}
+        self.pending = {layer: {} for layer in self.LAYERS}
+        self.pending_options = {}
+
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(self.FRAME_MS)
+        self.frame_timer.timeout.connect(self.flush)
+
+        self.channel = QWebChannel(self)
+        self.channel.registerObject("bridge", self)
+        page.setWebChannel(self.channel)
+
+    @pyqtSlot()
+    def pageReady(self):
+        # Page (re)loaded: whatever it showed before is gone, so resend everything
+        self.page_ready = True
+        for layer in self.LAYERS:
+            for key, value in self.sent[layer].items():
+                self.pending[layer].setdefault(key, value)
+            self.sent[layer] = {}
+        self.schedule()
+        self.ready.emit()
+
+    @pyqtSlot(float, float)
+    def mapClicked(self, lat, lng):
+        self.clicked.emit(lat, lng)
+
+    def set_marker(self, key, lat, lng, **properties):
+        self.stage('markers', key, dict(properties, lat=lat, lng=lng))
+
+    def remove_marker(self, key):
+        self.stage('markers', key, None)
+
+    def sync_markers(self, markers):
+        self.sync('markers', markers)
+
+    def set_polyline(self, key, points, **properties):
+        self.stage('polylines', key, dict(properties, points=[[lat, lng] for lat, lng in points]))
+
+    def remove_polyline(self, key):
+        self.stage('polylines', key, None)
+
+    def set_rectangle(self, key, south, west, north, east, **properties):
+        self.stage('rectangles', key, dict(properties, bounds=[[south, west], [north, east]]))
+
+    def remove_rectangle(self, key):
+        self.stage('rectangles', key, None)
+
+    def sync_rectangles(self, rectangles):
+        # {key: {'bounds': [[south, west], [north, east]], ...}}, as set_rectangle stages them
+        self.sync('rectangles', rectangles)
+
+    def fit_to(self, *keys):
+        self.pending_options['fit'] = list(keys)
+        self.schedule()
+
+    def clear(self):
+        for layer in self.LAYERS:
+            for key in list(self.sent[layer]) + list(self.pending[layer]):
+                self.pending[layer][key] = None
+        self.pending_options['reset'] = True
+        self.schedule()
+
+    def sync(self, layer, items):
+        # Make the page show exactly these items in the layer; unchanged ones are not resent
+        for key in list(self.sent[layer]) + list(self.pending[layer]):
+            if key not in items:
+                self.pending[layer][key] = None
+        self.pending[layer].update(items)
+        self.schedule()
+
+    def stage(self, layer, key, value):
+        self.pending[layer][key] = value
+        self.schedule()
+
+    def schedule(self):
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def flush(self):
+        if not self.page_ready:
+            return
+
+        update = {}
+        for layer in self.LAYERS:
+            changes = {}
+            for key, value in self.pending[layer].items():
+                if value is None:
+                    if key in self.sent[layer]:
+                        del self.sent[layer][key]
+                        changes[key] = None
+                elif self.sent[layer].get(key) != value:
+                    self.sent[layer][key] = value
+                    changes[key] = value
+            self.pending[layer] = {}
+            if changes:
+                update[layer] = changes
+
+        if self.pending_options:
+            update.update(self.pending_options)
+            self.pending_options = {}
+
+        if update:
+            self.mapUpdate.emit(update)
@@ -0,0 +1,142 @@
+import os
+from PyQt6.QtCore import QBuffer, QFile, QIODevice, QUrl
+from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+from PyQt6.QtWebEngineCore import (QWebEngineUrlScheme, QWebEngineUrlSchemeHandler,
+                                   QWebEngineUrlRequestJob, QWebEngineProfile)
+from utils.tile_cache import TileStore
+
+MAP_SCHEME = b"taximap"
+TILE_URL_TEMPLATE = "taximap://tiles/{z}/{x}/{y}.png"
+BOOKING_MAP_URL = "taximap://assets/map/booking_map.html"
+
+RESOURCES_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'resources'))
+CONTENT_TYPES = {
+    '.html': b"text/html",
+    '.js': b"application/javascript",
+    '.css': b"text/css",
+    '.png': b"image/png",
+    '.svg': b"image/svg+xml",
+}
+
+_handler = None
+
+
+def register_map_scheme():
+    # Must run before the QApplication is created
+    scheme = QWebEngineUrlScheme(MAP_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme |
+                    QWebEngineUrlScheme.Flag.CorsEnabled |
+                    QWebEngineUrlScheme.Flag.ContentSecurityPolicyIgnored)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+def install_map_scheme_handler(profile=None):
+    global _handler
+    if _handler is None:
+        _handler = MapSchemeHandler()
+    profile = profile or QWebEngineProfile.defaultProfile()
+    if profile.urlSchemeHandler(MAP_SCHEME) is None:
+        profile.installUrlSchemeHandler(MAP_SCHEME, _handler)
+    return _handler
+
+
+class MapSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tile_store = TileStore()
+        self.network_manager = QNetworkAccessManager(self)
+        self.network_manager.finished.connect(self.handle_upstream_response)
+
+        # Requests waiting on an upstream fetch, keyed by tile
+        self.waiting_jobs = {}
+        # Bundled Leaflet and map pages, read from disk once
+        self.assets = {}
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        if url.host() == "tiles":
+            self.serve_tile(job, url.path())
+        elif url.host() == "assets":
+            self.serve_asset(job, url.path())
+        else:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+
+    def serve_asset(self, job, path):
+        asset = self.assets.get(path)
+        if asset is None and path == "/qtwebchannel/qwebchannel.js":
+            # Shipped inside Qt's own resources
+            qt_file = QFile(":/qtwebchannel/qwebchannel.js")
+            if qt_file.open(QIODevice.OpenModeFlag.ReadOnly):
+                asset = self.assets[path] = (CONTENT_TYPES['.js'], bytes(qt_file.readAll()))
+                qt_file.close()
+        if asset is None:
+            file_path = os.path.normpath(os.path.join(RESOURCES_DIR, path.lstrip('/')))
+            content_type = CONTENT_TYPES.get(os.path.splitext(file_path)[1])
+            if not file_path.startswith(RESOURCES_DIR + os.sep) or content_type is None:
+                job.fail(QWebEngineUrlRequestJob.Error.RequestDenied)
+                return
+            try:
+                with open(file_path, 'rb') as f:
+                    asset = self.assets[path] = (content_type, f.read())
+            except OSError:
+                job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+                return
+        self.reply(job, *asset)
+
+    def serve_tile(self, job, path):
+        try:
+            z, x, y = path.strip('/').removesuffix('.png').split('/')
+            key = (int(z), int(x), int(y))
+        except ValueError:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlInvalid)
+            return
+
+        data = self.tile_store.get(*key)
+        if data is not None:
+            self.reply(job, b"image/png", data)
+            return
+
+        upstream_url = self.tile_store.upstream_url(*key)
+        if not upstream_url.startswith(('http://', 'https://')):
+            data = self.tile_store.get_or_fetch(*key)
+            if data is None:
+                job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            else:
+                self.reply(job, b"image/png", data)
+            return
+
+        # Several map views can ask for the same tile; only fetch it once
+        jobs = self.waiting_jobs.setdefault(key, [])
+        jobs.append(job)
+        job.destroyed.connect(lambda _=None, k=key, j=job: self.forget_job(k, j))
+        if len(jobs) == 1:
+            request = QNetworkRequest(QUrl(upstream_url))
+            request.setHeader(QNetworkRequest.KnownHeaders.UserAgentHeader, "TaxiBookingApp/1.0")
+            request.setAttribute(QNetworkRequest.Attribute.User, key)
+            self.network_manager.get(request)
+
+    def forget_job(self, key, job):
+        jobs = self.waiting_jobs.get(key)
+        if jobs and job in jobs:
+            jobs.remove(job)
+
+    def handle_upstream_response(self, reply):
+        key = reply.request().attribute(QNetworkRequest.Attribute.User)
+        jobs = self.waiting_jobs.pop(key, [])
+
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            data = bytes(reply.readAll())
+            self.tile_store.put(*key, data)
+            for job in jobs:
+                self.reply(job, b"image/png", data)
+        else:
+            for job in jobs:
+                job.fail(QWebEngineUrlRequestJob.Error.RequestFailed)
+        reply.deleteLater()
+
+    def reply(self, job, content_type, data):
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        job.reply(content_type, buffer)
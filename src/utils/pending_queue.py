@@ -0,0 +1,171 @@
+import argparse
+import heapq
+import itertools
+import os
+import sqlite3
+from collections import namedtuple
+from utils.fare import parse_pickup_time
+from utils.change_feed import BookingChangeFeed
+
+# Every second spent waiting moves a booking up as if its pickup were this much sooner
+AGING_RATE = 0.5
+# Head start by customer tier, in seconds of pickup urgency
+TIER_BONUS_SECONDS = {'standard': 0, 'priority': 10 * 60, 'vip': 20 * 60}
+
+PENDING_COLUMNS = '''
+    b.id, b.booking_status, b.driver_id, b.pickup_time,
+    CAST(strftime('%s', b.created_at) AS REAL), u.tier
+'''
+PENDING_SOURCE = 'bookings b LEFT JOIN users u ON b.user_id = u.id'
+
+PendingBooking = namedtuple('PendingBooking', 'booking_id due created_at tier urgency')
+
+
+def urgency_of(due, created_at, tier):
+    # Lower is more urgent. Effective urgency at time t is
+    #   (due - t) - AGING_RATE * (t - created_at) - bonus
+    # and the terms in t are the same for every booking, so dropping them leaves a key
+    # that never changes: the heap stays valid as time passes without re-keying.
+    return due + AGING_RATE * created_at - TIER_BONUS_SECONDS.get(tier or 'standard', 0)
+
+
+def pending_booking(booking_id, pickup_text, created_at, tier):
+    # Bookings without a readable pickup time want a driver as soon as possible
+    pickup_time = parse_pickup_time(pickup_text)
+    created_at = created_at or 0.0
+    due = pickup_time.timestamp() if pickup_time else created_at
+    return PendingBooking(booking_id, due, created_at, tier, urgency_of(due, created_at, tier))
+
+
+def set_tier(conn, username, tier):
+    # Returns whether the customer exists. Bookings already queued keep the tier they were
+    # keyed with until the queue is next loaded; the change feed only follows bookings.
+    if tier not in TIER_BONUS_SECONDS:
+        raise ValueError(f"Unknown tier {tier!r}; expected one of {', '.join(TIER_BONUS_SECONDS)}")
+    with conn:
+        return conn.execute('UPDATE users SET tier = ? WHERE username = ?', (tier, username)).rowcount > 0
+
+
+class PendingQueue:
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.db_path = db_path
+        self.heap = []
+        self.entries = {}  # booking_id -> live heap entry; stale ones are skipped on pop
+        self.counter = itertools.count()
+        self.feed = BookingChangeFeed()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, booking_id):
+        return booking_id in self.entries
+
+    def push(self, booking):
+        self.remove(booking.booking_id)
+        entry = [booking.urgency, next(self.counter), booking]
+        self.entries[booking.booking_id] = entry
+        heapq.heappush(self.heap, entry)
+
+    def remove(self, booking_id):
+        entry = self.entries.pop(booking_id, None)
+        if entry is not None:
+            entry[2] = None
+        # Too many dead entries make pops slow; rebuild once they outnumber the live ones
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.entries):
+            self.heap = [entry for entry in self.heap if entry[2] is not None]
+            heapq.heapify(self.heap)
+
+    def pop(self):
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[2] is not None:
+                del self.entries[entry[2].booking_id]
+                return entry[2]
+        return None
+
+    def pop_many(self, count):
+        bookings = []
+        while len(bookings) < count:
+            booking = self.pop()
+            if booking is None:
+                break
+            bookings.append(booking)
+        return bookings
+
+    def peek(self, count=None):
+        # Most urgent first, without removing anything
+        live = (entry for entry in self.heap if entry[2] is not None)
+        if count is None:
+            return [entry[2] for entry in sorted(live)]
+        return [entry[2] for entry in heapq.nsmallest(count, live)]
+
+    def apply_row(self, row):
+        booking_id, status, driver_id, pickup_text, created_at, tier = row
+        if status != 'pending' or driver_id is not None:
+            self.remove(booking_id)
+            return
+        self.push(pending_booking(booking_id, pickup_text, created_at, tier))
+
+    def load(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            self.feed.start(cursor)
+            cursor.execute(f'''
+                SELECT {PENDING_COLUMNS}
+                FROM {PENDING_SOURCE}
+                WHERE b.booking_status = 'pending' AND b.driver_id IS NULL
+            ''')
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        # Heapify the snapshot in one O(n) pass rather than n pushes
+        self.heap = []
+        self.entries = {}
+        for booking_id, _, _, pickup_text, created_at, tier in rows:
+            booking = pending_booking(booking_id, pickup_text, created_at, tier)
+            entry = [booking.urgency, next(self.counter), booking]
+            self.entries[booking_id] = entry
+            self.heap.append(entry)
+        heapq.heapify(self.heap)
+
+    def sync(self):
+        # Catch up from the change feed; each changed booking is one O(log n) push or removal
+        if not self.feed.started:
+            self.load()
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            booking_ids, rows = self.feed.changes(conn.cursor(), PENDING_COLUMNS, PENDING_SOURCE, 'b.id')
+        finally:
+            conn.close()
+        found = {row[0] for row in rows}
+        for row in rows:
+            self.apply_row(row)
+        for booking_id in booking_ids:
+            if booking_id not in found:
+                self.remove(booking_id)
+
+
+pending_queue = PendingQueue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set a customer's tier, which moves their bookings up the pending queue")
+    parser.add_argument("username")
+    parser.add_argument("tier", choices=list(TIER_BONUS_SECONDS))
+    parser.add_argument("--db", default=pending_queue.db_path)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        found = set_tier(conn, args.username, args.tier)
+    finally:
+        conn.close()
+    if not found:
+        parser.error(f"No customer named {args.username}")
+    print(f"{args.username} is now {args.tier}")
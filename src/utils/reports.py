@@ -0,0 +1,170 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from utils.fare import parse_pickup_times
+
+BATCH_SIZE = 5000
+
+Report = namedtuple('Report', 'title columns query count_query transform')
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def fare_value(value):
+    # Fares are stored as text; ones that don't parse are kept as written rather than lost
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return value
+
+
+def booking_rows(rows):
+    # Pickup times as ISO 8601 and fares as numbers, so the file sorts and sums cleanly.
+    # Transforms work a batch at a time so the pickup times parse in one vectorised pass.
+    pickups = np.datetime_as_string(parse_pickup_times([row[6] for row in rows]), unit='m')
+    return [row[:6] + (pickup if pickup != 'NaT' else row[6], fare_value(row[7])) + row[8:]
+            for row, pickup in zip(rows, pickups)]
+
+
+def history_rows(rows):
+    return [row[:5] + (datetime.fromtimestamp(row[5]).isoformat(timespec='seconds') if row[5] else None,)
+            for row in rows]
+
+
+BOOKING_COLUMNS = ['id', 'customer', 'driver', 'pickup_location', 'dropoff_location', 'status',
+                   'pickup_time', 'fare', 'distance_km', 'pickup_zone', 'dropoff_zone', 'created_at']
+BOOKINGS_QUERY = '''
+    SELECT b.id, u.username, d.username, b.pickup_location, b.dropoff_location, b.booking_status,
+           b.pickup_time, b.fare, b.distance_km, b.pickup_zone, b.dropoff_zone, b.created_at
+    FROM bookings b
+    LEFT JOIN users u ON u.id = b.user_id
+    LEFT JOIN drivers d ON d.id = b.driver_id
+    {where}
+    ORDER BY b.id
+'''
+
+REPORTS = {
+    'bookings': Report(
+        "All Bookings",
+        BOOKING_COLUMNS,
+        BOOKINGS_QUERY.format(where=''),
+        'SELECT COUNT(*) FROM bookings',
+        booking_rows),
+    'completed_trips': Report(
+        "Completed Trips",
+        BOOKING_COLUMNS,
+        BOOKINGS_QUERY.format(where="WHERE b.booking_status = 'completed'"),
+        "SELECT COUNT(*) FROM bookings WHERE booking_status = 'completed'",
+        booking_rows),
+    'status_history': Report(
+        "Booking Status Changes",
+        ['id', 'booking_id', 'old_status', 'new_status', 'driver', 'changed_at'],
+        '''
+            SELECT h.id, h.booking_id, h.old_status, h.new_status, d.username, h.changed_at
+            FROM booking_status_history h
+            LEFT JOIN drivers d ON d.id = h.driver_id
+            ORDER BY h.id
+        ''',
+        'SELECT COUNT(*) FROM booking_status_history',
+        history_rows),
+}
+
+FORMATS = ('csv', 'ndjson')
+
+
+# The pipeline: each stage takes and yields batches of rows, so only one batch is ever
+# held in memory whatever the size of the table
+
+def batches(cursor, query, params=(), batch_size=BATCH_SIZE):
+    cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def transformed(row_batches, transform):
+    for rows in row_batches:
+        yield transform(rows)
+
+
+def write_csv(out, columns, row_batches):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for rows in row_batches:
+        writer.writerows(rows)
+        yield len(rows)
+
+
+def write_ndjson(out, columns, row_batches):
+    for rows in row_batches:
+        out.write(''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows))
+        yield len(rows)
+
+
+WRITERS = {'csv': write_csv, 'ndjson': write_ndjson}
+
+
+def export(report_name, path, fmt='csv', compress=False, db_path=None, progress=None, cancelled=None):
+    # Streams a report to `path` (gzip-compressed if asked). progress(done, total) is called
+    # after every batch; if cancelled() turns true the partial file is removed and None is
+    # returned, otherwise the number of rows written.
+    report = REPORTS[report_name]
+    conn = sqlite3.connect(db_path or default_db_path())
+    # Readers and writers don't block each other in WAL mode, so bookings carry on
+    # while a long export reads from its snapshot
+    conn.execute('PRAGMA journal_mode=WAL')
+    partial = path + '.part'
+    written = 0
+    stopped = False
+    try:
+        cursor = conn.cursor()
+        cursor.execute(report.count_query)
+        total = cursor.fetchone()[0]
+
+        opener = gzip.open if compress else open
+        with opener(partial, 'wt', newline='', encoding='utf-8') as out:
+            rows = transformed(batches(cursor, report.query), report.transform)
+            for count in WRITERS[fmt](out, report.columns, rows):
+                written += count
+                if progress is not None:
+                    progress(written, max(total, written))
+                if cancelled is not None and cancelled():
+                    stopped = True
+                    break
+        if stopped:
+            os.remove(partial)
+            return None
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        conn.close()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a report as CSV or NDJSON, streaming in batches")
+    parser.add_argument("report", choices=sorted(REPORTS))
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=FORMATS, default='csv')
+    parser.add_argument("--gzip", action="store_true", help="compress the output")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = export(args.report, args.output, args.format, args.gzip, args.db)
+    print(f"Wrote {rows} rows to {args.output} in {time.perf_counter() - start:.1f}s")
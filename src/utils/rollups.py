@@ -0,0 +1,148 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+FINISHED_EVENTS = "('completed', 'incomplete', 'cancelled')"
+
+# Every rollup-worthy event as (at, zone, driver_id, booked, completed, cancelled, revenue),
+# with the same rules as the trg_rollup_* triggers. Bookings older than the status history
+# are counted when they were made, with their final status at the same moment.
+EVENTS = f'''
+    SELECT h.changed_at AS at, COALESCE(b.pickup_zone, '') AS zone, COALESCE(h.driver_id, 0) AS driver_id,
+           h.old_status IS NULL AS booked,
+           h.new_status = 'completed' AS completed,
+           h.new_status IN ('incomplete', 'cancelled') AS cancelled,
+           CASE WHEN h.new_status = 'completed' THEN COALESCE(CAST(b.fare AS REAL), 0) ELSE 0 END AS revenue
+    FROM booking_status_history h
+    JOIN bookings b ON b.id = h.booking_id
+    WHERE h.old_status IS NULL OR h.new_status IN {FINISHED_EVENTS}
+    UNION ALL
+    SELECT CAST(strftime('%s', b.created_at) AS REAL), COALESCE(b.pickup_zone, ''), 0, 1, 0, 0, 0
+    FROM bookings b
+    WHERE b.created_at IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM booking_status_history h WHERE h.booking_id = b.id)
+    UNION ALL
+    SELECT CAST(strftime('%s', b.created_at) AS REAL), COALESCE(b.pickup_zone, ''), COALESCE(b.driver_id, 0), 0,
+           b.booking_status = 'completed',
+           b.booking_status IN ('incomplete', 'cancelled'),
+           CASE WHEN b.booking_status = 'completed' THEN COALESCE(CAST(b.fare AS REAL), 0) ELSE 0 END
+    FROM bookings b
+    WHERE b.created_at IS NOT NULL AND b.booking_status IN {FINISHED_EVENTS}
+    AND NOT EXISTS (SELECT 1 FROM booking_status_history h WHERE h.booking_id = b.id)
+'''
+
+TOTALS = 'SUM(bookings), SUM(completions), SUM(cancellations), SUM(revenue)'
+
+
+def default_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        'database', 'taxi_booking.db')
+
+
+def rebuild(db_path=None):
+    # Recomputes both rollups from scratch, for databases that had bookings before the
+    # rollup triggers existed or after editing history by hand
+    conn = sqlite3.connect(db_path or default_db_path())
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM rollup_hourly')
+            cursor.execute('DELETE FROM rollup_daily')
+            for table, bucket in (('rollup_hourly', 'CAST(at / 3600 AS INTEGER) * 3600'),
+                                  ('rollup_daily', "date(at, 'unixepoch', 'localtime')")):
+                cursor.execute(f'''
+                    INSERT INTO {table}
+                    SELECT {bucket}, zone, driver_id, SUM(booked), SUM(completed), SUM(cancelled), SUM(revenue)
+                    FROM ({EVENTS})
+                    GROUP BY 1, 2, 3
+                ''')
+            cursor.execute('SELECT COUNT(*) FROM rollup_hourly')
+            hourly = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM rollup_daily')
+            daily = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    return hourly, daily
+
+
+def day_key(moment):
+    return moment.strftime('%Y-%m-%d')
+
+
+def period_days(period, today=None):
+    # (first day, last day) inclusive, as rollup_daily keys
+    today = today or datetime.now()
+    days = {'Today': 1, 'Last 7 Days': 7, 'Last 30 Days': 30, 'Last 12 Months': 365}[period]
+    return day_key(today - timedelta(days=days - 1)), day_key(today)
+
+
+def summary(cursor, first_day, last_day):
+    cursor.execute(f'SELECT {TOTALS} FROM rollup_daily WHERE day BETWEEN ? AND ?', (first_day, last_day))
+    return tuple(value or 0 for value in cursor.fetchone())
+
+
+def by_zone(cursor, first_day, last_day):
+    cursor.execute(f'''
+        SELECT zone, {TOTALS} FROM rollup_daily
+        WHERE day BETWEEN ? AND ?
+        GROUP BY zone ORDER BY SUM(bookings) DESC
+    ''', (first_day, last_day))
+    return cursor.fetchall()
+
+
+def by_driver(cursor, first_day, last_day):
+    # (username, completions, cancellations, revenue). A booking is counted when it's made,
+    # before any driver has it, so all bookings sit under driver 0 and drivers get no count.
+    cursor.execute('''
+        SELECT d.username, SUM(r.completions), SUM(r.cancellations), SUM(r.revenue)
+        FROM rollup_daily r
+        JOIN drivers d ON d.id = r.driver_id
+        WHERE r.day BETWEEN ? AND ?
+        GROUP BY r.driver_id ORDER BY SUM(r.revenue) DESC
+    ''', (first_day, last_day))
+    return cursor.fetchall()
+
+
+def trend(cursor, first_day, last_day):
+    # (unit, [(label, bookings, completions, revenue)]): by hour for a single day, by day
+    # up to two months, by month beyond that
+    if first_day == last_day:
+        start = time.mktime(datetime.strptime(first_day, '%Y-%m-%d').timetuple())
+        cursor.execute('''
+            SELECT hour_start, SUM(bookings), SUM(completions), SUM(revenue) FROM rollup_hourly
+            WHERE hour_start >= ? AND hour_start < ?
+            GROUP BY hour_start
+        ''', (start, start + 24 * 3600))
+        found = {datetime.fromtimestamp(row[0]).hour: row[1:] for row in cursor.fetchall()}
+        return 'hour', [(f"{hour:02d}",) + found.get(hour, (0, 0, 0.0)) for hour in range(24)]
+
+    cursor.execute('''
+        SELECT day, SUM(bookings), SUM(completions), SUM(revenue) FROM rollup_daily
+        WHERE day BETWEEN ? AND ?
+        GROUP BY day
+    ''', (first_day, last_day))
+    found = {row[0]: row[1:] for row in cursor.fetchall()}
+    first = datetime.strptime(first_day, '%Y-%m-%d')
+    count = (datetime.strptime(last_day, '%Y-%m-%d') - first).days + 1
+    if count > 60:
+        months = {}
+        for day, values in found.items():
+            entry = months.setdefault(day[:7], [0, 0, 0.0])
+            for i, value in enumerate(values):
+                entry[i] += value
+        labels = sorted({day_key(first + timedelta(days=n))[:7] for n in range(count)})
+        return 'month', [(label,) + tuple(months.get(label, (0, 0, 0.0))) for label in labels]
+    days = [day_key(first + timedelta(days=n)) for n in range(count)]
+    return 'day', [(day[5:],) + found.get(day, (0, 0, 0.0)) for day in days]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the hourly and daily analytics rollups from booking history")
+    parser.add_argument("--db", default=default_db_path())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    hourly, daily = rebuild(args.db)
+    print(f"Rebuilt {hourly} hourly and {daily} daily rollup rows in {time.perf_counter() - start:.2f}s")
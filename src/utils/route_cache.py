@@ -0,0 +1,199 @@
+import math
+import os
+import sqlite3
+from collections import OrderedDict
+
+# Routes are cached between ~100 m grid cells, so nearby pickups share a geometry
+CELL_DEGREES = 0.001
+# Zoom levels each route is stored at; requests use the closest level at or above
+STORED_ZOOMS = (8, 11, 14, 17)
+
+
+def cell_of(lat, lng):
+    return f"{math.floor(lat / CELL_DEGREES)}:{math.floor(lng / CELL_DEGREES)}"
+
+
+def tolerance_for_zoom(zoom):
+    # About one screen pixel at this zoom, in degrees
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def zoom_for_bounds(points, width_px=800):
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    span = max(max(lats) - min(lats), max(lngs) - min(lngs), 1e-6)
+    return max(0, min(STORED_ZOOMS[-1], int(math.log2(360.0 * width_px / (256 * span)))))
+
+
+def simplify(points, tolerance):
+    # Douglas-Peucker, iterative so long GPS traces can't hit the recursion limit
+    if len(points) < 3:
+        return list(points)
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    tolerance_sq = tolerance * tolerance
+
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first]
+        bx, by = points[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+
+        max_dist_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length_sq == 0:
+                dist_sq = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+                dist_sq = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+
+        if max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [p for p, k in zip(points, keep) if k]
+
+
+def encode_polyline(points, precision=5):
+    # Google encoded polyline format: zig-zag delta varints in printable ASCII
+    factor = 10 ** precision
+    result = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else (delta << 1)
+            while value >= 0x20:
+                result.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            result.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+    return ''.join(result)
+
+
+def decode_polyline(encoded, precision=5):
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+class RouteStore:
+    def __init__(self, db_path=None, memory_size=256):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.db_path = db_path
+        self.memory_size = memory_size
+        # Decoded geometries for recently drawn routes
+        self.memory = OrderedDict()
+
+    def put(self, origin, destination, points):
+        key = (cell_of(*origin), cell_of(*destination))
+        rows = []
+        for zoom in STORED_ZOOMS:
+            simplified = simplify(points, tolerance_for_zoom(zoom))
+            rows.append(key + (zoom, encode_polyline(simplified)))
+            self.remember(key + (zoom,), simplified)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO route_geometries (origin_cell, destination_cell, zoom, polyline)
+                    VALUES (?, ?, ?, ?)
+                ''', rows)
+        finally:
+            conn.close()
+
+    def record_trip(self, booking_id):
+        # A completed trip's GPS trace, from Start Trip to completion, becomes the stored
+        # route between its pickup and dropoff. False if there was no trace to store.
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('''
+                SELECT b.driver_id, b.pickup_lat, b.pickup_lng, b.dropoff_lat, b.dropoff_lng,
+                       (SELECT MAX(h.changed_at) FROM booking_status_history h
+                        WHERE h.booking_id = b.id AND h.new_status = 'on_the_way'),
+                       (SELECT MAX(h.changed_at) FROM booking_status_history h
+                        WHERE h.booking_id = b.id AND h.new_status = 'completed')
+                FROM bookings b
+                WHERE b.id = ? AND b.booking_status = 'completed'
+            ''', (booking_id,)).fetchone()
+            if row is None or None in row:
+                return False
+            driver_id, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, started_at, completed_at = row
+            trace = conn.execute('''
+                SELECT latitude, longitude FROM driver_positions
+                WHERE driver_id = ? AND recorded_at BETWEEN ? AND ?
+                ORDER BY recorded_at
+            ''', (driver_id, started_at, completed_at)).fetchall()
+        finally:
+            conn.close()
+        if len(trace) < 2:
+            return False
+
+        origin, destination = (pickup_lat, pickup_lng), (dropoff_lat, dropoff_lng)
+        self.put(origin, destination, [origin] + trace + [destination])
+        return True
+
+    def get(self, origin, destination, zoom=None):
+        key = (cell_of(*origin), cell_of(*destination))
+        if zoom is None:
+            zoom = STORED_ZOOMS[-1]
+        stored_zoom = next((z for z in STORED_ZOOMS if z >= zoom), STORED_ZOOMS[-1])
+
+        points = self.memory.get(key + (stored_zoom,))
+        if points is not None:
+            self.memory.move_to_end(key + (stored_zoom,))
+            return points
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('''
+                SELECT polyline FROM route_geometries
+                WHERE origin_cell = ? AND destination_cell = ? AND zoom = ?
+            ''', key + (stored_zoom,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        points = decode_polyline(row[0])
+        self.remember(key + (stored_zoom,), points)
+        return points
+
+    def remember(self, key, points):
+        self.memory[key] = points
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+
+route_store = RouteStore()
@@ -0,0 +1,320 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+from utils.fare import parse_pickup_time
+from utils.change_feed import BookingChangeFeed
+from utils import dispatch
+from utils.pending_queue import PendingQueue
+from utils.availability import DriverAvailability
+
+RELEASE_BEFORE_SECONDS = 30 * 60  # Advance bookings go to dispatch this long before pickup
+REMINDER_BEFORE_SECONDS = 60 * 60
+NO_SHOW_AFTER_SECONDS = 20 * 60  # Trip still not started this long after pickup time
+POLL_SECONDS = 5.0
+RETRY_SECONDS = 30.0  # A job whose claim or handler failed is tried again this much later
+FINISHED_STATUSES = ('completed', 'incomplete', 'cancelled')
+
+
+class TimingWheel:
+    # Hierarchical timing wheel: `levels` wheels of 2**slot_bits slots, each level's slot
+    # spanning a whole turn of the level below. Insert and cancel touch one slot dict, so
+    # they are O(1) whatever the number of jobs; a slot of a higher level is re-spread
+    # over the lower levels only when the clock reaches it.
+    def __init__(self, tick_seconds=1.0, slot_bits=6, levels=5, now=None):
+        self.tick_seconds = tick_seconds
+        self.slot_bits = slot_bits
+        self.mask = (1 << slot_bits) - 1
+        self.levels = [[{} for _ in range(1 << slot_bits)] for _ in range(levels)]
+        self.overflow = {}  # Beyond the top level's reach; re-placed as it turns
+        self.expired = {}  # Inserted already due; fired on the next advance
+        self.where = {}
+        self.current = int((now if now is not None else time.time()) // tick_seconds)
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, job_id):
+        return job_id in self.where
+
+    def insert(self, job_id, due_at, payload=None):
+        self.cancel(job_id)
+        due_tick = -int(-due_at // self.tick_seconds)  # Round up: never fire early
+        self.place(job_id, due_tick, payload)
+
+    def place(self, job_id, due_tick, payload):
+        delta = due_tick - self.current
+        if delta <= 0:
+            bucket = self.expired
+        else:
+            bucket = self.overflow
+            for level in range(len(self.levels)):
+                if delta < 1 << (self.slot_bits * (level + 1)):
+                    bucket = self.levels[level][(due_tick >> (self.slot_bits * level)) & self.mask]
+                    break
+        bucket[job_id] = (due_tick, payload)
+        self.where[job_id] = bucket
+
+    def cancel(self, job_id):
+        bucket = self.where.pop(job_id, None)
+        if bucket is not None:
+            del bucket[job_id]
+            return True
+        return False
+
+    def advance(self, now=None):
+        # Moves the clock up to `now` and returns [(job_id, payload)] that fell due, in order
+        target = int((now if now is not None else time.time()) // self.tick_seconds)
+        fired = self.take(self.expired)
+        while self.current < target:
+            if not self.where:
+                self.current = target  # Nothing to walk past
+                break
+            self.current += 1
+            # Re-spread the higher-level slots the clock has just entered, top level first
+            # so their jobs can land in the lower slots being re-spread after them
+            for level in range(len(self.levels) - 1, 0, -1):
+                if self.current & ((1 << (self.slot_bits * level)) - 1) == 0:
+                    if level == len(self.levels) - 1:
+                        self.respread(self.overflow)
+                    self.respread(self.levels[level][(self.current >> (self.slot_bits * level)) & self.mask])
+            fired.extend(self.take(self.levels[0][self.current & self.mask]))
+            fired.extend(self.take(self.expired))
+        return fired
+
+    def respread(self, bucket):
+        jobs = list(bucket.items())
+        bucket.clear()
+        for job_id, (due_tick, payload) in jobs:
+            self.place(job_id, due_tick, payload)
+
+    def take(self, bucket):
+        if not bucket:
+            return []
+        jobs = sorted(bucket.items(), key=lambda item: item[1][0])
+        bucket.clear()
+        for job_id, _ in jobs:
+            del self.where[job_id]
+        return [(job_id, payload) for job_id, (_, payload) in jobs]
+
+
+def schedule_booking(cursor, booking_id, pickup_time_text, now=None):
+    # Release, reminder and no-show jobs for a new booking; call inside its transaction.
+    # Bookings for right away are dispatched straight off the queue and need no release.
+    pickup_time = parse_pickup_time(pickup_time_text)
+    if pickup_time is None:
+        return
+    now = now if now is not None else time.time()
+    pickup = pickup_time.timestamp()
+    jobs = [
+        ('release', pickup - RELEASE_BEFORE_SECONDS),
+        ('reminder', pickup - REMINDER_BEFORE_SECONDS),
+        ('no_show', pickup + NO_SHOW_AFTER_SECONDS),
+    ]
+    cursor.executemany('''
+        INSERT INTO scheduled_jobs (booking_id, kind, due_at) VALUES (?, ?, ?)
+    ''', [(booking_id, kind, due_at) for kind, due_at in jobs if due_at > now or kind == 'no_show'])
+
+
+class Scheduler:
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.db_path = db_path
+        self.wheel = None
+        self.handlers = {}
+        self.by_booking = {}  # booking_id -> job ids, for cancelling
+        self.last_job_id = 0
+        self.last_poll = 0.0
+        self.feed = BookingChangeFeed()
+        self.claimed = set()  # Claimed by this process but their handler hasn't succeeded yet
+
+    def on(self, kind, handler):
+        # handler(conn, booking_id) runs in its own transaction once the job is claimed
+        self.handlers[kind] = handler
+
+    def add(self, job_id, booking_id, kind, due_at):
+        self.wheel.insert(job_id, due_at, (booking_id, kind))
+        self.by_booking.setdefault(booking_id, set()).add(job_id)
+        self.last_job_id = max(self.last_job_id, job_id)
+
+    def load(self, now=None):
+        self.wheel = TimingWheel(now=now)
+        self.by_booking = {}
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            self.feed.start(cursor)
+            cursor.execute('''
+                SELECT id, booking_id, kind, due_at FROM scheduled_jobs
+                WHERE status = 'scheduled'
+            ''')
+            for row in cursor.fetchall():
+                self.add(*row)
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM scheduled_jobs')
+            self.last_job_id = cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def poll(self, conn):
+        # Jobs scheduled by other processes since the last poll, and jobs of bookings
+        # that have finished in the meantime
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, booking_id, kind, due_at FROM scheduled_jobs
+            WHERE id > ? AND status = 'scheduled'
+        ''', (self.last_job_id,))
+        for row in cursor.fetchall():
+            self.add(*row)
+
+        _, rows = self.feed.changes(cursor, 'id, booking_status')
+        finished = [booking_id for booking_id, status in rows if status in FINISHED_STATUSES]
+        if finished:
+            self.cancel_bookings(conn, finished)
+
+    def cancel_bookings(self, conn, booking_ids):
+        job_ids = []
+        for booking_id in booking_ids:
+            for job_id in self.by_booking.pop(booking_id, ()):
+                self.claimed.discard(job_id)
+                if self.wheel.cancel(job_id):
+                    job_ids.append(job_id)
+        if job_ids:
+            with conn:
+                conn.executemany('''
+                    UPDATE scheduled_jobs SET status = 'cancelled' WHERE id = ? AND status = 'scheduled'
+                ''', [(job_id,) for job_id in job_ids])
+
+    def tick(self, now=None):
+        now = now if now is not None else time.time()
+        if self.wheel is None:
+            self.load(now)
+
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        fired = 0
+        try:
+            if now - self.last_poll >= POLL_SECONDS:
+                self.last_poll = now
+                self.poll(conn)
+
+            due = self.wheel.advance(now)
+            for i, (job_id, (booking_id, kind)) in enumerate(due):
+                jobs = self.by_booking.get(booking_id)
+                if jobs is not None:
+                    jobs.discard(job_id)
+                    if not jobs:
+                        del self.by_booking[booking_id]
+                try:
+                    fired += self.run_job(conn, job_id, booking_id, kind, now)
+                except Exception:
+                    # advance() has already taken the whole batch off the wheel: put this
+                    # job back for a retry and the ones not yet reached back as due now
+                    self.add(job_id, booking_id, kind, now + RETRY_SECONDS)
+                    for later_id, (later_booking_id, later_kind) in due[i + 1:]:
+                        self.add(later_id, later_booking_id, later_kind, now)
+                    raise
+        finally:
+            conn.close()
+        return fired
+
+    def run_job(self, conn, job_id, booking_id, kind, now):
+        if job_id not in self.claimed:
+            with conn:
+                # Whichever scheduler process marks the job first runs it
+                claimed = conn.execute('''
+                    UPDATE scheduled_jobs SET status = 'fired', fired_at = ?
+                    WHERE id = ? AND status = 'scheduled'
+                ''', (now, job_id)).rowcount
+            if not claimed:
+                return 0
+            self.claimed.add(job_id)
+        handler = self.handlers.get(kind)
+        if handler is not None:
+            with conn:
+                handler(conn, booking_id)
+        self.claimed.discard(job_id)
+        return 1 if handler is not None else 0
+
+
+def remind_customer(conn, booking_id):
+    row = conn.execute('''
+        SELECT user_id, pickup_location, pickup_time, booking_status FROM bookings WHERE id = ?
+    ''', (booking_id,)).fetchone()
+    if row is None or row[3] in FINISHED_STATUSES:
+        return
+    conn.execute('''
+        INSERT INTO notifications (user_id, booking_id, message) VALUES (?, ?, ?)
+    ''', (row[0], booking_id, f"Reminder: your taxi from {row[1]} is booked for {row[2]}."))
+
+
+def expire_no_show(conn, booking_id):
+    # A driver was on it and the trip never started: the customer didn't show. A booking
+    # no driver ever took is the service's failure, not theirs, so it's cancelled instead.
+    minutes = NO_SHOW_AFTER_SECONDS // 60
+    conn.execute(f'''
+        UPDATE bookings
+        SET booking_status = 'incomplete',
+            cancellation_reason = 'No-show: trip not started within {minutes} minutes of the pickup time'
+        WHERE id = ? AND booking_status IN ('assigned', 'confirmed')
+    ''', (booking_id,))
+    conn.execute(f'''
+        UPDATE bookings
+        SET booking_status = 'cancelled',
+            cancellation_reason = 'No driver was assigned within {minutes} minutes of the pickup time'
+        WHERE id = ? AND booking_status = 'pending'
+    ''', (booking_id,))
+
+
+def default_scheduler(db_path=None):
+    scheduler = Scheduler(db_path)
+    # Its own queue and availability trees, since it may tick on a thread of its own
+    indexes = (PendingQueue(scheduler.db_path), DriverAvailability(scheduler.db_path))
+
+    def release_booking(conn, booking_id):
+        # The booking has just come within the dispatch horizon; run a round now rather
+        # than leaving it for the next periodic one
+        row = conn.execute('SELECT booking_status FROM bookings WHERE id = ?', (booking_id,)).fetchone()
+        if row is not None and row[0] == 'pending':
+            dispatch.apply(dispatch.plan(scheduler.db_path, indexes=indexes), scheduler.db_path, indexes)
+
+    scheduler.on('release', release_booking)
+    scheduler.on('reminder', remind_customer)
+    scheduler.on('no_show', expire_no_show)
+    return scheduler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fire scheduled booking jobs (release, reminder, no-show)")
+    parser.add_argument("--backfill", action="store_true", help="first schedule jobs for open bookings that have none")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                                     'database', 'taxi_booking.db'))
+    args = parser.parse_args()
+
+    if args.backfill:
+        conn = sqlite3.connect(args.db)
+        with conn:
+            cursor = conn.cursor()
+            rows = cursor.execute('''
+                SELECT id, pickup_time FROM bookings
+                WHERE booking_status IN ('pending', 'assigned', 'confirmed')
+                AND id NOT IN (SELECT booking_id FROM scheduled_jobs)
+            ''').fetchall()
+            for booking_id, pickup_time in rows:
+                schedule_booking(cursor, booking_id, pickup_time)
+        conn.close()
+        print(f"Scheduled jobs for {len(rows)} existing bookings")
+
+    scheduler = default_scheduler(args.db)
+    scheduler.load()
+    print(f"Loaded {len(scheduler.wheel)} scheduled jobs")
+    while True:
+        try:
+            fired = scheduler.tick()
+        except Exception as e:
+            print(f"Scheduler tick failed: {str(e)}")
+            fired = 0
+        if fired:
+            print(f"{datetime.now().strftime('%H:%M:%S')} fired {fired} jobs")
+        time.sleep(scheduler.wheel.tick_seconds)
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import time
+from utils.change_feed import BookingChangeFeed
+from utils.zones import zone_of
+
+
+class SlidingWindowCounter:
+    # Events in the last window_seconds, kept in fixed-width buckets so add/total are O(1)
+    def __init__(self, window_seconds=900, buckets=30):
+        self.bucket_seconds = window_seconds / buckets
+        self.counts = [0] * buckets
+        self.current = None
+        self.total = 0
+
+    def advance(self, now):
+        bucket = int(now // self.bucket_seconds)
+        if self.current is None:
+            self.current = bucket
+            return
+        # Expire at most one full ring of buckets, however long we were idle
+        steps = min(bucket - self.current, len(self.counts))
+        for i in range(1, steps + 1):
+            index = (self.current + i) % len(self.counts)
+            self.total -= self.counts[index]
+            self.counts[index] = 0
+        if bucket > self.current:
+            self.current = bucket
+
+    def add(self, now, amount=1):
+        self.advance(now)
+        self.counts[self.current % len(self.counts)] += amount
+        self.total += amount
+
+    def value(self, now):
+        self.advance(now)
+        return self.total
+
+
+class ZoneState:
+    def __init__(self, window_seconds):
+        self.requests = SlidingWindowCounter(window_seconds)
+        self.pending = 0
+        self.available_drivers = 0
+
+
+class SurgeEngine:
+    # Quotes are made in the customer's process while assignments, declines and driver
+    # toggles happen in others, so the counters are brought up to date from the database
+    # before a quote once they are SYNC_SECONDS old, or straight away after a local write
+    SYNC_SECONDS = 5
+
+    def __init__(self, db_path=None, window_seconds=900, step=0.25, max_multiplier=2.5):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'taxi_booking.db')
+        self.db_path = db_path
+        self.window_seconds = window_seconds
+        self.step = step
+        self.max_multiplier = max_multiplier
+
+        self.zones = {}
+        # Published multipliers; quoting reads this dict and only touches the database to sync
+        self.multipliers = {}
+        self.pending = {}  # booking_id -> pickup zone of each pending booking
+        self.last_booking_id = 0
+        self.feed = BookingChangeFeed()
+        self.loaded = False
+        self.synced_at = None
+        self.stale = False
+
+    def zone(self, zone):
+        state = self.zones.get(zone)
+        if state is None:
+            state = self.zones[zone] = ZoneState(self.window_seconds)
+        return state
+
+    def publish(self, zone, now=None):
+        if zone is None:
+            return
+        state = self.zone(zone)
+        now = now if now is not None else time.time()
+        demand = max(state.requests.value(now), state.pending)
+        supply = state.available_drivers + 1
+        ratio = demand / supply
+        multiplier = 1.0
+        if ratio > 1:
+            # Rounded to 0.1 so the price doesn't flicker with every request
+            multiplier = round(min(self.max_multiplier, 1.0 + self.step * (ratio - 1)), 1)
+        self.multipliers[zone] = multiplier
+
+    def multiplier(self, zone):
+        if (not self.loaded or self.stale
+                or time.monotonic() - self.synced_at >= self.SYNC_SECONDS):
+            self.sync()
+        return self.multipliers.get(zone, 1.0)
+
+    def invalidate(self):
+        # Called by write paths after they commit; the next quote syncs first
+        self.stale = True
+
+    def track(self, booking_id, zone):
+        self.untrack(booking_id)
+        self.pending[booking_id] = zone
+        self.zone(zone).pending += 1
+
+    def untrack(self, booking_id):
+        if booking_id in self.pending:
+            self.zone(self.pending.pop(booking_id)).pending -= 1
+
+    def count_drivers(self, cursor):
+        # Recounted whole on every sync: a few thousand rows at most, and it catches
+        # toggles and moves made by any process without tracking each one
+        for state in self.zones.values():
+            state.available_drivers = 0
+        cursor.execute('''
+            SELECT l.latitude, l.longitude
+            FROM drivers d
+            JOIN driver_locations l ON l.driver_id = d.id
+            WHERE d.status = 'available'
+        ''')
+        for lat, lng in cursor.fetchall():
+            self.zone(zone_of(lat, lng)).available_drivers += 1
+
+    def add_requests(self, cursor, now):
+        cursor.execute('''
+            SELECT id, pickup_zone, pickup_lat, pickup_lng, CAST(strftime('%s', created_at) AS REAL)
+            FROM bookings
+            WHERE id > ?
+            ORDER BY id
+        ''', (self.last_booking_id,))
+        for booking_id, zone, lat, lng, created in cursor.fetchall():
+            self.last_booking_id = booking_id
+            # Bookings made before zones existed may not be tagged yet
+            if created is not None and created >= now - self.window_seconds:
+                self.zone(zone or zone_of(lat, lng)).requests.add(created)
+
+    def load(self):
+        # Snapshot of the counters; sync() keeps them current from here
+        self.loaded = True
+        self.stale = False
+        self.synced_at = time.monotonic()
+        self.zones = {}
+        self.multipliers = {}
+        self.pending = {}
+        now = time.time()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                self.feed.start(cursor)
+                cursor.execute('''
+                    SELECT id, pickup_zone, pickup_lat, pickup_lng
+                    FROM bookings
+                    WHERE booking_status = 'pending' AND driver_id IS NULL
+                ''')
+                for booking_id, zone, lat, lng in cursor.fetchall():
+                    self.track(booking_id, zone or zone_of(lat, lng))
+
+                # Requests still inside the window; later ones are picked up by id
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM bookings')
+                newest = cursor.fetchone()[0]
+                cursor.execute('''
+                    SELECT COALESCE(MIN(id), ?) FROM bookings WHERE created_at >= DATETIME('now', ?)
+                ''', (newest + 1, f'-{int(self.window_seconds)} seconds'))
+                self.last_booking_id = cursor.fetchone()[0] - 1
+                self.add_requests(cursor, now)
+                self.count_drivers(cursor)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Failed to load surge counters: {str(e)}")
+
+        for zone in self.zones:
+            self.publish(zone, now)
+
+    def sync(self):
+        if not self.loaded:
+            self.load()
+            return
+        self.stale = False
+        self.synced_at = time.monotonic()
+        now = time.time()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                self.add_requests(cursor, now)
+                changed, rows = self.feed.changes(cursor, '''
+                    id, booking_status, driver_id, pickup_zone, pickup_lat, pickup_lng
+                ''')
+                current = {row[0]: row for row in rows}
+                for booking_id in changed:
+                    row = current.get(booking_id)
+                    if row is not None and row[1] == 'pending' and row[2] is None:
+                        self.track(booking_id, row[3] or zone_of(row[4], row[5]))
+                    else:
+                        # Assigned, cancelled, finished or deleted
+                        self.untrack(booking_id)
+                self.count_drivers(cursor)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Failed to sync surge counters: {str(e)}")
+            return
+
+        for zone in self.zones:
+            self.publish(zone, now)
+
+
+surge_engine = SurgeEngine()
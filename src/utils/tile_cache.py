@@ -0,0 +1,232 @@
+import argparse
+import math
+import os
+import sqlite3
+import time
+from urllib.parse import urlparse
+import requests
+
+DEFAULT_UPSTREAM = os.environ.get('TAXI_TILE_UPSTREAM', 'https://tile.openstreetmap.org/{z}/{x}/{y}.png')
+DEFAULT_MAX_BYTES = int(os.environ.get('TAXI_TILE_CACHE_MB', '256')) * 1024 * 1024
+
+# Trinidad and Tobago bounding box (south, west, north, east)
+TT_BOUNDS = (10.0, -61.95, 11.40, -60.45)
+COMMON_ZOOMS = range(8, 14)
+# OpenStreetMap's tile usage policy forbids bulk downloading from its servers; tiles from
+# there are only cached as the map asks for them
+NO_PREFETCH_HOSTS = ('openstreetmap.org',)
+
+
+def tile_range(bounds, zoom):
+    south, west, north, east = bounds
+    n = 2 ** zoom
+
+    def to_tile(lat, lon):
+        x = int((lon + 180.0) / 360.0 * n)
+        lat_rad = math.radians(lat)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    min_x, min_y = to_tile(north, west)
+    max_x, max_y = to_tile(south, east)
+    return min_x, max_x, min_y, max_y
+
+
+class TileStore:
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES, upstream=DEFAULT_UPSTREAM):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                                   'database', 'tiles.mbtiles')
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.upstream = upstream
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.create_tables()
+
+        # Access times are kept in memory and written in bulk, so reads stay read-only
+        self._touched = {}
+        self.total_bytes = self.conn.execute(
+            'SELECT COALESCE(SUM(LENGTH(tile_data)), 0) FROM tiles').fetchone()[0]
+
+    def create_tables(self):
+        with self.conn:
+            # MBTiles layout: tile_row uses the TMS (flipped) y axis
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER NOT NULL,
+                    tile_column INTEGER NOT NULL,
+                    tile_row INTEGER NOT NULL,
+                    tile_data BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (zoom_level, tile_column, tile_row)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tiles_last_access ON tiles (last_access)
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self.conn.executemany('INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)', [
+                ('name', 'Trinidad and Tobago'),
+                ('format', 'png'),
+                ('bounds', f"{TT_BOUNDS[1]},{TT_BOUNDS[0]},{TT_BOUNDS[3]},{TT_BOUNDS[2]}"),
+            ])
+
+    def get(self, z, x, y):
+        key = (z, x, (2 ** z - 1) - y)
+        row = self.conn.execute('''
+            SELECT tile_data FROM tiles
+            WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
+        ''', key).fetchone()
+        if row is None:
+            return None
+
+        self._touched[key] = time.time()
+        if len(self._touched) >= 256:
+            self.flush_access_times()
+        return row[0]
+
+    def put(self, z, x, y, data):
+        key = (z, x, (2 ** z - 1) - y)
+        with self.conn:
+            old = self.conn.execute('''
+                SELECT LENGTH(tile_data) FROM tiles
+                WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
+            ''', key).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', key + (data, time.time()))
+        self.total_bytes += len(data) - (old[0] if old else 0)
+        self._touched.pop(key, None)
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def flush_access_times(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        with self.conn:
+            self.conn.executemany('''
+                UPDATE tiles SET last_access = ?
+                WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
+            ''', [(ts,) + key for key, ts in touched.items()])
+
+    def evict(self):
+        # Drop least recently used tiles until we are 10% under the limit
+        self.flush_access_times()
+        target = int(self.max_bytes * 0.9)
+        with self.conn:
+            cursor = self.conn.execute('''
+                SELECT zoom_level, tile_column, tile_row, LENGTH(tile_data)
+                FROM tiles ORDER BY last_access ASC
+            ''')
+            doomed = []
+            freed = 0
+            for zoom_level, tile_column, tile_row, size in cursor:
+                if self.total_bytes - freed <= target:
+                    break
+                doomed.append((zoom_level, tile_column, tile_row))
+                freed += size
+            cursor.close()
+            self.conn.executemany('''
+                DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
+            ''', doomed)
+        self.total_bytes -= freed
+        return len(doomed)
+
+    def upstream_url(self, z, x, y):
+        return self.upstream.format(z=z, x=x, y=y, s='a')
+
+    def fetch_upstream(self, z, x, y, session=None):
+        url = self.upstream_url(z, x, y)
+        if not url.startswith(('http://', 'https://')):
+            # Local stand-in: a directory of {z}/{x}/{y}.png files
+            try:
+                with open(url, 'rb') as f:
+                    return f.read()
+            except OSError:
+                return None
+
+        try:
+            response = (session or requests).get(url, headers={'User-Agent': 'TaxiBookingApp/1.0'}, timeout=10)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        return response.content
+
+    def get_or_fetch(self, z, x, y, session=None):
+        data = self.get(z, x, y)
+        if data is None:
+            data = self.fetch_upstream(z, x, y, session)
+            if data is not None:
+                self.put(z, x, y, data)
+        return data
+
+    def prefetch(self, bounds=TT_BOUNDS, zooms=COMMON_ZOOMS, delay=0.0):
+        host = urlparse(self.upstream).hostname or ''
+        if any(host == blocked or host.endswith('.' + blocked) for blocked in NO_PREFETCH_HOSTS):
+            raise ValueError(f"{host} does not allow bulk prefetching; use a tile server that does")
+        session = requests.Session()
+        fetched = skipped = failed = 0
+        for z in zooms:
+            min_x, max_x, min_y, max_y = tile_range(bounds, z)
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    if self.get(z, x, y) is not None:
+                        skipped += 1
+                        continue
+                    data = self.fetch_upstream(z, x, y, session)
+                    if data is None:
+                        failed += 1
+                        continue
+                    self.put(z, x, y, data)
+                    fetched += 1
+                    if delay:
+                        time.sleep(delay)
+            print(f"Zoom {z}: {fetched} fetched, {skipped} cached, {failed} failed so far")
+        self.flush_access_times()
+        return fetched, skipped, failed
+
+    def close(self):
+        self.flush_access_times()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local map tile cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prefetch_parser = subparsers.add_parser("prefetch", help="Download tiles for Trinidad and Tobago")
+    prefetch_parser.add_argument("--min-zoom", type=int, default=COMMON_ZOOMS.start)
+    prefetch_parser.add_argument("--max-zoom", type=int, default=COMMON_ZOOMS.stop - 1)
+    prefetch_parser.add_argument("--upstream", required=True,
+                                 help="tile URL template, e.g. https://tiles.example.com/{z}/{x}/{y}.png "
+                                      "(a server whose terms allow bulk downloads; not tile.openstreetmap.org)")
+    prefetch_parser.add_argument("--delay", type=float, default=0.1,
+                                 help="seconds between upstream requests (be kind to public tile servers)")
+
+    subparsers.add_parser("stats", help="Show cache size")
+    args = parser.parse_args()
+
+    if args.command == "prefetch":
+        store = TileStore(upstream=args.upstream)
+        try:
+            store.prefetch(zooms=range(args.min_zoom, args.max_zoom + 1), delay=args.delay)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            store.close()
+    elif args.command == "stats":
+        store = TileStore()
+        count = store.conn.execute('SELECT COUNT(*) FROM tiles').fetchone()[0]
+        print(f"{count} tiles, {store.total_bytes / (1024 * 1024):.1f} MB of {store.max_bytes / (1024 * 1024):.0f} MB")
+        store.close()
@@ -0,0 +1,157 @@
+import json
+import math
+import os
+import numpy as np
+
+ZONES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                          'resources', 'zones', 'regions.geojson')
+NODE_CAPACITY = 4
+
+
+class Zone:
+    def __init__(self, code, name, ring):
+        self.code = code
+        self.name = name
+        # Ring as (lng, lat) pairs, GeoJSON order, without the closing point
+        if ring[0] == ring[-1]:
+            ring = ring[:-1]
+        self.ring = [(float(x), float(y)) for x, y in ring]
+        xs = [x for x, _ in self.ring]
+        ys = [y for _, y in self.ring]
+        self.bounds = (min(xs), min(ys), max(xs), max(ys))
+        self.area = abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2)
+                            in zip(self.ring, self.ring[1:] + self.ring[:1]))) / 2
+
+    def contains(self, lat, lng):
+        # Ray casting; points exactly on an edge may land on either side
+        inside = False
+        j = len(self.ring) - 1
+        for i in range(len(self.ring)):
+            xi, yi = self.ring[i]
+            xj, yj = self.ring[j]
+            if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+        return inside
+
+    def contains_many(self, lats, lngs):
+        inside = np.zeros(len(lats), dtype=bool)
+        j = len(self.ring) - 1
+        for i in range(len(self.ring)):
+            xi, yi = self.ring[i]
+            xj, yj = self.ring[j]
+            if yi != yj:
+                crosses = (yi > lats) != (yj > lats)
+                crosses &= lngs < (xj - xi) * (lats - yi) / (yj - yi) + xi
+                inside ^= crosses
+            j = i
+        return inside
+
+
+class Node:
+    def __init__(self, children, leaf):
+        self.children = children
+        self.leaf = leaf
+        boxes = [child.bounds for child in children]
+        self.bounds = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                       max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def str_pack(items, leaf):
+    # One level of Sort-Tile-Recursive packing: sort by x into vertical slices,
+    # then by y within each slice, and group runs of NODE_CAPACITY into nodes
+    node_count = math.ceil(len(items) / NODE_CAPACITY)
+    slice_size = math.ceil(math.sqrt(node_count)) * NODE_CAPACITY
+    by_x = sorted(items, key=lambda item: (item.bounds[0] + item.bounds[2]) / 2)
+
+    nodes = []
+    for start in range(0, len(by_x), slice_size):
+        column = sorted(by_x[start:start + slice_size], key=lambda item: (item.bounds[1] + item.bounds[3]) / 2)
+        for offset in range(0, len(column), NODE_CAPACITY):
+            nodes.append(Node(column[offset:offset + NODE_CAPACITY], leaf))
+    return nodes
+
+
+def overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class ZoneIndex:
+    def __init__(self, zones):
+        self.zones = list(zones)
+        self.by_name = {zone.name: zone for zone in self.zones}
+
+        self.root = None
+        if self.zones:
+            level = str_pack(self.zones, leaf=True)
+            while len(level) > 1:
+                level = str_pack(level, leaf=False)
+            self.root = level[0]
+
+    @classmethod
+    def from_geojson(cls, path=ZONES_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        zones = []
+        for feature in data['features']:
+            properties = feature['properties']
+            zones.append(Zone(properties['code'], properties['name'], feature['geometry']['coordinates'][0]))
+        return cls(zones)
+
+    def candidates(self, box):
+        if self.root is None or not overlaps(self.root.bounds, box):
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for child in node.children:
+                if overlaps(child.bounds, box):
+                    if node.leaf:
+                        found.append(child)
+                    else:
+                        stack.append(child)
+        return found
+
+    def zone_at(self, lat, lng):
+        # Boroughs sit inside the surrounding corporation, so the smallest containing zone wins
+        if lat is None or lng is None:
+            return None
+        best = None
+        for zone in self.candidates((lng, lat, lng, lat)):
+            if zone.contains(lat, lng) and (best is None or zone.area < best.area):
+                best = zone
+        return best
+
+    def name_at(self, lat, lng):
+        zone = self.zone_at(lat, lng)
+        return zone.name if zone is not None else None
+
+    def names_at(self, lats, lngs):
+        # Vectorised name_at for bulk tagging; None where the point is unknown or outside every zone
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        result = np.full(len(lats), None, dtype=object)
+        known = ~np.isnan(lats) & ~np.isnan(lngs)
+        if not known.any():
+            return result
+
+        box = (lngs[known].min(), lats[known].min(), lngs[known].max(), lats[known].max())
+        best_area = np.full(len(lats), np.inf)
+        for zone in self.candidates(box):
+            west, south, east, north = zone.bounds
+            near = known & (lngs >= west) & (lngs <= east) & (lats >= south) & (lats <= north)
+            if not near.any():
+                continue
+            index = np.flatnonzero(near)
+            inside = index[zone.contains_many(lats[index], lngs[index]) & (zone.area < best_area[index])]
+            result[inside] = zone.name
+            best_area[inside] = zone.area
+        return result
+
+
+zone_index = ZoneIndex.from_geojson()
+
+
+def zone_of(lat, lng):
+    return zone_index.name_at(lat, lng)